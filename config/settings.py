@@ -84,4 +84,36 @@ BACKUP_DIR = os.path.join(DATA_DIR, 'backups')
 LOG_EXPORT_DIR = os.path.join(DATA_DIR, 'logs')
 
 for directory in [DATA_DIR, BACKUP_DIR, LOG_EXPORT_DIR]:
-    os.makedirs(directory, exist_ok=True)
\ No newline at end of file
+    os.makedirs(directory, exist_ok=True)
+
+# 微软 Token 接口
+MICROSOFT_TOKEN_URL = os.environ.get(
+    'MICROSOFT_TOKEN_URL',
+    'https://login.microsoftonline.com/common/oauth2/v2.0/token'
+)
+TOKEN_REQUEST_TIMEOUT = 30
+# 并发刷新 Token 时的最大并发请求数
+TOKEN_REFRESH_MAX_WORKERS = int(os.environ.get('TOKEN_REFRESH_MAX_WORKERS', 16))
+
+# 共享 HTTP 连接池
+HTTP_POOL_CONNECTIONS = 10                          # 缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = TOKEN_REFRESH_MAX_WORKERS       # 单主机最大连接数
+HTTP_POOL_BLOCK = True                              # 连接用尽时等待，而不是新建临时连接
+
+# Access Token 缓存
+ACCESS_TOKEN_CACHE_MAX_ENTRIES = 10000
+ACCESS_TOKEN_CACHE_MAX_BYTES = 32 * 1024 * 1024     # 内存上限（字节）
+ACCESS_TOKEN_CACHE_MARGIN_SECONDS = 300             # 过期前预留的安全余量（秒）
+
+# Token 刷新结果批量写库时每个事务的条数
+TOKEN_DB_WRITE_CHUNK_SIZE = 500
+
+# Token 定时更新
+SCHEDULER_POLL_SECONDS = 60                         # 调度器轮询间隔（秒），配置变更在此间隔内生效
+SCHEDULER_RETRY_BACKOFF_SECONDS = 2                 # 重试退避基数，第 n 次重试等待 base * 2^(n-1) 秒
+
+# 分页总数缓存时间（秒），游标分页按需返回的总数为该时间内的近似值
+PAGINATION_COUNT_CACHE_SECONDS = 60
+
+# 日志导出时每次从数据库读取的行数
+LOG_EXPORT_CHUNK_SIZE = 2000
@@ -0,0 +1,155 @@
+import importlib
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Account, TokenLog
+
+# 迁移 0003 删除的旧单列索引，作为“优化前”的基线
+LEGACY_INDEXES = importlib.import_module('core.migrations.0003_query_indexes').LEGACY_INDEXES
+
+
+def _model_sql(model):
+    """用 Django 生成建表语句，拆分为建表 SQL 和建索引 SQL"""
+    with connection.schema_editor(collect_sql=True) as editor:
+        editor.create_model(model)
+    table_sql, index_sql = [], []
+    for statement in editor.collected_sql:
+        (index_sql if statement.lstrip().upper().startswith('CREATE INDEX') else table_sql).append(statement)
+    return table_sql, index_sql
+
+
+class Command(BaseCommand):
+    help = '在独立的临时 SQLite 库中灌入大量日志，对比旧单列索引与联合索引的查询计划与耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logs', type=int, default=1_000_000, help='灌入的日志条数')
+        parser.add_argument('--accounts', type=int, default=10_000, help='灌入的账号数')
+        parser.add_argument('--repeat', type=int, default=20, help='每条查询的重复次数')
+        parser.add_argument('--db', default=None, help='临时库路径（默认在系统临时目录）')
+
+    def handle(self, *args, **options):
+        path = options['db'] or os.path.join(tempfile.gettempdir(), 'bench_indexes.db')
+        if os.path.exists(path):
+            os.remove(path)
+
+        conn = sqlite3.connect(path)
+        index_sql = []
+        for model in (Account, TokenLog):
+            tables, indexes = _model_sql(model)
+            for statement in tables:
+                conn.execute(statement)
+            index_sql.extend(indexes)
+
+        emails = self._seed(conn, options['accounts'], options['logs'])
+        now = datetime.now()
+        queries = self._queries(emails, now)
+
+        # 迁移 0003 之前的结构：只有旧的单列索引
+        for name, target in LEGACY_INDEXES.items():
+            conn.execute(f'CREATE INDEX {name} ON {target}')
+        conn.execute('ANALYZE')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('== 旧单列索引（迁移 0003 之前） =='))
+        before = self._run(conn, queries, options['repeat'])
+
+        # 与迁移 0003 相同：删除旧索引，创建联合索引
+        start = time.perf_counter()
+        for name in LEGACY_INDEXES:
+            conn.execute(f'DROP INDEX {name}')
+        for statement in index_sql:
+            conn.execute(statement)
+        conn.execute('ANALYZE')
+        self.stdout.write(f'删除 {len(LEGACY_INDEXES)} 个旧索引、创建 {len(index_sql)} 个索引耗时 '
+                          f'{time.perf_counter() - start:.2f}s')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('== 联合索引（迁移 0003 之后） =='))
+        after = self._run(conn, queries, options['repeat'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING('== 对比（中位数） =='))
+        for name in queries:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            self.stdout.write(f'{name:<28} {before[name] * 1000:>10.2f}ms -> {after[name] * 1000:>8.2f}ms  x{speedup:.1f}')
+
+        conn.close()
+        os.remove(path)
+
+    def _seed(self, conn, account_count, log_count):
+        """批量灌入账号和日志"""
+        rng = random.Random(42)
+        now = datetime.now()
+        statuses = ['normal'] * 8 + ['expired', 'abnormal']
+        emails = [f'user{i}@outlook.com' for i in range(account_count)]
+
+        start = time.perf_counter()
+        conn.executemany(
+            'INSERT INTO accounts (id, email, client_id, refresh_token, expires_at, status, last_updated, remark, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                (f'{i:032x}', email, 'client', 'token', now.isoformat(' '), rng.choice(statuses),
+                 now.isoformat(' '), '', (now - timedelta(minutes=i)).isoformat(' '))
+                for i, email in enumerate(emails)
+            )
+        )
+
+        # 日志按时间递增写入，与线上追加写入的分布一致，覆盖最近 90 天
+        span = 90 * 24 * 3600
+        base = now - timedelta(seconds=span)
+        conn.executemany(
+            'INSERT INTO token_logs (id, operation_time, email, operation_type, result, result_detail) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (i, (base + timedelta(seconds=span * i / log_count)).isoformat(' '), rng.choice(emails),
+                 'auto_update', 'failed' if rng.random() < 0.05 else 'success', '批量刷新成功')
+                for i in range(log_count)
+            )
+        )
+        conn.commit()
+        self.stdout.write(f'灌入 {account_count} 个账号、{log_count} 条日志耗时 {time.perf_counter() - start:.2f}s')
+        return emails
+
+    @staticmethod
+    def _queries(emails, now):
+        """与账号列表、日志列表接口一致的查询"""
+        week_ago = (now - timedelta(days=7)).isoformat(' ')
+        return {
+            'accounts_by_status': (
+                "SELECT id, email, status, last_updated, remark FROM accounts "
+                "WHERE status = 'expired' ORDER BY created_at DESC LIMIT 20", ()),
+            'logs_7days': (
+                "SELECT id, operation_time, email, result FROM token_logs "
+                "WHERE operation_time >= ? ORDER BY operation_time DESC LIMIT 20", (week_ago,)),
+            'logs_by_email_7days': (
+                "SELECT id, operation_time, email, result FROM token_logs "
+                "WHERE email = ? AND operation_time >= ? ORDER BY operation_time DESC LIMIT 20",
+                (emails[len(emails) // 2], week_ago)),
+            'logs_failed_7days': (
+                "SELECT id, operation_time, email, result FROM token_logs "
+                "WHERE result = 'failed' AND operation_time >= ? ORDER BY operation_time DESC LIMIT 20",
+                (week_ago,)),
+            'logs_failed_7days_count': (
+                "SELECT COUNT(*) FROM token_logs WHERE result = 'failed' AND operation_time >= ?", (week_ago,)),
+        }
+
+    def _run(self, conn, queries, repeat):
+        """输出查询计划并返回每条查询耗时的中位数"""
+        timings = {}
+        for name, (sql, params) in queries.items():
+            plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                samples.append(time.perf_counter() - start)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f'{name}: {timings[name] * 1000:.2f}ms')
+            for row in plan:
+                self.stdout.write(f'    {row[-1]}')
+        return timings
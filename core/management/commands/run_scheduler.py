@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.utils.scheduler import TokenScheduler
+
+
+class Command(BaseCommand):
+    help = '启动 Token 定时更新调度器（按 Config 中的更新时间每天执行一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='立即执行一次更新后退出')
+        parser.add_argument('--poll-seconds', type=int, default=None, help='轮询间隔（秒）')
+
+    def handle(self, *args, **options):
+        scheduler = TokenScheduler(poll_seconds=options['poll_seconds'], stdout=self.stdout)
+
+        if options['once']:
+            scheduler.run_once()
+            return
+
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+            self.stdout.write('调度器已停止')
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:14
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Account',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=255, unique=True, verbose_name='邮箱地址')),
+                ('client_id', models.CharField(max_length=255, verbose_name='Client ID')),
+                ('refresh_token', models.TextField(verbose_name='刷新令牌（明文）')),
+                ('expires_at', models.DateTimeField(verbose_name='令牌过期时间')),
+                ('status', models.CharField(choices=[('normal', '正常'), ('expired', '过期'), ('abnormal', '异常')], default='normal', max_length=20, verbose_name='状态')),
+                ('last_updated', models.DateTimeField(auto_now=True, verbose_name='上次更新时间')),
+                ('remark', models.CharField(blank=True, max_length=200, verbose_name='备注')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': 'Outlook 账号',
+                'verbose_name_plural': 'Outlook 账号',
+                'db_table': 'accounts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Config',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('update_interval_days', models.IntegerField(default=3, verbose_name='更新周期（天）')),
+                ('update_time', models.TimeField(default='02:00', verbose_name='每日更新时间')),
+                ('advance_update_hours', models.IntegerField(default=24, verbose_name='提前更新小时数')),
+                ('max_retry_count', models.IntegerField(default=3, verbose_name='最大重试次数')),
+                ('local_port', models.IntegerField(default=8000, verbose_name='本地端口')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '应用配置',
+                'verbose_name_plural': '应用配置',
+                'db_table': 'config',
+            },
+        ),
+        migrations.CreateModel(
+            name='TokenLog',
+            fields=[
+                ('id', models.CharField(editable=False, max_length=50, primary_key=True, serialize=False)),
+                ('operation_time', models.DateTimeField(auto_now_add=True, verbose_name='操作时间')),
+                ('email', models.EmailField(max_length=255, verbose_name='账号邮箱')),
+                ('operation_type', models.CharField(choices=[('auto_update', '自动更新'), ('manual_update', '手动更新')], max_length=20, verbose_name='操作类型')),
+                ('result', models.CharField(choices=[('success', '成功'), ('failed', '失败')], max_length=20, verbose_name='操作结果')),
+                ('result_detail', models.TextField(verbose_name='结果详情')),
+            ],
+            options={
+                'verbose_name': 'Token 更新日志',
+                'verbose_name_plural': 'Token 更新日志',
+                'db_table': 'token_logs',
+                'ordering': ['-operation_time'],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# TokenLog 主键由 "{email}_{秒级时间}" 字符串改为时间有序的 64 位整数
+
+from django.db import migrations, models
+
+import core.utils.idgen
+
+ID_EPOCH_MS = core.utils.idgen.ID_EPOCH_MS
+TIMESTAMP_SHIFT = core.utils.idgen.TIMESTAMP_SHIFT
+MAX_SEQUENCE = core.utils.idgen.MAX_SEQUENCE
+
+
+def convert_log_ids(apps, schema_editor):
+    """
+    按 operation_time 顺序为已有日志重新编号。
+
+    新 ID 由原记录的操作时间（毫秒）加同一毫秒内的序号组成，
+    与 generate_id() 的布局一致，因此历史数据同样可以按 ID 做时间范围查询。
+    同一毫秒内超过 MAX_SEQUENCE + 1 条时与 generate_id() 一样借用下一毫秒，保证 ID 递增且不重复。
+    先以数字字符串写回旧的字符串主键列，随后的 AlterField 会将其转换为整数。
+    """
+    TokenLog = apps.get_model('core', 'TokenLog')
+    rows = TokenLog.objects.order_by('operation_time', 'id').values_list('id', 'operation_time')
+
+    updates = []
+    last_ms = None
+    sequence = 0
+    for old_id, operation_time in rows.iterator(chunk_size=2000):
+        ms = int(operation_time.timestamp() * 1000)
+        if last_ms is not None and ms <= last_ms:
+            ms = last_ms
+            sequence += 1
+            if sequence > MAX_SEQUENCE:
+                # 当前毫秒序号用尽，借用下一毫秒
+                ms += 1
+                sequence = 0
+        else:
+            sequence = 0
+        last_ms = ms
+        new_id = ((ms - ID_EPOCH_MS) << TIMESTAMP_SHIFT) | sequence
+        updates.append((str(new_id), old_id))
+
+    table = schema_editor.quote_name(TokenLog._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {table} SET id = %s WHERE id = %s', updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_log_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tokenlog',
+            name='id',
+            field=models.BigIntegerField(default=core.utils.idgen.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
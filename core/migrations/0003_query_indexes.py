@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+# 早期手工建表时创建的单列索引，已被唯一约束或下面的联合索引覆盖，保留只会增加写入开销
+LEGACY_INDEXES = {
+    'idx_accounts_email': 'accounts(email)',
+    'idx_accounts_status': 'accounts(status)',
+    'idx_accounts_created_at': 'accounts(created_at DESC)',
+    'idx_token_logs_email': 'token_logs(email)',
+    'idx_token_logs_operation_time': 'token_logs(operation_time DESC)',
+    'idx_token_logs_result': 'token_logs(result)',
+}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_tokenlog_time_ordered_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['created_at'], name='accounts_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['status', 'created_at'], name='accounts_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenlog',
+            index=models.Index(fields=['operation_time'], name='token_logs_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenlog',
+            index=models.Index(fields=['email', 'operation_time'], name='token_logs_email_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenlog',
+            index=models.Index(fields=['result', 'operation_time'], name='token_logs_result_time_idx'),
+        ),
+        migrations.RunSQL(
+            [f'DROP INDEX IF EXISTS {name}' for name in LEGACY_INDEXES],
+            [f'CREATE INDEX IF NOT EXISTS {name} ON {target}' for name, target in LEGACY_INDEXES.items()],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# 早期版本添加/刷新账号时把 expires_at 写成 2099-12-31 的占位值，定时更新永远挑不中这些账号
+
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+from core.utils.constants import DEFAULT_CONFIG
+from core.utils.scheduler import compute_expires_at
+
+# 占位值为本地时间 2099-12-31，按 UTC 存储后仍晚于该时间
+SENTINEL_EXPIRES_AT = datetime(2099, 1, 1, tzinfo=timezone.utc)
+
+
+def backfill_expires_at(apps, schema_editor):
+    """
+    按上次更新时间 + 更新周期回填占位的 expires_at。
+
+    早已超过更新周期的账号回填后直接落入到期窗口，下一次定时更新即会刷新。
+    """
+    Account = apps.get_model('core', 'Account')
+    Config = apps.get_model('core', 'Config')
+    config = Config.objects.order_by('id').first() or Config(**DEFAULT_CONFIG)
+
+    accounts = list(Account.objects.filter(expires_at__gte=SENTINEL_EXPIRES_AT))
+    for account in accounts:
+        account.expires_at = compute_expires_at(config, now=account.last_updated)
+    # bulk_update 不触发 auto_now，last_updated 保持不变
+    Account.objects.bulk_update(accounts, ['expires_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 import uuid
 from datetime import datetime
 
+from .utils.idgen import generate_id
+
 
 class Account(models.Model):
     """Outlook 账号模型"""
@@ -29,6 +31,11 @@ class Account(models.Model):
         verbose_name = 'Outlook 账号'
         verbose_name_plural = 'Outlook 账号'
         ordering = ['-created_at']
+        indexes = [
+            # 账号列表：按创建时间倒序，可选按状态筛选
+            models.Index(fields=['created_at'], name='accounts_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='accounts_status_created_idx'),
+        ]
 
     def __str__(self):
         return self.email
@@ -68,7 +75,8 @@ class TokenLog(models.Model):
         ('failed', '失败'),
     ]
 
-    id = models.CharField(primary_key=True, max_length=50, editable=False)
+    # 时间有序的 64 位整数 ID，插入时追加到索引末尾，也可按 ID 做时间范围查询
+    id = models.BigIntegerField(primary_key=True, default=generate_id, editable=False)
     operation_time = models.DateTimeField(auto_now_add=True, verbose_name='操作时间')
     email = models.EmailField(max_length=255, verbose_name='账号邮箱')
     operation_type = models.CharField(max_length=20, choices=OPERATION_TYPE_CHOICES, verbose_name='操作类型')
@@ -80,6 +88,12 @@ class TokenLog(models.Model):
         verbose_name = 'Token 更新日志'
         verbose_name_plural = 'Token 更新日志'
         ordering = ['-operation_time']
+        indexes = [
+            # 日志列表：时间范围 + 可选的邮箱 / 结果筛选，均按操作时间倒序
+            models.Index(fields=['operation_time'], name='token_logs_time_idx'),
+            models.Index(fields=['email', 'operation_time'], name='token_logs_email_time_idx'),
+            models.Index(fields=['result', 'operation_time'], name='token_logs_result_time_idx'),
+        ]
 
     def __str__(self):
         return f'{self.email} - {self.operation_time}'
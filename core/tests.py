@@ -0,0 +1,279 @@
+"""
+Token 刷新测试
+------------------------------------
+MICROSOFT_TOKEN_URL 指向本地的桩 HTTP 服务，按 refresh token 返回不同的应答：
+
+  - good-*: 200，签发 access token
+  - revoked: 400 invalid_grant
+  - throttled: 429
+  - malformed: 200，但响应体不是对象
+  - not-json: 200，响应体不是 JSON
+  - unavailable: 503，响应体不是 JSON
+"""
+
+import importlib
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from django.apps import apps
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Account, Config, TokenLog
+from core.utils import scheduler
+from core.utils.http_client import close_http_session, get_connection_stats, get_http_session
+from core.utils.token_cache import get_token_cache
+from core.utils.token_engine import is_retryable, refresh_accounts, request_token
+
+backfill_migration = importlib.import_module('core.migrations.0004_backfill_account_expires_at')
+
+
+class _TokenHandler(BaseHTTPRequestHandler):
+    """模拟微软 Token 接口"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        refresh_token = form['refresh_token'][0]
+
+        if refresh_token.startswith('good-'):
+            status, body = 200, {
+                'access_token': f'at-{refresh_token}',
+                'refresh_token': f'rt-{refresh_token}',
+                'expires_in': 3600,
+            }
+        elif refresh_token == 'revoked':
+            status, body = 400, {'error': 'invalid_grant', 'error_description': 'refresh token 已失效'}
+        elif refresh_token == 'throttled':
+            status, body = 429, {'error': 'too_many_requests', 'error_description': '请求过于频繁'}
+        elif refresh_token == 'not-json':
+            status, body = 200, '<html>maintenance</html>'
+        elif refresh_token == 'unavailable':
+            status, body = 503, '<html>service unavailable</html>'
+        else:
+            status, body = 200, []
+
+        payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _account(email, refresh_token):
+    return SimpleNamespace(email=email, client_id='client-id', refresh_token=refresh_token)
+
+
+class _StubTokenServerMixin:
+    """在类级别启动桩 Token 服务，并让 MICROSOFT_TOKEN_URL 指向它"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _TokenHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.token_url = f'http://127.0.0.1:{cls.server.server_port}/token'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        close_http_session()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        get_token_cache().clear()
+        overrides = override_settings(MICROSOFT_TOKEN_URL=self.token_url, TOKEN_REQUEST_TIMEOUT=5)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class TokenEngineTests(_StubTokenServerMixin, SimpleTestCase):
+
+    def test_request_token_success(self):
+        result = request_token(_account('a@example.com', 'good-a'))
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['status_code'], 200)
+        self.assertEqual(result['access_token'], 'at-good-a')
+        self.assertEqual(result['refresh_token'], 'rt-good-a')
+        self.assertEqual(result['expires_in'], 3600)
+        self.assertEqual(get_token_cache().get('a@example.com')['access_token'], 'at-good-a')
+
+    def test_request_token_invalid_grant(self):
+        get_token_cache().set('b@example.com', 'stale-token', 3600)
+
+        result = request_token(_account('b@example.com', 'revoked'))
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['status_code'], 400)
+        self.assertEqual(result['error_type'], 'http')
+        self.assertEqual(result['error_code'], 'invalid_grant')
+        self.assertEqual(result['error_message'], 'invalid_grant: refresh token 已失效')
+        self.assertFalse(is_retryable(result))
+        # refresh token 失效时清除已缓存的 access token
+        self.assertIsNone(get_token_cache().get('b@example.com'))
+
+    def test_request_token_throttled_is_retryable(self):
+        result = request_token(_account('c@example.com', 'throttled'))
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['status_code'], 429)
+        self.assertTrue(is_retryable(result))
+
+    def test_request_token_network_error(self):
+        # 关闭的端口：连接被拒绝
+        closed = ThreadingHTTPServer(('127.0.0.1', 0), _TokenHandler)
+        url = f'http://127.0.0.1:{closed.server_port}/token'
+        closed.server_close()
+
+        with override_settings(MICROSOFT_TOKEN_URL=url):
+            result = request_token(_account('d@example.com', 'good-d'))
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error_type'], 'network')
+        self.assertTrue(result['error_message'])
+        self.assertTrue(is_retryable(result))
+
+    def test_request_token_unexpected_response_is_not_retryable(self):
+        for refresh_token in ('malformed', 'not-json'):
+            result = request_token(_account('e@example.com', refresh_token))
+
+            self.assertFalse(result['success'])
+            self.assertEqual(result['status_code'], 200)
+            self.assertEqual(result['error_type'], 'unknown')
+            self.assertFalse(is_retryable(result))
+
+    def test_request_token_server_error_is_retryable(self):
+        result = request_token(_account('e@example.com', 'unavailable'))
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['status_code'], 503)
+        self.assertTrue(is_retryable(result))
+
+    def test_refresh_accounts_keeps_input_order(self):
+        accounts = [
+            _account('f1@example.com', 'good-f1'),
+            _account('f2@example.com', 'revoked'),
+            _account('f3@example.com', 'good-f3'),
+            _account('f4@example.com', 'malformed'),
+        ]
+
+        results = refresh_accounts(accounts, max_workers=4)
+
+        self.assertEqual([account for account, _ in results], accounts)
+        self.assertEqual([result['email'] for _, result in results], [a.email for a in accounts])
+        self.assertEqual([result['success'] for _, result in results], [True, False, True, False])
+        self.assertEqual([result['error_type'] for _, result in results], ['', 'http', '', 'unknown'])
+        self.assertEqual(results[2][1]['access_token'], 'at-good-f3')
+
+    def test_refresh_accounts_single_worker_and_empty(self):
+        self.assertEqual(refresh_accounts([]), [])
+
+        results = refresh_accounts([_account('g@example.com', 'good-g')], max_workers=8)
+
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0][1]['success'])
+
+
+class HTTPClientTests(_StubTokenServerMixin, SimpleTestCase):
+
+    def test_proxy_connections_are_counted(self):
+        close_http_session()
+        before = get_connection_stats()
+        # 桩服务同时充当 HTTP 代理：请求行为绝对 URL，应答相同
+        proxy = f'http://127.0.0.1:{self.server.server_port}'
+        form = {'refresh_token': 'good-p'}
+
+        for _ in range(2):
+            response = get_http_session().post('http://token.invalid/token', data=form, proxies={'http': proxy})
+            self.assertEqual(response.json()['access_token'], 'at-good-p')
+
+        after = get_connection_stats()
+        self.assertEqual(after['requests'] - before['requests'], 2)
+        self.assertEqual(after['connections_opened'] - before['connections_opened'], 1)
+
+
+class RefreshAllTokensViewTests(_StubTokenServerMixin, TestCase):
+
+    def test_results_are_persisted(self):
+        expires_at = timezone.now()
+        Account.objects.create(email='h1@example.com', client_id='c', refresh_token='good-h1', expires_at=expires_at)
+        Account.objects.create(email='h2@example.com', client_id='c', refresh_token='revoked', expires_at=expires_at)
+
+        response = self.client.get(reverse('core:refresh_all_tokens'))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['summary'], {'total': 2, 'success': 1, 'failed': 1})
+        self.assertIn('connections_opened', data['connections'])
+
+        refreshed = Account.objects.get(email='h1@example.com')
+        self.assertEqual(refreshed.refresh_token, 'rt-good-h1')
+        self.assertEqual(refreshed.status, 'normal')
+        self.assertEqual(Account.objects.get(email='h2@example.com').status, 'expired')
+        self.assertEqual(
+            sorted(TokenLog.objects.values_list('email', 'result')),
+            [('h1@example.com', 'success'), ('h2@example.com', 'failed')],
+        )
+
+
+class UpdateAllViewTests(_StubTokenServerMixin, TransactionTestCase):
+
+    def test_update_runs_in_background(self):
+        Account.objects.create(email='i@example.com', client_id='c', refresh_token='good-i', expires_at=timezone.now())
+
+        response = self.client.post(reverse('core:update_all'))
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['data'], {'total': 1, 'status': 'running'})
+
+        scheduler._background_thread.join(timeout=10)
+        self.assertFalse(scheduler._background_thread.is_alive())
+        self.assertEqual(Account.objects.get(email='i@example.com').refresh_token, 'rt-good-i')
+        self.assertEqual(TokenLog.objects.get(email='i@example.com').operation_type, 'manual_update')
+
+
+class SelectDueAccountsTests(TestCase):
+
+    def test_sentinel_expires_at_is_backfilled(self):
+        config = Config.objects.create(update_interval_days=3, advance_update_hours=24)
+        now = timezone.now()
+        sentinel = timezone.make_aware(datetime(2099, 12, 31, 23, 59, 59))
+        Account.objects.create(email='stale@example.com', client_id='c', refresh_token='rt', expires_at=sentinel)
+        Account.objects.create(email='fresh@example.com', client_id='c', refresh_token='rt', expires_at=sentinel)
+        Account.objects.filter(email='stale@example.com').update(last_updated=now - timedelta(days=5))
+        # 占位值永远不会落入到期窗口
+        self.assertFalse(scheduler.select_due_accounts(config, now).exists())
+
+        backfill_migration.backfill_expires_at(apps, None)
+
+        stale = Account.objects.get(email='stale@example.com')
+        self.assertEqual(stale.expires_at, stale.last_updated + timedelta(days=3))
+        fresh = Account.objects.get(email='fresh@example.com')
+        self.assertEqual(fresh.expires_at, fresh.last_updated + timedelta(days=3))
+        self.assertEqual(
+            [account.email for account in scheduler.select_due_accounts(config, now)],
+            ['stale@example.com'],
+        )
+
+
+class ExportLogsViewTests(SimpleTestCase):
+
+    def test_non_object_body_is_rejected(self):
+        for body in ('[]', '"7days"', '1'):
+            response = self.client.post(reverse('core:export_logs'), data=body, content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], '参数格式错误')
@@ -0,0 +1,127 @@
+"""
+进程级共享 HTTP 客户端
+------------------------------------
+所有对微软接口的调用共用一个 requests.Session：
+
+  - 连接池 + keep-alive，避免每个账号都重新进行 TCP/TLS 握手
+  - 可配置连接池大小与单主机最大连接数（超出时阻塞等待而不是新建连接）
+  - 统计新建连接数与复用次数，便于观察握手节省情况（经 HTTP 代理的连接同样计入；
+    SOCKS 代理使用 urllib3 自己的连接池类，其新建连接不计入）
+"""
+
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class _ConnectionStats:
+    """连接统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def incr_requests(self):
+        with self._lock:
+            self.requests += 1
+
+    def incr_connections(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': max(self.requests - self.connections_opened, 0),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.connections_opened = 0
+
+
+connection_stats = _ConnectionStats()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        connection_stats.incr_connections()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        connection_stats.incr_connections()
+        return super()._new_conn()
+
+
+_COUNTING_POOL_CLASSES = {
+    'http': _CountingHTTPConnectionPool,
+    'https': _CountingHTTPSConnectionPool,
+}
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """记录新建连接与请求次数的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _COUNTING_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not proxy.lower().startswith('socks'):
+            manager.pool_classes_by_scheme = _COUNTING_POOL_CLASSES
+        return manager
+
+    def send(self, request, *args, **kwargs):
+        connection_stats.incr_requests()
+        return super().send(request, *args, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    """按 settings 中的连接池参数创建 Session"""
+    adapter = PooledHTTPAdapter(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        pool_block=settings.HTTP_POOL_BLOCK,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_http_session():
+    """获取进程级共享 Session（首次调用时创建）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def close_http_session():
+    """关闭共享 Session 并释放所有连接"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_connection_stats():
+    """获取连接统计：请求数、新建连接数、复用次数"""
+    return connection_stats.snapshot()
@@ -0,0 +1,73 @@
+"""
+时间有序的 64 位 ID 生成器
+------------------------------------
+用于 TokenLog 主键，结构（从高位到低位）：
+
+  - 41 位：距 ID_EPOCH 的毫秒数（约可用 69 年）
+  - 10 位：进程标识（取 PID 低 10 位）
+  - 12 位：同一毫秒内的序号
+
+同一进程内严格递增；不同进程依靠进程标识区分。
+ID 按时间递增，新记录总是追加到主键索引末尾，并且可以按 ID 做时间范围查询。
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+ID_EPOCH_MS = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+_lock = threading.Lock()
+_last_ms = 0
+_sequence = 0
+
+
+def _get_worker_id():
+    # 每次读取 PID，fork 出的子进程自动获得新的进程标识
+    return os.getpid() & ((1 << WORKER_BITS) - 1)
+
+
+def generate_id():
+    """生成一个新的时间有序 ID"""
+    global _last_ms, _sequence
+
+    with _lock:
+        now_ms = int(time.time() * 1000)
+
+        # 时钟回拨时沿用上一次的时间戳，保证单调递增
+        if now_ms <= _last_ms:
+            now_ms = _last_ms
+            _sequence += 1
+            if _sequence > MAX_SEQUENCE:
+                # 当前毫秒序号用尽，借用下一毫秒
+                now_ms += 1
+                _sequence = 0
+        else:
+            _sequence = 0
+
+        _last_ms = now_ms
+        return ((now_ms - ID_EPOCH_MS) << TIMESTAMP_SHIFT) | (_get_worker_id() << SEQUENCE_BITS) | _sequence
+
+
+def id_from_datetime(dt, sequence=0):
+    """
+    将时间转换为对应的 ID 下界，用于按 ID 做时间范围查询。
+
+    示例：
+        TokenLog.objects.filter(id__gte=id_from_datetime(start), id__lt=id_from_datetime(end))
+    """
+    ms = int(dt.timestamp() * 1000)
+    return ((ms - ID_EPOCH_MS) << TIMESTAMP_SHIFT) | sequence
+
+
+def datetime_from_id(value):
+    """从 ID 中还原生成时间（UTC）"""
+    ms = (value >> TIMESTAMP_SHIFT) + ID_EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
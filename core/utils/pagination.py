@@ -0,0 +1,143 @@
+"""
+游标（Keyset）分页
+------------------------------------
+按 (排序字段, 主键) 做范围查询代替 OFFSET，翻到任意深度的成本与第一页相同，
+且默认不执行 COUNT(*)。
+
+游标是对上一页首/尾记录排序键的 base64 编码，对客户端不透明。
+总数可选：通过 cached_count() 按查询缓存一段时间，避免每次请求都 COUNT。
+"""
+
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .exceptions import ValidationException
+
+DIRECTION_NEXT = 'next'
+DIRECTION_PREV = 'prev'
+
+
+def encode_cursor(values, direction):
+    """将排序键编码为不透明的游标字符串"""
+    payload = json.dumps({'v': values, 'd': direction}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析游标。
+
+    返回：
+        (values, direction)
+
+    异常：
+        ValidationException: 游标格式不正确
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError):
+        raise ValidationException('cursor 参数无效')
+
+    if direction not in (DIRECTION_NEXT, DIRECTION_PREV) or not isinstance(values, list):
+        raise ValidationException('cursor 参数无效')
+    return values, direction
+
+
+def _row_value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def keyset_paginate(queryset, order_fields, page_size, cursor=None):
+    """
+    按 order_fields 倒序做游标分页。
+
+    参数：
+        queryset: 已完成筛选的 QuerySet（可以是 .values() 结果）
+        order_fields: 排序字段元组，最后一个应为唯一字段，如 ('created_at', 'id')
+        page_size: 每页条数
+        cursor: 上一次返回的 next_cursor / prev_cursor，为空表示第一页
+
+    返回：
+        dict: {'items', 'next_cursor', 'prev_cursor'}，items 为当前页记录（倒序）
+    """
+    model = queryset.model
+    fields = [model._meta.get_field(name) for name in order_fields]
+    direction = DIRECTION_NEXT
+    has_cursor = bool(cursor)
+
+    if has_cursor:
+        raw_values, direction = decode_cursor(cursor)
+        if len(raw_values) != len(fields):
+            raise ValidationException('cursor 参数无效')
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, raw_values)]
+        except Exception:
+            raise ValidationException('cursor 参数无效')
+
+        # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y)
+        lookup = 'lt' if direction == DIRECTION_NEXT else 'gt'
+        condition = Q()
+        for i, name in enumerate(order_fields):
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(order_fields[:i], values[:i]):
+                clause &= Q(**{prev_name: prev_value})
+            condition |= clause
+
+        # 额外加上首个排序字段的闭区间条件：否则 SQLite 会对 OR 的两个分支分别查索引
+        # （MULTI-INDEX OR），再对全部结果排序，深度翻页时退化为全范围排序
+        queryset = queryset.filter(Q(**{f'{order_fields[0]}__{lookup}e': values[0]}), condition)
+
+    if direction == DIRECTION_NEXT:
+        ordering = [f'-{name}' for name in order_fields]
+    else:
+        ordering = list(order_fields)
+
+    # 多取一条用于判断是否还有更多
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if direction == DIRECTION_PREV:
+        rows.reverse()
+
+    def key_of(row):
+        return [_row_value(row, name) for name in order_fields]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # 往后翻：还有更多，或者是从后一页往回翻过来的
+        if (direction == DIRECTION_NEXT and has_more) or direction == DIRECTION_PREV:
+            next_cursor = encode_cursor(key_of(rows[-1]), DIRECTION_NEXT)
+        # 往前翻：不是第一页
+        if (direction == DIRECTION_PREV and has_more) or (direction == DIRECTION_NEXT and has_cursor):
+            prev_cursor = encode_cursor(key_of(rows[0]), DIRECTION_PREV)
+
+    return {
+        'items': rows,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+    }
+
+
+def cached_count(queryset, timeout=None):
+    """
+    返回查询总数，结果按 SQL 缓存 timeout 秒（近似值）。
+
+    同一筛选条件在缓存期内不会重复执行 COUNT(*)。
+    """
+    timeout = settings.PAGINATION_COUNT_CACHE_SECONDS if timeout is None else timeout
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
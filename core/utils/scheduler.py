@@ -0,0 +1,257 @@
+"""
+Token 定时更新
+------------------------------------
+根据 Config 模型驱动的定时刷新任务：
+
+  - 每天在 update_time 执行一次
+  - 只挑选 expires_at 落在提前更新窗口（advance_update_hours）内的账号
+  - 通过并发刷新引擎刷新，对可重试的失败按指数退避重试，最多 max_retry_count 次
+  - 刷新成功后 expires_at 顺延 update_interval_days 天
+
+由 run_scheduler 管理命令启动常驻进程；手动“全部更新”接口复用同一套逻辑，
+通过 start_background_update 在后台线程中执行，请求立即返回。
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ..models import Account, Config
+from .constants import (
+    ACCOUNT_STATUS_EXPIRED,
+    ACCOUNT_STATUS_NORMAL,
+    DEFAULT_CONFIG,
+    OPERATION_TYPE_AUTO,
+    RESULT_FAILED,
+    RESULT_SUCCESS,
+)
+from .http_client import get_connection_stats
+from .token_engine import is_retryable, refresh_accounts
+from .token_store import TokenResultWriter
+
+
+def get_app_config():
+    """获取当前配置，数据库中没有配置时返回默认值（不写库）"""
+    config = Config.objects.order_by('id').first()
+    if config is None:
+        config = Config(**DEFAULT_CONFIG)
+    return config
+
+
+def _update_time(config):
+    """update_time 可能是 time 对象，也可能是未入库的 'HH:MM' 字符串"""
+    value = config.update_time
+    if isinstance(value, str):
+        value = datetime.strptime(value[:5], '%H:%M').time()
+    return value
+
+
+def compute_expires_at(config=None, now=None):
+    """刷新成功后的下一次到期时间：当前时间 + 更新周期"""
+    config = config or get_app_config()
+    now = now or timezone.now()
+    return now + timedelta(days=config.update_interval_days)
+
+
+def next_run_time(config, now=None):
+    """计算下一次执行时间（本地时区的 update_time）"""
+    now = timezone.localtime(now or timezone.now())
+    update_time = _update_time(config)
+    run_at = now.replace(hour=update_time.hour, minute=update_time.minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+def select_due_accounts(config, now=None):
+    """挑选需要刷新的账号：expires_at 在提前更新窗口内，且未被标记为过期"""
+    now = now or timezone.now()
+    deadline = now + timedelta(hours=config.advance_update_hours)
+    return (Account.objects
+            .filter(expires_at__lte=deadline)
+            .exclude(status=ACCOUNT_STATUS_EXPIRED))
+
+
+def refresh_with_retry(accounts, config, operation_type=OPERATION_TYPE_AUTO, sleep=time.sleep):
+    """
+    并发刷新账号，对可重试的失败按指数退避重试。
+
+    参数：
+        accounts: Account 实例列表
+        config: Config 实例，提供 max_retry_count 和 update_interval_days
+        operation_type: 写入 TokenLog 的操作类型
+        sleep: 等待函数，便于测试时替换
+
+    返回：
+        dict: {'total', 'success', 'failed', 'details'}
+    """
+    accounts = list(accounts)
+    details = {}
+    success_count = 0
+    failed_count = 0
+    pending = accounts
+    attempt = 0
+
+    with TokenResultWriter() as writer:
+        while pending:
+            retry = []
+
+            for account, token_result in refresh_accounts(pending):
+                if token_result['success']:
+                    if token_result['refresh_token']:
+                        account.refresh_token = token_result['refresh_token']
+                    account.expires_at = compute_expires_at(config)
+                    account.status = ACCOUNT_STATUS_NORMAL
+                    writer.update_account(account)
+                    writer.add_log(
+                        email=account.email,
+                        operation_type=operation_type,
+                        result=RESULT_SUCCESS,
+                        result_detail=f'Token 刷新成功（第 {attempt + 1} 次尝试），有效期至 '
+                                      f'{timezone.localtime(account.expires_at):%Y-%m-%d %H:%M:%S}'
+                    )
+                    details[account.email] = {
+                        'email': account.email,
+                        'status': RESULT_SUCCESS,
+                        'expires_at': timezone.localtime(account.expires_at).strftime('%Y-%m-%d %H:%M:%S')
+                    }
+                    success_count += 1
+                    continue
+
+                if is_retryable(token_result) and attempt < config.max_retry_count:
+                    retry.append(account)
+                    continue
+
+                if token_result['error_code'] == 'invalid_grant':
+                    account.status = ACCOUNT_STATUS_EXPIRED
+                    writer.update_account(account)
+
+                writer.add_log(
+                    email=account.email,
+                    operation_type=operation_type,
+                    result=RESULT_FAILED,
+                    result_detail=f"Token 刷新失败（共尝试 {attempt + 1} 次）: {token_result['error_message']}"
+                )
+                details[account.email] = {
+                    'email': account.email,
+                    'status': RESULT_FAILED,
+                    'error': token_result['error_message']
+                }
+                failed_count += 1
+
+            if retry:
+                sleep(settings.SCHEDULER_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+                attempt += 1
+            pending = retry
+
+    return {
+        'total': len(accounts),
+        'success': success_count,
+        'failed': failed_count,
+        'details': [details[account.email] for account in accounts],
+    }
+
+
+def run_update_cycle(now=None):
+    """执行一次定时更新：只刷新到期窗口内的账号"""
+    config = get_app_config()
+    accounts = list(select_due_accounts(config, now))
+    return refresh_with_retry(accounts, config, operation_type=OPERATION_TYPE_AUTO)
+
+
+_background_lock = threading.Lock()
+_background_thread = None
+
+
+def _run_background_update(accounts, config, operation_type):
+    try:
+        summary = refresh_with_retry(accounts, config, operation_type=operation_type)
+        print(f"[{timezone.localtime():%Y-%m-%d %H:%M:%S}] 后台更新完成：共 {summary['total']} 个账号，"
+              f"成功 {summary['success']} 个，失败 {summary['failed']} 个")
+    except Exception as e:
+        print(f"[{timezone.localtime():%Y-%m-%d %H:%M:%S}] 后台更新失败：{e}")
+    finally:
+        # 工作线程结束时释放它占用的数据库连接
+        close_old_connections()
+
+
+def start_background_update(accounts, config, operation_type=OPERATION_TYPE_AUTO):
+    """
+    在后台线程中执行 refresh_with_retry，调用方立即返回（重试等待不阻塞请求线程）。
+
+    同一进程内同时只运行一个后台更新，结果写入 TokenLog。
+
+    返回：
+        bool: 是否已启动；已有后台更新在运行时返回 False
+    """
+    global _background_thread
+    with _background_lock:
+        if _background_thread is not None and _background_thread.is_alive():
+            return False
+        _background_thread = threading.Thread(
+            target=_run_background_update,
+            args=(list(accounts), config, operation_type),
+            name='token-update',
+            daemon=True,
+        )
+        _background_thread.start()
+        return True
+
+
+class TokenScheduler:
+    """常驻调度器：每天在 update_time 执行一次 run_update_cycle"""
+
+    def __init__(self, poll_seconds=None, stdout=None):
+        self.poll_seconds = poll_seconds or settings.SCHEDULER_POLL_SECONDS
+        self.stdout = stdout
+        self._stopped = False
+
+    def _log(self, message):
+        line = f"[{timezone.localtime():%Y-%m-%d %H:%M:%S}] {message}"
+        if self.stdout:
+            self.stdout.write(line)
+        else:
+            print(line)
+
+    def stop(self):
+        self._stopped = True
+
+    def run_once(self):
+        """立即执行一次更新"""
+        summary = run_update_cycle()
+        connections = get_connection_stats()
+        self._log(f"本次更新完成：共 {summary['total']} 个到期账号，"
+                  f"成功 {summary['success']} 个，失败 {summary['failed']} 个"
+                  f"（累计 HTTP 请求 {connections['requests']} 次，新建连接 {connections['connections_opened']} 个）")
+        return summary
+
+    def run_forever(self):
+        """
+        循环等待下一次执行时间。
+
+        每次轮询都会重新读取配置，修改 update_time 后无需重启进程。
+        """
+        run_at = next_run_time(get_app_config())
+        self._log(f"调度器已启动，下次执行时间：{run_at:%Y-%m-%d %H:%M:%S}")
+
+        while not self._stopped:
+            now = timezone.now()
+            if now >= run_at:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self._log(f"定时更新失败：{e}")
+                run_at = next_run_time(get_app_config(), now)
+                self._log(f"下次执行时间：{run_at:%Y-%m-%d %H:%M:%S}")
+                continue
+
+            expected = next_run_time(get_app_config(), now)
+            if expected != run_at:
+                run_at = expected
+                self._log(f"配置已变更，下次执行时间：{run_at:%Y-%m-%d %H:%M:%S}")
+
+            time.sleep(min(self.poll_seconds, max((run_at - now).total_seconds(), 0)))
@@ -0,0 +1,149 @@
+"""
+Access Token 内存缓存
+------------------------------------
+按邮箱缓存微软返回的 access token：
+
+  - 按真实 expires_in 计算过期时间，在过期前预留安全余量即视为失效
+  - 超过条目数或内存上限时按 LRU 顺序淘汰
+  - 统计命中、未命中、淘汰与过期次数
+
+缓存只存在于当前进程内，多进程部署时各进程各自维护。
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class AccessTokenCache:
+    """线程安全的 LRU access token 缓存"""
+
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, safety_margin=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.safety_margin = safety_margin
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # email -> (access_token, expires_at, size)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _entry_size(email, access_token):
+        """估算单个条目的内存占用（字节）"""
+        return sys.getsizeof(email) + sys.getsizeof(access_token) + 64
+
+    def get(self, email):
+        """
+        读取缓存的 access token。
+
+        返回：
+            dict: {'access_token', 'expires_in'}，未命中或即将过期返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            access_token, expires_at, size = entry
+            if expires_at - self.safety_margin <= now:
+                # 已进入安全余量，视为过期
+                del self._entries[email]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return {
+                'access_token': access_token,
+                'expires_in': int(expires_at - now),
+            }
+
+    def set(self, email, access_token, expires_in):
+        """写入缓存，expires_in 为微软返回的有效秒数"""
+        if not access_token or not expires_in:
+            return
+
+        try:
+            expires_in = int(expires_in)
+        except (TypeError, ValueError):
+            return
+
+        # 有效期不足安全余量的 token 缓存后也无法命中
+        if expires_in <= self.safety_margin:
+            return
+
+        size = self._entry_size(email, access_token)
+        expires_at = time.monotonic() + expires_in
+
+        with self._lock:
+            old = self._entries.pop(email, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._entries[email] = (access_token, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def invalidate(self, email):
+        """删除指定邮箱的缓存"""
+        with self._lock:
+            old = self._entries.pop(email, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def clear(self):
+        """清空缓存（统计数据保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        """超出上限时按 LRU 顺序淘汰，调用方需持有锁"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        """获取缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """获取进程级共享缓存（首次调用时按 settings 创建）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AccessTokenCache(
+                    max_entries=settings.ACCESS_TOKEN_CACHE_MAX_ENTRIES,
+                    max_bytes=settings.ACCESS_TOKEN_CACHE_MAX_BYTES,
+                    safety_margin=settings.ACCESS_TOKEN_CACHE_MARGIN_SECONDS,
+                )
+    return _cache
@@ -0,0 +1,141 @@
+"""
+Token 刷新引擎
+------------------------------------
+统一封装对微软 Token 接口的调用，并提供有界并发的批量刷新能力。
+
+  - request_token: 单个账号刷新，返回标准化结果字典
+  - refresh_accounts: 线程池并发刷新多个账号，结果顺序与输入一致
+
+刷新成功的 access token 会写入 token_cache，供获取 Token 的接口直接命中。
+
+工作线程只负责 HTTP 请求（共用 http_client 中的连接池），不访问数据库；
+数据库写入由调用方在主线程完成。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+
+from .http_client import get_http_session
+from .token_cache import get_token_cache
+
+
+def _empty_result(email):
+    """构造空的刷新结果"""
+    return {
+        'email': email,
+        'success': False,
+        'access_token': '',
+        'refresh_token': '',
+        'expires_in': 0,
+        'status_code': 0,
+        'error_type': '',         # http / network / unknown
+        'error_code': '',
+        'error_description': '',
+        'error_message': '',
+    }
+
+
+def request_token(account, timeout=None):
+    """
+    使用账号的 refresh token 调用微软接口获取新的 access token。
+
+    参数：
+        account: Account 实例（只读取 email、client_id、refresh_token）
+        timeout: 请求超时时间（秒），默认读取 settings.TOKEN_REQUEST_TIMEOUT
+
+    返回：
+        dict: 标准化的刷新结果，不会抛出异常
+    """
+    result = _empty_result(account.email)
+    token_data = {
+        'client_id': account.client_id,
+        'refresh_token': account.refresh_token,
+        'grant_type': 'refresh_token',
+    }
+
+    try:
+        response = get_http_session().post(
+            settings.MICROSOFT_TOKEN_URL,
+            data=token_data,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=timeout or settings.TOKEN_REQUEST_TIMEOUT
+        )
+
+        result['status_code'] = response.status_code
+
+        if response.status_code == 200:
+            token_response = response.json()
+            result['access_token'] = token_response.get('access_token')
+            result['refresh_token'] = token_response.get('refresh_token')
+            result['expires_in'] = token_response.get('expires_in', 3600)
+            result['success'] = True
+
+            # 新签发的 access token 写入缓存，后续请求直接命中
+            get_token_cache().set(account.email, result['access_token'], result['expires_in'])
+        else:
+            error_data = response.json()
+            result['error_type'] = 'http'
+            result['error_code'] = error_data.get('error', 'unknown_error')
+            result['error_description'] = error_data.get('error_description', '未知错误')
+            result['error_message'] = f"{result['error_code']}: {result['error_description']}"
+
+            if result['error_code'] == 'invalid_grant':
+                get_token_cache().invalidate(account.email)
+
+    except requests.JSONDecodeError as e:
+        # 响应体不是 JSON（requests 中它同时是 RequestException 的子类，需先于网络异常处理）
+        result['error_type'] = 'unknown'
+        result['error_message'] = f'响应解析失败: {e}'
+
+    except requests.RequestException as e:
+        result['error_type'] = 'network'
+        result['error_message'] = str(e)
+
+    except Exception as e:
+        result['error_type'] = 'unknown'
+        result['error_message'] = str(e)
+
+    return result
+
+
+def is_retryable(result):
+    """
+    判断失败结果是否值得重试（网络异常、限流、微软服务端错误）。
+
+    响应格式异常（如 200 但缺少 token）每次结果相同，不重试。
+    """
+    if result['success']:
+        return False
+    if result['error_type'] == 'network':
+        return True
+    return result['status_code'] == 429 or result['status_code'] >= 500
+
+
+def refresh_accounts(accounts, max_workers=None):
+    """
+    并发刷新多个账号的 Token。
+
+    参数：
+        accounts: Account 实例列表
+        max_workers: 最大并发请求数，默认读取 settings.TOKEN_REFRESH_MAX_WORKERS
+
+    返回：
+        list: 与 accounts 顺序一致的 (account, result) 列表
+    """
+    accounts = list(accounts)
+    if not accounts:
+        return []
+
+    max_workers = max_workers or settings.TOKEN_REFRESH_MAX_WORKERS
+    max_workers = max(1, min(max_workers, len(accounts)))
+
+    # 单个账号无需启动线程池
+    if max_workers == 1:
+        return [(account, request_token(account)) for account in accounts]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='token-refresh') as executor:
+        results = list(executor.map(request_token, accounts))
+
+    return list(zip(accounts, results))
@@ -0,0 +1,70 @@
+"""
+Token 刷新结果的批量持久化
+------------------------------------
+刷新循环中不再逐个 account.save() / TokenLog.objects.create()，
+而是先收集变更，再按块在单个事务内执行：
+
+  - Account: bulk_update，只更新 refresh_token、expires_at、status、last_updated
+  - TokenLog: bulk_create
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Account, TokenLog
+
+ACCOUNT_UPDATE_FIELDS = ['refresh_token', 'expires_at', 'status', 'last_updated']
+
+
+class TokenResultWriter:
+    """收集账号变更与日志，按块批量写入数据库"""
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or settings.TOKEN_DB_WRITE_CHUNK_SIZE
+        self._accounts = {}  # pk -> account，同一账号多次变更只写一次
+        self._logs = []
+        self.accounts_written = 0
+        self.logs_written = 0
+
+    def update_account(self, account):
+        """登记账号变更（bulk_update 不会触发 auto_now，这里手动更新 last_updated）"""
+        account.last_updated = timezone.now()
+        self._accounts[account.pk] = account
+        self._maybe_flush()
+
+    def add_log(self, **fields):
+        """登记一条 TokenLog"""
+        self._logs.append(TokenLog(**fields))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._accounts) >= self.chunk_size or len(self._logs) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """将已登记的变更在一个事务内写入数据库"""
+        if not self._accounts and not self._logs:
+            return
+
+        accounts = list(self._accounts.values())
+        logs = self._logs
+
+        with transaction.atomic():
+            if accounts:
+                Account.objects.bulk_update(accounts, ACCOUNT_UPDATE_FIELDS, batch_size=self.chunk_size)
+            if logs:
+                TokenLog.objects.bulk_create(logs, batch_size=self.chunk_size)
+
+        self.accounts_written += len(accounts)
+        self.logs_written += len(logs)
+        self._accounts = {}
+        self._logs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 出现异常时仍写入已完成的刷新结果，避免 refresh token 轮换后丢失
+        self.flush()
+        return False
@@ -2,17 +2,37 @@
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+import csv
+import gzip
 import json
+import os
 from datetime import datetime, timedelta
-import uuid
-import requests
 from .models import Account, Config, TokenLog
 from .utils.response import success_response, error_response
 from .utils.validator import validate_rfc3339_datetime, validate_email
+from .utils.token_engine import request_token, refresh_accounts
+from .utils.http_client import get_connection_stats
+from .utils.token_cache import get_token_cache
+from .utils.token_store import TokenResultWriter
+from .utils.scheduler import compute_expires_at, get_app_config, start_background_update
+from .utils.constants import (
+    OPERATION_TYPE_CHOICES,
+    OPERATION_TYPE_MANUAL,
+    RESULT_CHOICES,
+    RESULT_FAILED,
+    RESULT_SUCCESS,
+    TIME_RANGE_1DAY,
+    TIME_RANGE_7DAYS,
+    TIME_RANGE_CUSTOM,
+)
+from .utils.exceptions import ValidationException
+from .utils.pagination import keyset_paginate, cached_count
 
 
 # ============ 前端页面视图 ============
@@ -72,6 +92,21 @@ class AccountListView(View):
             if status != 'all' and status in ['normal', 'expired', 'abnormal']:
                 queryset = queryset.filter(status=status)
 
+            # 游标分页：按 (created_at, id) 定位，不执行 COUNT 和 OFFSET
+            cursor = request.GET.get('cursor', '').strip()
+            if cursor or request.GET.get('pagination') == 'cursor':
+                page_data = keyset_paginate(queryset, ('created_at', 'id'), page_size, cursor)
+                data = {
+                    'page_size': page_size,
+                    'next_cursor': page_data['next_cursor'],
+                    'prev_cursor': page_data['prev_cursor'],
+                    'items': [self._serialize(account) for account in page_data['items']]
+                }
+                # 总数可选，结果缓存一段时间
+                if request.GET.get('include_total') in ('1', 'true'):
+                    data['count'] = cached_count(queryset)
+                return success_response(data, '获取账号列表成功')
+
             # 排序（按创建时间倒序）
             queryset = queryset.order_by('-created_at')
 
@@ -86,15 +121,7 @@ class AccountListView(View):
                 accounts_page = paginator.page(paginator.num_pages)
 
             # 构建返回数据
-            items = []
-            for account in accounts_page:
-                items.append({
-                    'id': str(account.id),
-                    'email': account.email,
-                    'status': account.status,
-                    'last_updated': account.last_updated.strftime('%Y-%m-%d %H:%M:%S'),
-                    'remark': account.remark or ''
-                })
+            items = [self._serialize(account) for account in accounts_page]
 
             data = {
                 'count': paginator.count,
@@ -106,11 +133,24 @@ class AccountListView(View):
 
             return success_response(data, '获取账号列表成功')
 
+        except ValidationException as e:
+            return error_response(str(e), code=400)
         except ValueError as e:
             return error_response('参数格式错误', code=400)
         except Exception as e:
             return error_response(f'获取账号列表失败: {str(e)}', code=500)
 
+    @staticmethod
+    def _serialize(account):
+        """账号列表项"""
+        return {
+            'id': str(account.id),
+            'email': account.email,
+            'status': account.status,
+            'last_updated': account.last_updated.strftime('%Y-%m-%d %H:%M:%S'),
+            'remark': account.remark or ''
+        }
+
     def post(self, request):
         """添加账号"""
         try:
@@ -167,7 +207,7 @@ class AccountListView(View):
                 email=email,
                 client_id=client_id,
                 refresh_token=refresh_token,
-                expires_at=datetime(2099, 12, 31, 23, 59, 59),
+                expires_at=compute_expires_at(),
                 status='normal',
                 remark=remark
 
@@ -184,9 +224,7 @@ class AccountListView(View):
 
             # 记录日志（可选）
             try:
-                log_id = f"log_{uuid.uuid4().hex[:12]}"
                 TokenLog.objects.create(
-                    id=log_id,
                     email=account.email,
                     operation_type='manual_update',
                     result='success',
@@ -226,120 +264,101 @@ def refresh_all_tokens(request):
     """批量刷新所有账号的 Access Token"""
     try:
         # 获取所有账号
-        accounts = Account.objects.all()
+        accounts = list(Account.objects.all())
 
-        if not accounts.exists():
+        if not accounts:
             return error_response('没有找到任何账号', code=404)
 
         # 统计信息
-        total_count = accounts.count()
+        total_count = len(accounts)
         success_count = 0
         failed_count = 0
         results = []
-
-        # 微软 Token API 地址
-        token_url = 'https://login.microsoftonline.com/common/oauth2/v2.0/token'
-
-        # 遍历所有账号
-        for account in accounts:
-            email = account.email
-            result_item = {
-                'email': email,
-                'status': '',
-                'message': ''
-            }
-
-            try:
-                # 准备请求数据
-                token_data = {
-                    'client_id': account.client_id,
-                    'refresh_token': account.refresh_token,
-                    'grant_type': 'refresh_token',
+        expires_at = compute_expires_at()
+
+        # 账号变更和日志在离开 with 块时批量写入（出现异常时也会写入）
+        with TokenResultWriter() as writer:
+            # 并发请求微软 Token 接口，结果顺序与账号顺序一致
+            for account, token_result in refresh_accounts(accounts):
+                email = account.email
+                result_item = {
+                    'email': email,
+                    'status': '',
+                    'message': ''
                 }
 
-                # 发送请求
-                response = requests.post(
-                    token_url,
-                    data=token_data,
-                    headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                    timeout=30
-                )
-
-                # 处理响应
-                if response.status_code == 200:
-                    token_response = response.json()
-
-                    access_token = token_response.get('access_token')
-                    new_refresh_token = token_response.get('refresh_token')
-
-                    # 更新数据库
-                    if new_refresh_token:
-                        account.refresh_token = new_refresh_token
-                    account.expires_at = datetime(2099, 12, 31, 12, 59, 59)
-                    account.status = 'normal'
-                    account.save()
-
-                    # 记录成功日志
-                    log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    TokenLog.objects.create(
-                        id=log_id,
-                        email=email,
-                        operation_type='auto_update',
-                        result='success',
-                        result_detail=f'批量刷新成功，有效期至 {account.expires_at}'
-                    )
-
-                    success_count += 1
-                    result_item['status'] = 'success'
-                    result_item['message'] = 'Token 刷新成功'
+                try:
+                    # 处理响应
+                    if token_result['success']:
+                        new_refresh_token = token_result['refresh_token']
+
+                        # 更新数据库
+                        if new_refresh_token:
+                            account.refresh_token = new_refresh_token
+                        account.expires_at = expires_at
+                        account.status = 'normal'
+                        writer.update_account(account)
+
+                        # 记录成功日志
+                        writer.add_log(
+                            email=email,
+                            operation_type='auto_update',
+                            result='success',
+                            result_detail=f'批量刷新成功，有效期至 {account.expires_at}'
+                        )
+
+                        success_count += 1
+                        result_item['status'] = 'success'
+                        result_item['message'] = 'Token 刷新成功'
+
+                    elif token_result['error_type'] == 'http':
+                        # 处理失败情况
+                        error_code = token_result['error_code']
+                        error_description = token_result['error_description']
+
+                        # 记录失败日志
+                        writer.add_log(
+                            email=email,
+                            operation_type='auto_update',
+                            result='failed',
+                            result_detail=f'批量刷新失败: {error_code} - {error_description}'
+                        )
+
+                        # 如果是 invalid_grant 错误，更新账号状态
+                        if error_code == 'invalid_grant':
+                            account.status = 'expired'
+                            writer.update_account(account)
+
+                        failed_count += 1
+                        result_item['status'] = 'failed'
+                        result_item['message'] = f'{error_code}: {error_description}'
+
+                    elif token_result['error_type'] == 'network':
+                        # 网络请求异常
+                        writer.add_log(
+                            email=email,
+                            operation_type='auto_update',
+                            result='failed',
+                            result_detail=f"网络请求失败: {token_result['error_message']}"
+                        )
+
+                        failed_count += 1
+                        result_item['status'] = 'failed'
+                        result_item['message'] = f"网络请求失败: {token_result['error_message']}"
 
-                else:
-                    # 处理失败情况
-                    error_data = response.json()
-                    error_code = error_data.get('error', 'unknown_error')
-                    error_description = error_data.get('error_description', '未知错误')
-
-                    # 记录失败日志
-                    log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    TokenLog.objects.create(
-                        id=log_id,
-                        email=email,
-                        operation_type='auto_update',
-                        result='failed',
-                        result_detail=f'批量刷新失败: {error_code} - {error_description}'
-                    )
-
-                    # 如果是 invalid_grant 错误，更新账号状态
-                    if error_code == 'invalid_grant':
-                        account.status = 'expired'
-                        account.save()
+                    else:
+                        # 其他异常
+                        failed_count += 1
+                        result_item['status'] = 'failed'
+                        result_item['message'] = f"未知错误: {token_result['error_message']}"
 
+                except Exception as e:
+                    # 其他异常
                     failed_count += 1
                     result_item['status'] = 'failed'
-                    result_item['message'] = f'{error_code}: {error_description}'
-
-            except requests.RequestException as e:
-                # 网络请求异常
-                log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                TokenLog.objects.create(
-                    id=log_id,
-                    email=email,
-                    operation_type='auto_update',
-                    result='failed',
-                    result_detail=f'网络请求失败: {str(e)}'
-                )
+                    result_item['message'] = f'未知错误: {str(e)}'
 
-                failed_count += 1
-                result_item['status'] = 'failed'
-                result_item['message'] = f'网络请求失败: {str(e)}'
-
-            except Exception as e:
-                # 其他异常
-                failed_count += 1
-                result_item['status'] = 'failed'
-                result_item['message'] = f'未知错误: {str(e)}'
-
-            results.append(result_item)
+                results.append(result_item)
 
         # 构造响应数据
         response_data = {
@@ -348,6 +367,8 @@ def refresh_all_tokens(request):
                 'success': success_count,
                 'failed': failed_count
             },
+            # 进程级 HTTP 连接统计（请求数、新建连接数、复用次数）
+            'connections': get_connection_stats(),
             'details': results
         }
 
@@ -438,129 +459,139 @@ def batch_get_access_tokens(request):
         results = []
         success_count = 0
         failed_count = 0
+        token_cache = get_token_cache()
 
-        # 微软 Token_API 地址
-        token_url = 'https://login.microsoftonline.com/common/oauth2/v2.0/token'
-
-        # 遍历处理每个邮箱
+        # 先命中缓存，只有未命中的邮箱才需要查询数据库和请求微软接口
+        misses = []
         for email in emails:
             result = {
                 'email': email,
                 'access_token': '',
                 'message': '',
-                'success': False
+                'success': False,
+                'cached': False
             }
+            results.append(result)
 
+            # 验证邮箱格式
             try:
-                # 验证邮箱格式
-                try:
-                    validate_email(email)
-                except ValidationError:
-                    result['message'] = '邮箱格式不正确'
-                    results.append(result)
-                    failed_count += 1
-                    continue
-
-                # 查询账号是否存在
-                try:
-                    account = Account.objects.get(email=email)
-                except Account.DoesNotExist:
-                    result['message'] = '账号不存在'
-                    results.append(result)
-                    failed_count += 1
-                    continue
+                validate_email(email)
+            except ValidationError:
+                result['message'] = '邮箱格式不正确'
+                failed_count += 1
+                continue
+
+            cached = token_cache.get(email)
+            if cached:
+                result['access_token'] = cached['access_token']
+                result['message'] = 'access token 获取成功'
+                result['success'] = True
+                result['cached'] = True
+                success_count += 1
+                continue
+
+            misses.append(result)
+
+        # 一次查询所有账号，避免逐个查询
+        accounts_by_email = {}
+        if misses:
+            accounts_by_email = {
+                account.email: account
+                for account in Account.objects.filter(email__in=[result['email'] for result in misses])
+            }
 
-                # 准备请求数据
-                token_data = {
-                    'client_id': account.client_id,
-                    'refresh_token': account.refresh_token,
-                    'grant_type': 'refresh_token',
-                }
+        # 收集需要请求微软接口的账号
+        pending = []
+        expires_at = compute_expires_at()
+        for result in misses:
+            email = result['email']
 
-                # 发送请求
-                response = requests.post(
-                    token_url,
-                    data=token_data,
-                    headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                    timeout=30
-                )
+            # 查询账号是否存在
+            account = accounts_by_email.get(email)
+            if account is None:
+                result['message'] = '账号不存在'
+                failed_count += 1
+                continue
 
-                # 处理响应
-                if response.status_code == 200:
-                    token_response = response.json()
-
-                    access_token = token_response.get('access_token')
-                    expires_in = token_response.get('expires_in', 3600)
-                    new_refresh_token = token_response.get('refresh_token')
-
-                    # 更新数据库中的 refresh_token 和过期时间
-                    if new_refresh_token:
-                        account.refresh_token = new_refresh_token
-                    account.expires_at = datetime(2099, 12, 31, 12, 59, 59)
-                    account.status = 'normal'
-                    account.save()
-
-                    # 记录成功日志
-                    log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    TokenLog.objects.create(
-                        id=log_id,
-                        email=email,
-                        operation_type='manual_update',
-                        result='success',
-                        result_detail=f'批量获取 access token 成功，有效期至 {account.expires_at}'
-                    )
-
-                    # 构造成功响应
-                    result['access_token'] = access_token
-                    result['message'] = 'access token 获取成功'
-                    result['success'] = True
-                    success_count += 1
+            pending.append((account, result))
 
-                else:
-                    # 处理失败情况
-                    error_data = response.json()
-                    error_code = error_data.get('error', 'unknown_error')
-                    error_description = error_data.get('error_description', '未知错误')
-
-                    # 记录失败日志
-                    log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    TokenLog.objects.create(
-                        id=log_id,
-                        email=email,
-                        operation_type='manual_update',
-                        result='failed',
-                        result_detail=f'批量获取 access token 失败: {error_code} - {error_description}'
-                    )
-
-                    # 如果是 invalid_grant 错误，更新账号状态
-                    if error_code == 'invalid_grant':
-                        account.status = 'expired'
-                        account.save()
-                        result['message'] = f'token 已失效 (error: {error_code})，建议重新获取并录入 refresh token'
-                    else:
-                        result['message'] = f'{error_description} (error: {error_code})'
+        # 账号变更和日志在离开 with 块时批量写入（出现异常时也会写入）
+        with TokenResultWriter() as writer:
+            # 并发请求微软 Token 接口
+            token_results = refresh_accounts([account for account, _ in pending])
 
-                    failed_count += 1
+            for (account, result), (_, token_result) in zip(pending, token_results):
+                email = account.email
 
-            except requests.RequestException as e:
-                # 网络请求异常
-                log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                TokenLog.objects.create(
-                    id=log_id,
-                    email=email,
-                    operation_type='manual_update',
-                    result='failed',
-                    result_detail=f'批量获取 - 网络请求失败: {str(e)}'
-                )
-                result['message'] = f'网络请求失败：{str(e)}'
-                failed_count += 1
+                try:
+                    # 处理响应
+                    if token_result['success']:
+                        access_token = token_result['access_token']
+                        new_refresh_token = token_result['refresh_token']
+
+                        # 更新数据库中的 refresh_token 和过期时间
+                        if new_refresh_token:
+                            account.refresh_token = new_refresh_token
+                        account.expires_at = expires_at
+                        account.status = 'normal'
+                        writer.update_account(account)
+
+                        # 记录成功日志
+                        writer.add_log(
+                            email=email,
+                            operation_type='manual_update',
+                            result='success',
+                            result_detail=f'批量获取 access token 成功，有效期至 {account.expires_at}'
+                        )
+
+                        # 构造成功响应
+                        result['access_token'] = access_token
+                        result['message'] = 'access token 获取成功'
+                        result['success'] = True
+                        success_count += 1
+
+                    elif token_result['error_type'] == 'http':
+                        # 处理失败情况
+                        error_code = token_result['error_code']
+                        error_description = token_result['error_description']
+
+                        # 记录失败日志
+                        writer.add_log(
+                            email=email,
+                            operation_type='manual_update',
+                            result='failed',
+                            result_detail=f'批量获取 access token 失败: {error_code} - {error_description}'
+                        )
+
+                        # 如果是 invalid_grant 错误，更新账号状态
+                        if error_code == 'invalid_grant':
+                            account.status = 'expired'
+                            writer.update_account(account)
+                            result['message'] = f'token 已失效 (error: {error_code})，建议重新获取并录入 refresh token'
+                        else:
+                            result['message'] = f'{error_description} (error: {error_code})'
+
+                        failed_count += 1
+
+                    elif token_result['error_type'] == 'network':
+                        # 网络请求异常
+                        writer.add_log(
+                            email=email,
+                            operation_type='manual_update',
+                            result='failed',
+                            result_detail=f"批量获取 - 网络请求失败: {token_result['error_message']}"
+                        )
+                        result['message'] = f"网络请求失败：{token_result['error_message']}"
+                        failed_count += 1
 
-            except Exception as e:
-                # 其他未预期的错误
-                result['message'] = f'处理失败：{str(e)}'
-                failed_count += 1
+                    else:
+                        result['message'] = f"处理失败：{token_result['error_message']}"
+                        failed_count += 1
 
-            results.append(result)
+                except Exception as e:
+                    # 其他未预期的错误
+                    result['message'] = f'处理失败：{str(e)}'
+                    failed_count += 1
 
         # 构造返回数据
         response_data = {
@@ -615,105 +646,100 @@ def get_access_token(request):
             return  error_response('账号不存在', code=404)
 
 
-        # 调用微软 API 获取 access token
-        token_url = 'https://login.microsoftonline.com/common/oauth2/v2.0/token'
-
-        token_data = {
-            'client_id': account.client_id,
-            'refresh_token': account.refresh_token,
-            'grant_type': 'refresh_token',
-        }
-
-        # 发送请求
-        response = requests.post(
-            token_url,
-            data=token_data,
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            timeout=30
-        )
-
-        # 处理响应
-        if response.status_code == 200:
-            token_response = response.json()
-            print("Response JSON:", token_response)
-
-            access_token = token_response.get('access_token')
-            expires_in = token_response.get('expires_in', 3600)
-            new_refresh_token = token_response.get('refresh_token')
-
-            # 更新数据库中的 refresh_token 和过期时间
-            if new_refresh_token:
-                account.refresh_token = new_refresh_token
-            account.expires_at = datetime(2099,12,31,12,59,59)
-            account.status = 'normal'
-            account.save()
-
-            # 记录日志
-            log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            TokenLog.objects.create(
-                id=log_id,
-                email=email,
-                operation_type='manual_update',
-                result='success',
-                result_detail=f'成功获取 access token，有效期至 {account.expires_at}'
-            )
-
-            # 构造响应数据
+        # 缓存命中时直接返回，无需请求微软接口
+        cached = get_token_cache().get(email)
+        if cached:
             response_data = {
                 'email': email,
-                'access_token': access_token,
-                'expires_in': expires_in,
+                'access_token': cached['access_token'],
+                'expires_in': cached['expires_in'],
                 'expires_at': account.expires_at,
-                'new_refresh_token': new_refresh_token if new_refresh_token else account.refresh_token,
+                'new_refresh_token': account.refresh_token,
                 'last_updated': account.last_updated.strftime('%Y-%m-%d %H:%M:%S')
             }
-
             return success_response(response_data, 'access token 获取成功')
 
 
-        else:
-            # 处理失败情况
-            error_data = response.json()
-            error_code = error_data.get('error', 'unknown_error')
-            error_description = error_data.get('error_description', '未知错误')
-
-            # 记录失败日志
-            log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            TokenLog.objects.create(
-                id=log_id,
-                email=email,
-                operation_type='manual_update',
-                result='failed',
-                result_detail=f'获取 access token 失败: {error_code} - {error_description}'
-            )
+        # 调用微软 API 获取 access token（与批量接口共用刷新引擎）
+        token_result = request_token(account)
+        expires_at = compute_expires_at()
 
-            # 如果是 invalid_grant 错误，更新账号状态
-            if error_code == 'invalid_grant':
-                account.status = 'expired'
-                account.save()
-                error_message = f'access token 获取失败：token 已失效 (error: {error_code})，建议重新获取并录入 refresh token'
-            else:
-                error_message = f'access token 获取失败：{error_description} (error: {error_code})'
+        # 账号变更和日志在离开 with 块时写入（出现异常时也会写入）
+        with TokenResultWriter() as writer:
+            # 处理响应
+            if token_result['success']:
+                access_token = token_result['access_token']
+                expires_in = token_result['expires_in']
+                new_refresh_token = token_result['refresh_token']
 
-            return error_response(error_message, code=500)
+                # 更新数据库中的 refresh_token 和过期时间
+                if new_refresh_token:
+                    account.refresh_token = new_refresh_token
+                account.expires_at = expires_at
+                account.status = 'normal'
+                writer.update_account(account)
 
+                # 记录日志
+                writer.add_log(
+                    email=email,
+                    operation_type='manual_update',
+                    result='success',
+                    result_detail=f'成功获取 access token，有效期至 {account.expires_at}'
+                )
 
-    except json.JSONDecodeError:
-        return error_response('请求体格式错误', code=400)
+                # 构造响应数据
+                response_data = {
+                    'email': email,
+                    'access_token': access_token,
+                    'expires_in': expires_in,
+                    'expires_at': account.expires_at,
+                    'new_refresh_token': new_refresh_token if new_refresh_token else account.refresh_token,
+                    'last_updated': account.last_updated.strftime('%Y-%m-%d %H:%M:%S')
+                }
+
+                return success_response(response_data, 'access token 获取成功')
+
+
+            elif token_result['error_type'] == 'http':
+                # 处理失败情况
+                error_code = token_result['error_code']
+                error_description = token_result['error_description']
+
+                # 记录失败日志
+                writer.add_log(
+                    email=email,
+                    operation_type='manual_update',
+                    result='failed',
+                    result_detail=f'获取 access token 失败: {error_code} - {error_description}'
+                )
+
+                # 如果是 invalid_grant 错误，更新账号状态
+                if error_code == 'invalid_grant':
+                    account.status = 'expired'
+                    writer.update_account(account)
+                    error_message = f'access token 获取失败：token 已失效 (error: {error_code})，建议重新获取并录入 refresh token'
+                else:
+                    error_message = f'access token 获取失败：{error_description} (error: {error_code})'
+
+                return error_response(error_message, code=500)
+
+            elif token_result['error_type'] == 'network':
+                # 网络请求异常
+                writer.add_log(
+                    email=email,
+                    operation_type='manual_update',
+                    result='failed',
+                    result_detail=f"网络请求失败: {token_result['error_message']}"
+                )
 
+                return error_response(f"网络请求失败：{token_result['error_message']}", code=500)
 
-    except requests.RequestException as e:
-        # 网络请求异常
-        log_id = f"{email}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        TokenLog.objects.create(
-            id=log_id,
-            email=email,
-            operation_type='manual_update',
-            result='failed',
-            result_detail=f'网络请求失败: {str(e)}'
-        )
+            else:
+                return error_response(f"服务器内部错误：{token_result['error_message']}", code=500)
 
-        return error_response(f'网络请求失败：{str(e)}', code=500)
+
+    except json.JSONDecodeError:
+        return error_response('请求体格式错误', code=400)
 
 
     except Exception as e:
@@ -815,32 +841,77 @@ def update_single(request):
 def update_all(request):
     """全部账号更新"""
     try:
-        # TODO: 实现实际逻辑
-        response_data = {
-            'total': 100,
-            'success': 95,
-            'failed': 5,
-            'details': [
-                {
-                    'email': 'test1@outlook.com',
-                    'status': 'success',
-                    'expires_at': '2024-06-21 15:30:00'
-                },
-                {
-                    'email': 'test2@outlook.com',
-                    'status': 'failed',
-                    'error': 'token 已失效'
-                }
-            ]
-        }
+        accounts = list(Account.objects.all())
+        if not accounts:
+            return error_response('没有找到任何账号', code=404)
+
+        # 与定时任务共用刷新与重试逻辑，在后台线程中执行，刷新结果写入操作日志
+        if not start_background_update(accounts, get_app_config(), operation_type=OPERATION_TYPE_MANUAL):
+            return error_response('已有全部更新任务正在执行，请稍后查看操作日志', code=409)
 
-        return success_response(response_data, '全部账号更新完成')
+        response_data = {'total': len(accounts), 'status': 'running'}
+        return success_response(response_data, '全部账号更新已开始，结果请查看操作日志', status_code=202)
     except Exception as e:
         return error_response(str(e), code=500)
 
 
 # ============ 日志管理 API ============
 
+LOG_LIST_FIELDS = ('id', 'operation_time', 'email', 'operation_type', 'result', 'result_detail')
+
+
+def build_log_queryset(params):
+    """
+    根据筛选参数构建日志查询（日志列表与日志导出共用）。
+
+    参数：
+        params: 包含 time_range、start_time、end_time、email、result 的字典
+
+    返回：
+        按条件筛选后的 TokenLog QuerySet（未排序）
+
+    异常：
+        ValidationException: 参数不合法
+    """
+    time_range = params.get('time_range') or TIME_RANGE_7DAYS
+    email = (params.get('email') or '').strip()
+    result = params.get('result') or 'all'
+
+    queryset = TokenLog.objects.all()
+
+    # 预设时间范围取整到分钟，同一分钟内的查询 SQL 相同，便于缓存总数
+    now = timezone.now().replace(second=0, microsecond=0)
+    if time_range == TIME_RANGE_1DAY:
+        queryset = queryset.filter(operation_time__gte=now - timedelta(days=1))
+    elif time_range == TIME_RANGE_7DAYS:
+        queryset = queryset.filter(operation_time__gte=now - timedelta(days=7))
+    elif time_range == TIME_RANGE_CUSTOM:
+        start_time = (params.get('start_time') or '').strip()
+        end_time = (params.get('end_time') or '').strip()
+        if not start_time or not end_time:
+            raise ValidationException('自定义时间范围需要提供 start_time 和 end_time')
+        if not validate_rfc3339_datetime(start_time) or not validate_rfc3339_datetime(end_time):
+            raise ValidationException('时间格式不正确，应为 YYYY-MM-DD HH:MM:SS')
+        start = timezone.make_aware(datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S'))
+        end = timezone.make_aware(datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S'))
+        if start > end:
+            raise ValidationException('开始时间不能晚于结束时间')
+        queryset = queryset.filter(operation_time__gte=start, operation_time__lte=end)
+    else:
+        raise ValidationException('time_range 参数无效')
+
+    # 邮箱精确匹配，走 (email, operation_time) 联合索引
+    if email:
+        queryset = queryset.filter(email=email)
+
+    if result != 'all':
+        if result not in (RESULT_SUCCESS, RESULT_FAILED):
+            raise ValidationException('result 参数无效')
+        queryset = queryset.filter(result=result)
+
+    return queryset
+
+
 class LogListView(View):
     """日志列表视图"""
 
@@ -850,58 +921,160 @@ class LogListView(View):
 
     def get(self, request):
         """获取更新日志"""
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        time_range = request.GET.get('time_range', '7days')
-        email = request.GET.get('email', '')
-        result = request.GET.get('result', 'all')
+        try:
+            page = int(request.GET.get('page', 1))
+            page_size = int(request.GET.get('page_size', 20))
 
-        # TODO: 实现实际逻辑
+            if page < 1:
+                page = 1
+            if page_size not in [10, 20, 50, 100]:
+                page_size = 20
 
-        data = {
-            'count': 150,
-            'total_pages': 8,
-            'current_page': page,
-            'page_size': page_size,
-            'items': [
-                {
-                    'id': 'log_550e8400',
-                    'operation_time': '2024-05-21 15:30:00',
-                    'email': 'test@outlook.com',
-                    'operation_type': 'manual_update',
-                    'result': 'success',
-                    'result_detail': '新 token 有效期至 2024-06-21 15:30:00'
-                },
-                {
-                    'id': 'log_550e8401',
-                    'operation_time': '2024-05-21 14:00:00',
-                    'email': 'test2@outlook.com',
-                    'operation_type': 'auto_update',
-                    'result': 'failed',
-                    'result_detail': 'error: invalid_grant，token 已失效'
+            # 只取需要的列，不构建模型实例
+            queryset = build_log_queryset(request.GET).values(*LOG_LIST_FIELDS)
+
+            # 游标分页：按 (operation_time, id) 定位，深度翻页成本不变
+            cursor = request.GET.get('cursor', '').strip()
+            if cursor or request.GET.get('pagination') == 'cursor':
+                page_data = keyset_paginate(queryset, ('operation_time', 'id'), page_size, cursor)
+                data = {
+                    'page_size': page_size,
+                    'next_cursor': page_data['next_cursor'],
+                    'prev_cursor': page_data['prev_cursor'],
+                    'items': [self._serialize(row) for row in page_data['items']]
                 }
-            ]
+                if request.GET.get('include_total') in ('1', 'true'):
+                    data['count'] = cached_count(queryset)
+                return success_response(data, '获取日志成功')
+
+            # 页码分页：总数按查询缓存，避免每次请求都 COUNT
+            count = cached_count(queryset)
+            total_pages = max((count + page_size - 1) // page_size, 1)
+            page = min(page, total_pages)
+            offset = (page - 1) * page_size
+            rows = queryset.order_by('-operation_time', '-id')[offset:offset + page_size]
+
+            data = {
+                'count': count,
+                'total_pages': total_pages,
+                'current_page': page,
+                'page_size': page_size,
+                'items': [self._serialize(row) for row in rows]
+            }
+
+            return success_response(data, '获取日志成功')
+
+        except ValidationException as e:
+            return error_response(str(e), code=400)
+        except ValueError:
+            return error_response('参数格式错误', code=400)
+        except Exception as e:
+            return error_response(f'获取日志失败: {str(e)}', code=500)
+
+    @staticmethod
+    def _serialize(row):
+        """日志列表项（ID 超出 JS 安全整数范围，以字符串返回）"""
+        return {
+            'id': str(row['id']),
+            'operation_time': timezone.localtime(row['operation_time']).strftime('%Y-%m-%d %H:%M:%S'),
+            'email': row['email'],
+            'operation_type': row['operation_type'],
+            'result': row['result'],
+            'result_detail': row['result_detail']
         }
 
-        return success_response(data, '获取日志成功')
+
+LOG_EXPORT_HEADER = ['日志ID', '操作时间', '账号邮箱', '操作类型', '操作结果', '结果详情']
+
+
+class _EchoBuffer:
+    """csv.writer 的伪文件对象：write 直接返回内容，不做缓存"""
+
+    def write(self, value):
+        return value
+
+
+def _iter_log_rows(queryset):
+    """按块从数据库游标读取日志，逐行产出 CSV 字段"""
+    operation_labels = dict(OPERATION_TYPE_CHOICES)
+    result_labels = dict(RESULT_CHOICES)
+    # 当前时区只取一次，timezone.localtime() 每次调用都要查询线程局部变量
+    current_tz = timezone.get_current_timezone()
+    rows = (queryset
+            .order_by('-operation_time', '-id')
+            .values_list(*LOG_LIST_FIELDS)
+            .iterator(chunk_size=settings.LOG_EXPORT_CHUNK_SIZE))
+
+    for log_id, operation_time, email, operation_type, result, result_detail in rows:
+        yield [
+            str(log_id),
+            operation_time.astimezone(current_tz).strftime('%Y-%m-%d %H:%M:%S'),
+            email,
+            operation_labels.get(operation_type, operation_type),
+            result_labels.get(result, result),
+            result_detail,
+        ]
+
+
+def _stream_log_csv(queryset):
+    """生成 CSV 文本流，带 BOM 以便 Excel 正确识别 UTF-8；每块合并多行发送，减少写 socket 次数"""
+    writer = csv.writer(_EchoBuffer())
+    yield '\ufeff' + writer.writerow(LOG_EXPORT_HEADER)
+
+    lines = []
+    for row in _iter_log_rows(queryset):
+        lines.append(writer.writerow(row))
+        if len(lines) >= settings.LOG_EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
 
 
 @csrf_exempt
 @require_http_methods(['POST'])
 def export_logs(request):
-    """导出日志为 CSV"""
+    """
+    导出日志为 CSV
+
+    默认以流式响应直接下载，边查询边发送，内存占用与日志总量无关；
+    请求体中 save_to_file 为 true 时，改为写入 LOG_EXPORT_DIR 下的 gzip 文件并返回文件信息。
+    """
     try:
-        data = json.loads(request.body)
-        # TODO: 参数验证
-        # TODO: 生成 CSV 文件
+        data = json.loads(request.body) if request.body else {}
+        if not isinstance(data, dict):
+            return error_response('参数格式错误', code=400)
+        queryset = build_log_queryset(data)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        file_name = f'outlook_token_update_{timestamp}.csv'
+
+        if not data.get('save_to_file'):
+            response = StreamingHttpResponse(_stream_log_csv(queryset), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+            return response
+
+        # 写入压缩文件
+        file_name += '.gz'
+        file_path = os.path.join(settings.LOG_EXPORT_DIR, file_name)
+        row_count = 0
+        with gzip.open(file_path, 'wt', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(LOG_EXPORT_HEADER)
+            for row in _iter_log_rows(queryset):
+                writer.writerow(row)
+                row_count += 1
 
         response_data = {
-            'file_path': 'D:\\Logs\\outlook_token_update_20240521.csv',
-            'file_name': 'outlook_token_update_20240521.csv',
-            'row_count': 150
+            'file_path': file_path,
+            'file_name': file_name,
+            'row_count': row_count
         }
 
         return success_response(response_data, '日志导出成功')
+    except json.JSONDecodeError:
+        return error_response('请求体格式错误', code=400)
+    except ValidationException as e:
+        return error_response(str(e), code=400)
     except Exception as e:
         return error_response(str(e), code=500)
-
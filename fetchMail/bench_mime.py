@@ -0,0 +1,90 @@
+"""
+邮件解析性能测试
+------------------------------------
+生成一批带大附件的邮件（默认每封 2~6 MB），对比：
+
+  - 原路径：email.message_from_bytes 构建完整 MIME 树 + extract_body_preview 解码整个正文
+  - 快速路径：parse_mail（只解析邮件头，按 boundary 定位第一个 text/plain 部分并解码开头）
+
+并校验两条路径得到的主题、发件人、正文预览一致。
+
+用法：
+  python bench_mime.py --mails 100 --attachment-mb 4
+"""
+
+import argparse
+import email
+import random
+import time
+from email.message import EmailMessage
+from email.utils import parseaddr
+
+from script import decode_mime_header, extract_body_preview, parse_mail
+
+BODIES = [
+    ("你好，这是一封测试邮件。请查收附件中的报表。" * 20, "utf-8", "base64"),
+    ("Résumé attached — café meeting notes. " * 30, "utf-8", "quoted-printable"),
+    ("Plain ascii body with some numbers 12345. " * 25, "us-ascii", "7bit"),
+    ("简体中文 GB 编码的正文内容。" * 20, "gb2312", "base64"),
+]
+
+
+def make_mail(rng, i, attachment_bytes):
+    text, charset, cte = BODIES[i % len(BODIES)]
+    msg = EmailMessage()
+    msg["Subject"] = f"=?utf-8?b?5rWL6K+V6YKu5Lu2?= #{i} 月度报表"
+    msg["From"] = f"=?utf-8?b?5byg5LiJ?= <sender{i % 20}@example.com>"
+    msg["To"] = "me@outlook.com, other@example.com"
+    msg["Date"] = "Mon, 01 Sep 2025 10:00:00 +0800"
+    msg["Message-ID"] = f"<bench{i}@example.com>"
+    msg.set_content(text, charset=charset, cte=cte)
+    if i % 3 == 0:
+        msg.add_alternative(f"<p>{text}</p>", subtype="html")
+    msg.add_attachment(rng.randbytes(attachment_bytes), maintype="application",
+                       subtype="octet-stream", filename=f"report{i}.bin")
+    return msg.as_bytes()
+
+
+def legacy_parse(raw_email):
+    """优化前的解析路径"""
+    msg = email.message_from_bytes(raw_email)
+    return {
+        "subject": decode_mime_header(msg.get("Subject", "(无主题)")),
+        "from": parseaddr(msg.get("From", ""))[1],
+        "body_preview": extract_body_preview(msg)[:200],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件解析性能测试")
+    parser.add_argument("--mails", type=int, default=60, help="邮件数量")
+    parser.add_argument("--attachment-mb", type=float, default=4, help="附件平均大小（MB）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    size = int(args.attachment_mb * 1024 * 1024)
+    corpus = [make_mail(rng, i, rng.randint(size // 2, size * 3 // 2)) for i in range(args.mails)]
+    total_mb = sum(len(raw) for raw in corpus) / 1024 / 1024
+    print(f"语料：{len(corpus)} 封，共 {total_mb:.1f} MB")
+
+    start = time.perf_counter()
+    legacy = [legacy_parse(raw) for raw in corpus]
+    legacy_elapsed = time.perf_counter() - start
+    print(f"原路径：{legacy_elapsed:.2f}s（{legacy_elapsed / len(corpus) * 1000:.1f} ms/封）")
+
+    start = time.perf_counter()
+    fast = [parse_mail(raw, str(i)) for i, raw in enumerate(corpus)]
+    fast_elapsed = time.perf_counter() - start
+    print(f"快速路径：{fast_elapsed:.3f}s（{fast_elapsed / len(corpus) * 1000:.2f} ms/封），"
+          f"加速 x{legacy_elapsed / fast_elapsed:.0f}")
+
+    mismatches = [
+        i for i, (a, b) in enumerate(zip(legacy, fast))
+        if any(a[key] != b[key] for key in ("subject", "from", "body_preview"))
+    ]
+    print(f"结果校验：{len(mismatches)} 封不一致 {mismatches[:10]}")
+
+
+if __name__ == "__main__":
+    main()
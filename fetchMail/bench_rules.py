@@ -0,0 +1,125 @@
+"""
+规则引擎性能测试
+------------------------------------
+随机生成 N 条规则和 M 封邮件，对比：
+
+  - 逐条规则逐个关键词 `in` / re.search 的朴素实现（抽样后按比例估算）
+  - RuleEngine（_FieldMatcher 按 1/2/3 字符 n-gram 分层的字面量索引，正则挂在其字面量前缀上）
+
+并在抽样邮件上校验两者的命中结果一致。
+
+用法：
+  python bench_rules.py --rules 10000 --mails 100000
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+
+from rules import DEFAULT_FIELDS, RuleEngine
+
+CJK = [chr(c) for c in range(0x4e00, 0x4e00 + 2000)]
+
+
+def random_word(rng):
+    if rng.random() < 0.3:
+        return "".join(rng.choice(CJK) for _ in range(rng.randint(2, 4)))
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def make_rules(rng, vocab, count):
+    rules = []
+    for i in range(count):
+        rule = {"name": f"rule{i}"}
+        kind = rng.random()
+        if kind < 0.02:
+            word = rng.choice(vocab)
+            rule["regex"] = [re.escape(word) + r"\s*#?\d{2,}"]
+        else:
+            rule["keywords"] = rng.sample(vocab, rng.randint(1, 3))
+            if rng.random() < 0.3:
+                rule["fields"] = ["subject"]
+        if kind > 0.95:
+            rule["sender_domains"] = [f"d{rng.randint(0, 199)}.com"]
+        rules.append(rule)
+    return rules
+
+
+def make_mails(rng, vocab, count):
+    filler = [random_word(rng) for _ in range(5000)]
+    mails = []
+    for i in range(count):
+        words = [rng.choice(vocab) if rng.random() < 0.02 else rng.choice(filler) for _ in range(40)]
+        mails.append({
+            "subject": " ".join(words[:8]),
+            "from": f"user{i % 1000}@d{i % 250}.com",
+            "body_preview": " ".join(words[8:])[:200] + f" {i}",
+        })
+    return mails
+
+
+def naive_match(rules, mail):
+    """逐条规则检查（与 RuleEngine 的语义一致）"""
+    texts = {"subject": mail["subject"], "sender": mail["from"], "body": mail["body_preview"]}
+    domain = mail["from"].rpartition("@")[2].lower()
+    matched = []
+
+    for rule in rules:
+        fields = rule.get("fields") or DEFAULT_FIELDS
+        keywords = [k.lower() for k in rule.get("keywords", [])]
+        patterns = rule.get("regex", [])
+        domains = rule.get("sender_domains", [])
+
+        if keywords or patterns:
+            hit = any(k in texts[f].lower() for f in fields for k in keywords) or \
+                any(re.search(p, texts[f], re.IGNORECASE) for f in fields for p in patterns)
+            if not hit:
+                continue
+        if domains and not any(domain == d or domain.endswith("." + d) for d in domains):
+            continue
+        matched.append(rule["name"])
+
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规则引擎性能测试")
+    parser.add_argument("--rules", type=int, default=10000, help="规则数量")
+    parser.add_argument("--mails", type=int, default=100000, help="邮件数量")
+    parser.add_argument("--naive-sample", type=int, default=500, help="朴素实现抽样的邮件数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = list({random_word(rng) for _ in range(args.rules * 2)})
+    rules = make_rules(rng, vocab, args.rules)
+    mails = make_mails(rng, vocab, args.mails)
+
+    start = time.perf_counter()
+    engine = RuleEngine(rules)
+    print(f"编译 {len(rules)} 条规则：{time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    results = [engine.match(mail) for mail in mails]
+    elapsed = time.perf_counter() - start
+    matched = sum(1 for r in results if r)
+    print(f"RuleEngine：{len(mails)} 封 {elapsed:.2f}s（{len(mails) / elapsed:,.0f} 封/秒），"
+          f"命中 {matched} 封，命中规则 {len(engine.hits)} 条")
+
+    sample = mails[:args.naive_sample]
+    start = time.perf_counter()
+    naive = [naive_match(rules, mail) for mail in sample]
+    naive_elapsed = time.perf_counter() - start
+    per_mail = naive_elapsed / len(sample)
+    print(f"朴素实现：{len(sample)} 封 {naive_elapsed:.2f}s（{1 / per_mail:,.0f} 封/秒），"
+          f"估算 {len(mails)} 封需 {per_mail * len(mails):.0f}s，"
+          f"加速 x{per_mail * len(mails) / elapsed:.0f}")
+
+    mismatches = sum(1 for a, b in zip(results, naive) if a != b)
+    print(f"抽样校验：{len(sample)} 封中 {mismatches} 封结果不一致")
+
+
+if __name__ == "__main__":
+    main()
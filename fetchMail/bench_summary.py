@@ -0,0 +1,151 @@
+"""
+汇总报告渲染性能测试
+------------------------------------
+生成 N 封模拟邮件，对比：
+
+  - 原实现：每行 html += f\"\"\"...\"\"\" 拼接整份报告（字段不转义），再整体写入文件
+  - generate_mail_table_html：预编译模板 + 分块 join，字段批量 HTML 转义
+  - write_mail_table_html：逐块写入文件，不在内存中保留整份报告
+
+并统计各自的峰值内存（tracemalloc）。
+
+注意：CPython 对 s += t 有原地扩容优化，只要字符串没有其他引用，原实现实际是线性的；
+在没有该优化的解释器上或字符串被其他变量引用时才会退化为平方复杂度。
+
+用法：
+  python bench_summary.py --mails 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from summarize import _CSS, generate_mail_table_html, summarize_mails, write_mail_table_html
+
+
+def make_mails(rng, count):
+    start = datetime(2025, 10, 1)
+    mails_by_account = {f"user{i}@outlook.com": [] for i in range(5)}
+    accounts = list(mails_by_account)
+    for i in range(count):
+        mails_by_account[accounts[i % len(accounts)]].append({
+            "id": str(i),
+            # 约 1/10 的主题含需要转义的字符
+            "subject": f"订单 #{i} 的发货通知" + (" <重要> & 请查收" if i % 10 == 0 else "") + "x" * rng.randint(0, 40),
+            "from": f"sender{rng.randint(0, 999)}@example.com",
+            "to": [accounts[i % len(accounts)]],
+            "received_time": (start + timedelta(seconds=rng.randint(0, 86400 * 30))).isoformat(),
+            "is_read": rng.random() < 0.5,
+            "body_preview": "您好，您的订单已发货，预计 3 天内送达。" * rng.randint(1, 8),
+        })
+    return mails_by_account
+
+
+def legacy_mail_list(summary):
+    """优化前 summarize_mails 产出的字典列表"""
+    return [
+        {
+            "account": m.account, "subject": m.subject, "from": m.sender,
+            "received_time": m.received_time, "body_preview": m.body_preview,
+        }
+        for m in summary["mail_list"]
+    ]
+
+
+def legacy_generate_mail_table_html(summary, mail_list, title="邮件汇总列表"):
+    """优化前的实现（样式相同，行拼接方式与原函数一致）"""
+    stats = summary.get("stats", {})
+    html = f"""
+    <html><head><title>{title}</title><style>{_CSS}</style></head><body>
+    <div>{summary.get('total_mails', 0)} {summary.get('total_accounts', 0)}
+    {len(stats.get('by_sender', {}))} {stats.get('total_unread', 0)}</div>
+    <table><tbody>
+    """
+    for idx, mail in enumerate(mail_list, 1):
+        received_time = mail.get("received_time", "")
+        try:
+            if received_time:
+                dt = datetime.fromisoformat(received_time.replace('Z', '+00:00'))
+                time_display = dt.strftime('%m-%d %H:%M')
+            else:
+                time_display = "未知"
+        except ValueError:
+            time_display = received_time[:16] if received_time else "未知"
+
+        subject = mail.get("subject", "(无主题)")
+        if len(subject) > 50:
+            subject = subject[:50] + "..."
+        sender = mail.get("from", "未知")
+        if len(sender) > 35:
+            sender = sender[:35] + "..."
+        body_preview = mail.get("body_preview", "")
+        if len(body_preview) > 100:
+            body_preview = body_preview[:100] + "..."
+        account = mail.get("account", "未知")
+        account_display = account.split('@')[0] if '@' in account else account
+
+        html += f"""
+                    <tr>
+                        <td class="index-cell">{idx}</td>
+                        <td><span class="account-badge">{account_display}</span></td>
+                        <td class="subject-cell" title="{mail.get('subject', '(无主题)')}">{subject}</td>
+                        <td class="sender-cell" title="{mail.get('from', '未知')}">{sender}</td>
+                        <td class="time-cell">{time_display}</td>
+                        <td class="preview-cell">{body_preview}</td>
+                    </tr>
+        """
+    html += "</tbody></table></body></html>"
+    return html
+
+
+def measure(label, func, repeat=3):
+    """取 repeat 次中的最短耗时，再单独跑一遍用 tracemalloc 统计峰值内存（tracemalloc 会显著拖慢计时）"""
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func()
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label}：{elapsed:.2f}s，输出 {size / 1024 / 1024:.1f} MB，峰值内存 {peak / 1024 / 1024:.1f} MB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总报告渲染性能测试")
+    parser.add_argument("--mails", type=int, default=100000, help="邮件数量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    summary = summarize_mails(make_mails(random.Random(args.seed), args.mails))
+    legacy_list = legacy_mail_list(summary)
+    print(f"邮件数：{summary['total_mails']}")
+
+    joined = measure("generate_mail_table_html（内存）", lambda: len(generate_mail_table_html(summary)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "summary.html")
+
+        def legacy_save():
+            with open(path, "w", encoding="utf-8") as f:
+                return f.write(legacy_generate_mail_table_html(summary, legacy_list))
+
+        def stream():
+            with open(path, "w", encoding="utf-8") as f:
+                return write_mail_table_html(summary, f)
+
+        legacy = measure("原实现（写文件）", legacy_save)
+        streamed = measure("write_mail_table_html（写文件）", stream)
+
+    print(f"写文件耗时比：x{legacy / streamed:.2f}，generate_mail_table_html 耗时 {joined:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
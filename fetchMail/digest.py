@@ -0,0 +1,332 @@
+"""
+可合并的邮件摘要
+------------------------------------
+MailDigest 逐封累加邮件统计（总数、未读数、各账号数量、时间范围、主要发件人），
+两个摘要可以直接合并，因此可以按天 / 按分片分别统计后再汇总：
+
+  - 各账号数量、总数、未读数是精确计数
+  - 发件人数量用 Count-Min Sketch 估算（只会高估，误差上限约 总数 * e / width），
+    另外维护一个有界的候选集合记录估计值最大的发件人，内存与发件人数量无关
+  - to_dict() / from_dict() 可序列化为 JSON，合并结果与一次性统计全部邮件一致
+    （主要发件人在候选集合容量内一致）
+
+DigestStore 将按天的部分摘要持久化到 SQLite，日报 / 周报直接合并已有的部分摘要，
+不需要重新处理旧邮件。部分摘要是累加的，同一封邮件只应写入一次（配合增量同步使用）。
+"""
+
+import hashlib
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from summarize import parse_received_time
+
+
+class CountMinSketch:
+    """Count-Min Sketch（哈希使用 blake2b，跨进程结果一致，可持久化后合并）"""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.tables = [[0] * width for _ in range(depth)]
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [
+            int.from_bytes(digest[i * 4:i * 4 + 4], "little") % self.width
+            for i in range(self.depth)
+        ]
+
+    def add(self, key, count=1):
+        """累加并返回 key 的估计值"""
+        estimate = None
+        for table, index in zip(self.tables, self._indexes(key)):
+            table[index] += count
+            if estimate is None or table[index] < estimate:
+                estimate = table[index]
+        return estimate
+
+    def estimate(self, key):
+        return min(table[index] for table, index in zip(self.tables, self._indexes(key)))
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"Count-Min Sketch 尺寸不一致：{self.width}x{self.depth} 与 {other.width}x{other.depth}")
+        for table, other_table in zip(self.tables, other.tables):
+            for index, value in enumerate(other_table):
+                if value:
+                    table[index] += value
+        return self
+
+    def to_dict(self):
+        return {"width": self.width, "depth": self.depth, "tables": self.tables}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["width"], data["depth"])
+        sketch.tables = [list(table) for table in data["tables"]]
+        return sketch
+
+
+class MailDigest:
+    """
+    可增量更新、可合并的邮件统计。
+
+    参数：
+        top_capacity: 主要发件人候选集合的容量（top_senders(n) 的 n 应明显小于它）
+        width / depth: 发件人 Count-Min Sketch 的尺寸，合并的摘要必须一致
+    """
+
+    def __init__(self, top_capacity=100, width=2048, depth=4):
+        self.top_capacity = top_capacity
+        self.total = 0
+        self.unread = 0
+        self.by_account = Counter()
+        self.first_ts = None
+        self.last_ts = None
+        self.senders = CountMinSketch(width, depth)
+        self._top = {}       # 发件人 -> 估计值
+        self._heap = []      # (估计值, 发件人) 小顶堆，估计值更新后旧条目留在堆中，取最小值时跳过
+
+    # ---------------- 更新 ----------------
+
+    def add(self, account, mail):
+        """累加一封邮件（parse_mail 输出的字典）"""
+        self.total += 1
+        self.by_account[account] += 1
+        if not mail.get("is_read", True):
+            self.unread += 1
+
+        ts = parse_received_time(mail.get("received_time"))
+        if ts is not None:
+            if self.first_ts is None or ts < self.first_ts:
+                self.first_ts = ts
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+
+        sender = mail.get("from") or "未知"
+        self._offer(sender, self.senders.add(sender))
+        return self
+
+    def update(self, records):
+        """累加 (account, mail) 序列，或 {account: [mails]} 字典"""
+        if isinstance(records, dict):
+            records = ((account, mail) for account, mails in records.items() for mail in mails)
+        for account, mail in records:
+            self.add(account, mail)
+        return self
+
+    def _offer(self, sender, estimate):
+        """维护有界候选集合：集合已满时，只有估计值超过当前最小值的发件人才能替换进来"""
+        top, heap = self._top, self._heap
+        if sender in top or len(top) < self.top_capacity:
+            top[sender] = estimate
+            heapq.heappush(heap, (estimate, sender))
+            if len(heap) > 2 * self.top_capacity + 16:
+                self._rebuild_heap()
+            return
+
+        # 弹出已过期的堆顶（发件人已被替换出集合，或估计值已更新）
+        while top.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        if estimate <= heap[0][0]:
+            return
+        del top[heap[0][1]]
+        top[sender] = estimate
+        heapq.heapreplace(heap, (estimate, sender))
+
+    def _rebuild_heap(self):
+        self._heap = [(estimate, sender) for sender, estimate in self._top.items()]
+        heapq.heapify(self._heap)
+
+    # ---------------- 合并 ----------------
+
+    def merge(self, other):
+        """将 other 合并到当前摘要（原地修改），返回 self"""
+        self.total += other.total
+        self.unread += other.unread
+        self.by_account.update(other.by_account)
+        for ts in (other.first_ts, other.last_ts):
+            if ts is None:
+                continue
+            if self.first_ts is None or ts < self.first_ts:
+                self.first_ts = ts
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+
+        self.senders.merge(other.senders)
+        # 合并后的估计值以合并后的 sketch 为准，两边的候选一起重新排名
+        candidates = set(self._top) | set(other._top)
+        ranked = sorted(
+            ((sender, self.senders.estimate(sender)) for sender in candidates),
+            key=lambda item: (-item[1], item[0]),
+        )[:self.top_capacity]
+        self._top = dict(ranked)
+        self._rebuild_heap()
+        return self
+
+    @classmethod
+    def merge_all(cls, digests, **kwargs):
+        """合并多个摘要为一个新摘要（不修改输入）"""
+        merged = cls(**kwargs)
+        for digest in digests:
+            merged.merge(digest)
+        return merged
+
+    # ---------------- 查询 ----------------
+
+    def top_senders(self, n=10):
+        """估计邮件数最多的 n 个发件人：[(sender, count)]"""
+        return sorted(self._top.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    def as_stats(self):
+        """转为 summarize_mails 的 stats 结构（by_sender 只包含主要发件人）"""
+        return {
+            "by_sender": Counter(dict(self._top)),
+            "by_account": dict(self.by_account),
+            "total_unread": self.unread,
+        }
+
+    # ---------------- 序列化 ----------------
+
+    def to_dict(self):
+        return {
+            "top_capacity": self.top_capacity,
+            "total": self.total,
+            "unread": self.unread,
+            "by_account": dict(self.by_account),
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "senders": self.senders.to_dict(),
+            "top": self._top,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = CountMinSketch.from_dict(data["senders"])
+        digest = cls(data["top_capacity"], sketch.width, sketch.depth)
+        digest.total = data["total"]
+        digest.unread = data["unread"]
+        digest.by_account = Counter(data["by_account"])
+        digest.first_ts = data["first_ts"]
+        digest.last_ts = data["last_ts"]
+        digest.senders = sketch
+        digest._top = dict(data["top"])
+        digest._rebuild_heap()
+        return digest
+
+
+def day_key(ts=None):
+    """时间戳所在的本地日期（YYYY-MM-DD），ts 为 None 时为今天"""
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+def partials_by_day(records, partials=None, **digest_options):
+    """
+    按接收日期把邮件累加到 {day: MailDigest}。
+
+    参数：
+        records: (account, mail) 序列或 {account: [mails]} 字典；无法解析时间的邮件计入今天
+        partials: 已有的 {day: MailDigest}，提供时在其基础上累加（原地修改）
+        digest_options: 新建 MailDigest 的参数
+
+    返回：
+        dict: {day: MailDigest}
+    """
+    if isinstance(records, dict):
+        records = ((account, mail) for account, mails in records.items() for mail in mails)
+
+    partials = {} if partials is None else partials
+    for account, mail in records:
+        day = day_key(parse_received_time(mail.get("received_time")))
+        digest = partials.get(day)
+        if digest is None:
+            digest = partials[day] = MailDigest(**digest_options)
+        digest.add(account, mail)
+    return partials
+
+
+class DigestStore:
+    """按天持久化的部分摘要（线程安全）"""
+
+    def __init__(self, path, **digest_options):
+        self.path = path
+        self.digest_options = digest_options
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS digest_partials ("
+            "day TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def add_mails(self, records):
+        """
+        按接收日期分组累加邮件，并合并进已保存的部分摘要。
+
+        参数：
+            records: (account, mail) 序列或 {account: [mails]} 字典；无法解析时间的邮件计入今天
+
+        返回：
+            int: 处理的邮件数
+        """
+        partials = partials_by_day(records, **self.digest_options)
+        self.merge_partials(partials)
+        return sum(digest.total for digest in partials.values())
+
+    def merge_partials(self, partials):
+        """合并 {day: MailDigest}（如 partials_by_day 的结果）"""
+        for day, digest in partials.items():
+            self.merge_partial(day, digest)
+
+    def merge_partial(self, day, digest):
+        """将一个部分摘要合并进 day 的已保存摘要（可用于合并其他分片 / 进程的结果）"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT data FROM digest_partials WHERE day = ?", (day,)).fetchone()
+            if row:
+                digest = MailDigest.from_dict(json.loads(row[0])).merge(digest)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digest_partials (day, data, updated_at) VALUES (?, ?, ?)",
+                (day, json.dumps(digest.to_dict(), ensure_ascii=False), time.strftime("%Y-%m-%d %H:%M:%S")),
+            )
+
+    def window(self, since, until):
+        """
+        合并 [since, until] 日期范围（含两端）内的部分摘要。
+
+        参数：
+            since / until: date / datetime 或 YYYY-MM-DD 字符串
+
+        返回：
+            MailDigest
+        """
+        since, until = (d.strftime("%Y-%m-%d") if isinstance(d, (date, datetime)) else d for d in (since, until))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM digest_partials WHERE day >= ? AND day <= ? ORDER BY day",
+                (since, until),
+            ).fetchall()
+        return MailDigest.merge_all(
+            (MailDigest.from_dict(json.loads(row[0])) for row in rows), **self.digest_options
+        )
+
+    def daily(self, day=None):
+        """某一天（默认今天）的摘要"""
+        day = day or date.today()
+        return self.window(day, day)
+
+    def weekly(self, end_day=None):
+        """截至 end_day（默认今天）的最近 7 天摘要"""
+        end_day = end_day or date.today()
+        if isinstance(end_day, str):
+            end_day = date.fromisoformat(end_day)
+        return self.window(end_day - timedelta(days=6), end_day)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,202 @@
+"""
+可复用的 SMTP 发送会话
+------------------------------------
+DigestSender 保持一个已认证的 SMTP 会话，连续发送多封汇总邮件时只握手一次
+（TCP + STARTTLS + EHLO + AUTH）：
+
+  - 认证支持 XOAUTH2（access token 直接传入，或由 token_provider 按需获取 / 刷新）和密码登录
+  - 会话空闲超过 check_interval 秒后，复用前先 NOOP 检查
+  - 连接断开、服务器返回 421 等临时错误时自动重连并重发当前邮件；
+    XOAUTH2 认证失败时重新获取一次 token（旧 token 可能已过期）
+  - max_messages_per_session 限制单个会话发送的邮件数，达到后自动换新会话
+
+host / port / starttls 可配置，测试时可以指向本地的 aiosmtpd 等 SMTP 服务。
+"""
+
+import smtplib
+import threading
+import time
+
+# 可以通过重连恢复的错误
+_RETRYABLE_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class DigestSender:
+    """
+    复用 SMTP 会话的邮件发送器（线程安全，发送串行进行）。
+
+    参数：
+        from_email: 发件人邮箱（同时作为认证用户名）
+        host / port: SMTP 服务器
+        access_token: XOAUTH2 使用的 access token
+        token_provider: 可选，callable(email) -> access token，用于获取 / 刷新 token
+            （如 lambda e: script.get_access_token([e]).get(e)）
+        password: 不使用 OAuth2 时的登录密码
+        starttls: 是否在 EHLO 后升级 TLS；服务器不支持 STARTTLS 时抛出 SMTPNotSupportedError，
+            只有为 False 时才以明文发送（如本地测试服务）
+        timeout: 套接字超时（秒）
+        max_retries: 单封邮件因连接问题重发的次数
+        max_messages_per_session: 单个会话最多发送的邮件数，None 表示不限
+        check_interval: 会话空闲超过该秒数后，复用前先 NOOP 检查
+    """
+
+    def __init__(self, from_email, host="smtp.office365.com", port=587, access_token=None, token_provider=None,
+                 password=None, starttls=True, timeout=30, max_retries=2, max_messages_per_session=None,
+                 check_interval=60):
+        self.from_email = from_email
+        self.host = host
+        self.port = port
+        self.access_token = access_token
+        self.token_provider = token_provider
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_messages_per_session = max_messages_per_session
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._server = None
+        self._session_messages = 0
+        self._last_used = 0.0
+        self.stats = {"connects": 0, "sent": 0, "failed": 0, "retries": 0}
+
+    # ---------------- 会话 ----------------
+
+    def _xoauth2(self, token):
+        auth_string = f"user={self.from_email}\x01auth=Bearer {token}\x01\x01"
+        # 首次调用发送认证串；认证失败时服务器会返回一个 334 错误详情，回复空串结束认证
+        return lambda challenge=None: auth_string if challenge is None else ""
+
+    def _authenticate(self, server):
+        if self.access_token is None and self.token_provider is not None:
+            self.access_token = self.token_provider(self.from_email)
+
+        if self.access_token:
+            try:
+                server.auth("XOAUTH2", self._xoauth2(self.access_token))
+            except smtplib.SMTPAuthenticationError:
+                if self.token_provider is None:
+                    raise
+                # token 可能已过期，重新获取后再试一次
+                self.access_token = self.token_provider(self.from_email)
+                if not self.access_token:
+                    raise
+                server.auth("XOAUTH2", self._xoauth2(self.access_token))
+        elif self.password:
+            server.login(self.from_email, self.password)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                # 不检查 has_extn：服务器未声明 STARTTLS 时由 smtplib 抛出异常，避免静默降级为明文
+                server.starttls()
+                server.ehlo()
+            self._authenticate(server)
+        except Exception:
+            self._quit(server)
+            raise
+
+        self._server = server
+        self._session_messages = 0
+        self._last_used = time.monotonic()
+        self.stats["connects"] += 1
+        print(f"📤 SMTP 会话已建立：{self.host}:{self.port}（{self.from_email}）")
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _drop(self):
+        if self._server is not None:
+            self._quit(self._server)
+            self._server = None
+
+    def _ensure_session(self):
+        """确保有可用的会话：按需新建、轮换或 NOOP 检查"""
+        if self._server is not None and self.max_messages_per_session \
+                and self._session_messages >= self.max_messages_per_session:
+            self._drop()
+
+        if self._server is not None and time.monotonic() - self._last_used > self.check_interval:
+            try:
+                if self._server.noop()[0] != 250:
+                    self._drop()
+            except Exception:
+                self._drop()
+
+        if self._server is None:
+            self._connect()
+
+    # ---------------- 发送 ----------------
+
+    def send(self, msg, recipients=None):
+        """
+        发送一封邮件，连接问题时自动重连重发。
+
+        参数：
+            msg: email.message.Message
+            recipients: 收件人列表，默认取邮件头中的 To / Cc / Bcc
+
+        返回：
+            dict: 被拒绝的收件人 {address: (code, message)}，全部接收时为空
+        """
+        with self._lock:
+            attempt = 0
+            while True:
+                try:
+                    self._ensure_session()
+                    refused = self._server.send_message(msg, self.from_email, recipients)
+                    self._session_messages += 1
+                    self._last_used = time.monotonic()
+                    self.stats["sent"] += 1
+                    return refused
+                except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused,
+                        *_RETRYABLE_ERRORS) as e:
+                    # 421：服务器要求断开（限流 / 会话超时）；其余 SMTP 应答错误不重试，
+                    # smtplib 已发送 RSET，会话可以继续使用
+                    retryable = isinstance(e, _RETRYABLE_ERRORS) or \
+                        (isinstance(e, smtplib.SMTPResponseException) and e.smtp_code == 421)
+                    if retryable:
+                        self._drop()
+                    if not retryable or attempt >= self.max_retries:
+                        self.stats["failed"] += 1
+                        raise
+                    attempt += 1
+                    self.stats["retries"] += 1
+                    print(f"⚠️ SMTP 发送中断，重连后重试（第 {attempt} 次）：{e}")
+
+    def send_many(self, messages):
+        """
+        在同一个会话中依次发送多封邮件，单封失败不影响后续邮件。
+
+        参数：
+            messages: email.message.Message 的可迭代对象
+
+        返回：
+            list: 与 messages 顺序一致的结果，成功为被拒绝收件人字典，失败为异常对象
+        """
+        results = []
+        for msg in messages:
+            try:
+                results.append(self.send(msg))
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"❌ 邮件发送失败：{msg.get('Subject', '')} - {e}")
+                results.append(e)
+        return results
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,212 @@
+"""
+IMAP 长连接池与 IDLE 推送
+------------------------------------
+连接池按账号缓存已认证的 IMAP 连接，避免每次拉取都做一次 TLS + XOAUTH2 握手：
+
+  - 同一账号同一时间只有一个线程使用连接
+  - Access Token 变化时重新建立连接（IMAP 已认证状态下不能再次 AUTHENTICATE）
+  - 连接空闲超过 check_interval 秒后，取出前先 NOOP 检查是否仍然可用
+
+idle_wait() 手动实现 RFC 2177 IDLE（imaplib 在 Python 3.14 之前没有 idle 接口），
+用于常驻进程在新邮件到达后几秒内作出响应。
+"""
+
+import imaplib
+import re
+import select
+import ssl
+import threading
+import time
+
+# 新邮件通知：EXISTS，或数量大于 0 的 RECENT（"* 0 RECENT" 只是计数被清零）
+_EXISTS_RE = re.compile(rb'^\* (?:\d+ EXISTS|0*[1-9]\d* RECENT)', re.IGNORECASE)
+
+
+class IMAPConnectionPool:
+    """按账号缓存的 IMAP 长连接池（线程安全）"""
+
+    def __init__(self, connect, disconnect, check_interval=60):
+        """
+        参数：
+            connect: connect(email_addr, access_token) -> 连接对象或 None
+            disconnect: disconnect(mail)
+            check_interval: 连接空闲超过该秒数时，取出前先 NOOP 检查
+        """
+        self._connect = connect
+        self._disconnect = disconnect
+        self.check_interval = check_interval
+        self._entries = {}  # email -> {"mail", "token", "last_used"}
+        self._account_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "reauthenticated": 0, "discarded": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _account_lock(self, email_addr):
+        with self._lock:
+            lock = self._account_locks.get(email_addr)
+            if lock is None:
+                lock = self._account_locks[email_addr] = threading.Lock()
+            return lock
+
+    def acquire(self, email_addr, access_token):
+        """
+        取出账号的连接，使用完后必须调用 release()。
+
+        返回：
+            连接对象，连接失败返回 None（此时无需 release）
+        """
+        lock = self._account_lock(email_addr)
+        lock.acquire()
+
+        try:
+            entry = self._entries.get(email_addr)
+
+            if entry and entry["token"] != access_token:
+                self._drop(email_addr)
+                self._count("reauthenticated")
+                entry = None
+
+            if entry and time.monotonic() - entry["last_used"] > self.check_interval and not _is_alive(entry["mail"]):
+                self._drop(email_addr)
+                entry = None
+
+            if entry:
+                self._count("reused")
+                return entry["mail"]
+
+            mail = self._connect(email_addr, access_token)
+            if mail is None:
+                lock.release()
+                return None
+
+            with self._lock:
+                self._entries[email_addr] = {"mail": mail, "token": access_token, "last_used": time.monotonic()}
+                self.stats["created"] += 1
+            return mail
+
+        except BaseException:
+            lock.release()
+            raise
+
+    def release(self, email_addr, broken=False):
+        """归还连接；broken 为 True 时关闭连接，下次重新建立"""
+        if broken:
+            self._drop(email_addr)
+        else:
+            with self._lock:
+                entry = self._entries.get(email_addr)
+                if entry:
+                    entry["last_used"] = time.monotonic()
+        self._account_lock(email_addr).release()
+
+    def _drop(self, email_addr):
+        with self._lock:
+            entry = self._entries.pop(email_addr, None)
+            if entry:
+                self.stats["discarded"] += 1
+        if entry:
+            try:
+                self._disconnect(entry["mail"])
+            except Exception:
+                pass
+
+    def close_all(self):
+        """关闭池中所有连接"""
+        with self._lock:
+            emails = list(self._entries)
+        for email_addr in emails:
+            self._drop(email_addr)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _is_alive(mail):
+    """NOOP 检查连接是否可用"""
+    try:
+        status, _ = mail.noop()
+        return status == 'OK'
+    except Exception:
+        return False
+
+
+def _buffered(mail):
+    """
+    不阻塞地返回已到达但尚未被 readline 取走的数据。
+
+    包括 mail.file 缓冲区中的数据（如与 "+ idling" 同一个数据包到达的 EXISTS）
+    和 SSL 层已解密的数据，这两类数据 select 都感知不到。
+    """
+    sock = mail.sock
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        return mail.file.peek() or b""
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return b""
+    finally:
+        sock.settimeout(timeout)
+
+
+def idle_wait(mail, timeout, should_stop=None, poll_seconds=1.0):
+    """
+    发送 IDLE 并等待服务器推送，收到 EXISTS/RECENT、超时或 should_stop() 为真时发送 DONE 结束。
+
+    参数：
+        mail: 已选择文件夹的 IMAP 连接
+        timeout: 最长等待秒数（RFC 2177 建议不超过 29 分钟）
+        should_stop: 可选的停止检查函数，每 poll_seconds 秒调用一次
+
+    返回：
+        (has_new_mail, 期间收到的未标记响应行列表)
+
+    异常：
+        imaplib.IMAP4.error: 服务器不支持 IDLE 或返回错误
+        imaplib.IMAP4.abort: 连接已断开
+    """
+    tag = mail._new_tag()
+    mail.tagged_commands.pop(tag, None)
+    mail.send(tag + b' IDLE\r\n')
+
+    line = mail.readline()
+    if not line.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"IDLE 失败：{line.strip()!r}")
+
+    events = []
+    has_new_mail = False
+    sock = mail.sock
+    deadline = time.monotonic() + timeout
+
+    while not has_new_mail:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (should_stop and should_stop()):
+            break
+
+        # 缓冲区或 SSL 层已有数据时直接读取，否则等待套接字可读
+        if not _buffered(mail):
+            ready, _, _ = select.select([sock], [], [], min(remaining, poll_seconds))
+            if not ready:
+                continue
+
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("IDLE 期间连接已关闭")
+        events.append(line.strip())
+        has_new_mail = bool(_EXISTS_RE.match(line))
+
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("IDLE 期间连接已关闭")
+        if line.startswith(tag):
+            if not line[len(tag):].lstrip().upper().startswith(b'OK'):
+                raise imaplib.IMAP4.error(f"IDLE 失败：{line.strip()!r}")
+            break
+        events.append(line.strip())
+        has_new_mail = has_new_mail or bool(_EXISTS_RE.match(line))
+
+    return has_new_mail, events
@@ -0,0 +1,90 @@
+"""
+NDJSON 邮件输出
+------------------------------------
+每封邮件解析完成后立即追加一行 JSON（{"account": ..., 其余为邮件字段}），
+不再在内存中累积全部结果后一次性 json.dump：
+
+  - 内存占用与邮件总数无关
+  - 进程中途崩溃时，已写入的邮件不会丢失
+  - 路径以 .gz 结尾时使用 gzip 压缩（追加写入会产生多个 gzip 成员，gzip.open 可直接读取）
+
+iter_ndjson_mails() 按行读回 (account, mail)，可直接传给 summarize_mails。
+"""
+
+import gzip
+import json
+import threading
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class NDJSONMailSink:
+    """追加写入的 NDJSON 邮件输出（线程安全）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = _open(path, "a")
+        self._lock = threading.Lock()
+        self.written = {}  # account -> [mail id]，用于保存后标记已读
+
+    def write(self, account, mail):
+        """写入一封邮件"""
+        line = json.dumps({"account": account, **mail}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.written.setdefault(account, []).append(mail.get("id"))
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    @property
+    def total(self):
+        return sum(len(ids) for ids in self.written.values())
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def iter_ndjson_mails(path):
+    """
+    逐行读取 NDJSON 邮件文件。
+
+    返回：
+        生成器，产出 (account, mail)；崩溃导致的不完整末行会被跳过
+    """
+    line_no = 0
+    with _open(path, "r") as f:
+        lines = enumerate(f, 1)
+        while True:
+            try:
+                line_no, line = next(lines)
+            except StopIteration:
+                return
+            except (EOFError, gzip.BadGzipFile):
+                print(f"[警告] 文件末尾不完整，已读取到第 {line_no} 行：{path}")
+                return
+
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"[警告] 跳过无法解析的第 {line_no} 行：{path}")
+                continue
+            account = record.pop("account", "")
+            yield account, record
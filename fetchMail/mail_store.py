@@ -0,0 +1,278 @@
+"""
+本地邮件库（SQLite + FTS5）
+------------------------------------
+拉取到的邮件按 (账号, 去重键) upsert 到 SQLite，去重键优先使用 Message-ID，
+没有 Message-ID 时使用 文件夹 + UIDVALIDITY + UID（UIDVALIDITY 变化后旧 UID 可能被复用）。
+
+主题、发件人、正文预览建立 FTS5 全文索引（外部内容表，由触发器同步）：
+
+  - SQLite >= 3.34 使用 trigram 分词，中文关键词可做子串匹配；
+    不足 3 个字符的关键词无法走 trigram 索引，退化为 LIKE 扫描
+  - 更早的版本使用 unicode61 分词
+
+search() 提供关键词 / 发件人域名 / 时间范围的组合查询，iter_mails() 的结果可直接传给
+summarize_mails，sender_counts() 直接在库中做发件人统计。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mails (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uid INTEGER,
+    message_id TEXT,
+    subject TEXT NOT NULL DEFAULT '',
+    sender TEXT NOT NULL DEFAULT '',
+    sender_domain TEXT NOT NULL DEFAULT '',
+    recipients TEXT NOT NULL DEFAULT '[]',
+    received_time TEXT,
+    received_ts REAL,
+    body_preview TEXT NOT NULL DEFAULT '',
+    fetched_at TEXT NOT NULL,
+    UNIQUE (account, dedup_key)
+);
+CREATE INDEX IF NOT EXISTS mails_account_time_idx ON mails (account, received_ts);
+CREATE INDEX IF NOT EXISTS mails_time_idx ON mails (received_ts);
+CREATE INDEX IF NOT EXISTS mails_domain_time_idx ON mails (sender_domain, received_ts);
+
+CREATE TRIGGER IF NOT EXISTS mails_ai AFTER INSERT ON mails BEGIN
+    INSERT INTO mails_fts (rowid, subject, sender, body_preview)
+    VALUES (new.id, new.subject, new.sender, new.body_preview);
+END;
+CREATE TRIGGER IF NOT EXISTS mails_ad AFTER DELETE ON mails BEGIN
+    INSERT INTO mails_fts (mails_fts, rowid, subject, sender, body_preview)
+    VALUES ('delete', old.id, old.subject, old.sender, old.body_preview);
+END;
+CREATE TRIGGER IF NOT EXISTS mails_au AFTER UPDATE ON mails BEGIN
+    INSERT INTO mails_fts (mails_fts, rowid, subject, sender, body_preview)
+    VALUES ('delete', old.id, old.subject, old.sender, old.body_preview);
+    INSERT INTO mails_fts (rowid, subject, sender, body_preview)
+    VALUES (new.id, new.subject, new.sender, new.body_preview);
+END;
+"""
+
+_UPSERT_SQL = """
+INSERT INTO mails (account, dedup_key, folder, uid, message_id, subject, sender, sender_domain,
+                   recipients, received_time, received_ts, body_preview, fetched_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (account, dedup_key) DO UPDATE SET
+    folder = excluded.folder,
+    uid = excluded.uid,
+    subject = excluded.subject,
+    sender = excluded.sender,
+    sender_domain = excluded.sender_domain,
+    recipients = excluded.recipients,
+    received_time = excluded.received_time,
+    received_ts = excluded.received_ts,
+    body_preview = excluded.body_preview,
+    fetched_at = excluded.fetched_at
+"""
+
+_READ_BATCH_SIZE = 500  # iter_mails 每次从游标取出的行数
+
+_SELECT_COLUMNS = "m.account, m.uid, m.message_id, m.subject, m.sender, m.recipients, m.received_time, m.body_preview"
+
+
+def _to_timestamp(value):
+    """ISO 时间字符串转时间戳，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _fts_phrase(keyword):
+    """将关键词转为 FTS5 短语（双引号转义）"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+class MailStore:
+    """本地邮件库（线程安全，写入先缓冲，flush() 时在一个事务内提交）"""
+
+    def __init__(self, path, buffer_size=500):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+
+        tokenizer = 'trigram' if sqlite3.sqlite_version_info >= (3, 34, 0) else 'unicode61'
+        self.trigram = tokenizer == 'trigram'
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS mails_fts USING fts5("
+            f"subject, sender, body_preview, content='mails', content_rowid='id', tokenize='{tokenizer}')"
+        )
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ---------------- 写入 ----------------
+
+    def write(self, account, mail, folder="INBOX"):
+        """登记一封邮件，缓冲满 buffer_size 封时自动提交"""
+        sender = mail.get("from") or ""
+        message_id = mail.get("message_id") or None
+        uid = int(mail["id"]) if str(mail.get("id", "")).isdigit() else None
+        if message_id:
+            dedup_key = f"mid:{message_id}"
+        else:
+            dedup_key = f"uid:{folder}:{mail.get('uidvalidity') or 0}:{mail.get('id')}"
+
+        row = (
+            account, dedup_key, folder, uid, message_id,
+            mail.get("subject") or "", sender, sender.rpartition("@")[2].lower(),
+            json.dumps(mail.get("to") or [], ensure_ascii=False),
+            mail.get("received_time"), _to_timestamp(mail.get("received_time")),
+            mail.get("body_preview") or "", time.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def upsert_many(self, account, mails, folder="INBOX"):
+        """批量写入并立即提交，返回写入条数"""
+        count = 0
+        for mail in mails:
+            self.write(account, mail, folder)
+            count += 1
+        self.flush()
+        return count
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        with self._conn:
+            self._conn.executemany(_UPSERT_SQL, self._buffer)
+        self._buffer = []
+
+    # ---------------- 查询 ----------------
+
+    def _keyword_condition(self, keywords, params):
+        """关键词（任一命中）条件：可走索引的用 FTS MATCH，过短的退化为 LIKE"""
+        indexed = [k for k in keywords if not self.trigram or len(k) >= 3]
+        short = [k for k in keywords if self.trigram and len(k) < 3]
+        clauses = []
+
+        if indexed:
+            clauses.append("m.id IN (SELECT rowid FROM mails_fts WHERE mails_fts MATCH ?)")
+            params.append(" OR ".join(_fts_phrase(k) for k in indexed))
+        for keyword in short:
+            clauses.append("(m.subject LIKE ? OR m.sender LIKE ? OR m.body_preview LIKE ?)")
+            params.extend([f"%{keyword}%"] * 3)
+
+        return "(" + " OR ".join(clauses) + ")"
+
+    def _query(self, keywords=None, account=None, sender_domains=None, since=None, until=None):
+        conditions = []
+        params = []
+
+        # 空白关键词会变成 LIKE '%%' / 空的 FTS 短语，直接丢弃
+        keywords = [k for k in keywords or () if k and k.strip()]
+        if keywords:
+            conditions.append(self._keyword_condition(keywords, params))
+        if account:
+            conditions.append("m.account = ?")
+            params.append(account)
+        if sender_domains:
+            domains = [d.lower().lstrip("@") for d in sender_domains]
+            conditions.append(f"m.sender_domain IN ({','.join('?' * len(domains))})")
+            params.extend(domains)
+        if since is not None:
+            conditions.append("m.received_ts >= ?")
+            params.append(since.timestamp() if isinstance(since, datetime) else since)
+        if until is not None:
+            conditions.append("m.received_ts < ?")
+            params.append(until.timestamp() if isinstance(until, datetime) else until)
+
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
+
+    @staticmethod
+    def _row_to_mail(row):
+        account, uid, message_id, subject, sender, recipients, received_time, body_preview = row
+        return account, {
+            "id": str(uid) if uid is not None else None,
+            "message_id": message_id,
+            "subject": subject,
+            "from": sender,
+            "to": json.loads(recipients),
+            "received_time": received_time,
+            "is_read": False,
+            "body_preview": body_preview,
+        }
+
+    def search(self, keywords=None, account=None, sender_domains=None, since=None, until=None, limit=100):
+        """
+        组合查询，结果按接收时间倒序。
+
+        参数：
+            keywords: 关键词列表，在主题 / 发件人 / 正文预览中任一命中即可
+            account: 只查指定账号
+            sender_domains: 发件人域名列表，如 ["example.com"]
+            since / until: 接收时间范围（datetime 或时间戳），左闭右开
+            limit: 最大返回条数，None 表示不限
+
+        返回：
+            [(account, mail)] 列表，mail 与 parse_mail 的结构一致
+        """
+        return list(self.iter_mails(keywords, account, sender_domains, since, until, limit))
+
+    def iter_mails(self, keywords=None, account=None, sender_domains=None, since=None, until=None, limit=None):
+        """
+        与 search() 相同，但逐条产出 (account, mail)，可直接传给 summarize_mails。
+
+        使用单独的读连接按 _READ_BATCH_SIZE 行分批读取游标，不一次载入全部结果，
+        迭代期间不占用写入锁（WAL 模式下读写互不阻塞）。
+        """
+        self.flush()
+        where, params = self._query(keywords, account, sender_domains, since, until)
+        sql = f"SELECT {_SELECT_COLUMNS} FROM mails m{where} ORDER BY m.received_ts DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(_READ_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_mail(row)
+        finally:
+            conn.close()
+
+    def count(self, **filters):
+        """按 search() 的条件统计条数"""
+        self.flush()
+        where, params = self._query(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM mails m{where}", params).fetchone()[0]
+
+    def sender_counts(self, limit=10, **filters):
+        """按发件人统计邮件数，返回 [(sender, count)]，按数量倒序"""
+        self.flush()
+        where, params = self._query(**filters)
+        sql = f"SELECT m.sender, COUNT(*) AS n FROM mails m{where} GROUP BY m.sender ORDER BY n DESC LIMIT ?"
+        with self._lock:
+            return self._conn.execute(sql, params + [limit]).fetchall()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,352 @@
+"""
+拉取 → 过滤 → 汇总 → 发送 流水线
+------------------------------------
+run_pipeline() 把一次完整任务拆成 5 个阶段，阶段之间用有界队列连接，各阶段同时运行：
+
+    Token ──▶ 拉取（fetch_workers 个线程）──▶ 过滤 ──▶ 汇总 ──▶ 发送
+
+  - Token 按 token_batch_size 个账号一批获取，第一批拿到后就开始拉取
+  - 邮件解析后逐封进入过滤阶段（checkKeyValue），不再等账号拉取完成
+  - 每个账号拉取完成后，汇总阶段立即生成该账号的汇总（per_account 时马上发送），
+    全部账号结束后归并为总汇总，写入 HTML 并发送
+  - 队列长度为 pipeline_queue_size，下游变慢时上游阻塞（反压）；
+    常驻内存的只有队列中的邮件、正在拉取的账号的邮件和汇总记录（提供 digest_store 时另有每封邮件的摘要字段）
+  - 标记已读、提交增量同步位置和写入按天摘要在发送成功之后进行，
+    发送失败或没有发送汇总（未提供 sender / recipients）时邮件保持未读，下次重新拉取；
+    单个账号汇总或标记已读失败时只丢弃该账号暂存的同步位置、不写入它的按天摘要，其余账号照常提交；
+    只保存 HTML、不发送时需要显式传入 commit_unsent=True 才会提交
+
+结束时打印每个阶段的处理条数、忙碌时间、活跃区间和吞吐量。
+"""
+
+import queue
+import threading
+import time
+
+import script
+from digest import partials_by_day
+from summarize import (build_account_summary_message, build_summary_message, merge_summaries,
+                       summarize_mails, write_mail_table_html)
+
+_DONE = object()         # 上游阶段结束
+_ACCOUNT_END = object()  # (account, _ACCOUNT_END)：该账号的邮件已全部产出
+_DIGEST_FIELDS = ("from", "received_time", "is_read")  # MailDigest.add 用到的字段
+
+
+class StageStats:
+    """单个阶段的计数与计时（线程安全）"""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, count, seconds, started=None):
+        """登记一次处理：count 条，实际工作 seconds 秒（不含等待队列的时间）"""
+        now = time.perf_counter()
+        started = now - seconds if started is None else started
+        with self._lock:
+            self.items += count
+            self.busy += seconds
+            if self.started is None or started < self.started:
+                self.started = started
+            if self.finished is None or now > self.finished:
+                self.finished = now
+
+    def report(self, origin):
+        if self.started is None:
+            return f"  - {self.name}: 0 {self.unit}"
+        active = max(self.finished - self.started, 1e-9)
+        return (f"  - {self.name}: {self.items} {self.unit}，忙碌 {self.busy:.2f}s，"
+                f"活跃 {self.started - origin:.2f}s → {self.finished - origin:.2f}s，"
+                f"吞吐 {self.items / active:,.1f} {self.unit}/s")
+
+
+class _QueueSink:
+    """fetch_account_mails 的 sink：邮件逐封放入下游队列，并统计因反压等待的时间"""
+
+    def __init__(self, out):
+        self.out = out
+        self.wait_seconds = 0.0
+
+    def write(self, account, mail):
+        start = time.perf_counter()
+        self.out.put((account, mail))
+        self.wait_seconds += time.perf_counter() - start
+
+    def flush(self):
+        pass
+
+
+class MailPipeline:
+    """
+    一次性的拉取 → 过滤 → 汇总 → 发送任务。
+
+    参数：
+        emails: 邮箱地址列表
+        config: 全局配置，默认使用 script.get_config()
+        sender: DigestSender，为 None 时不发送邮件
+        recipients: 汇总接收人（字符串或列表）
+        per_account: 是否在每个账号拉取完成后单独发送该账号的汇总
+        html_path: 总汇总 HTML 的保存路径，为 None 时不保存
+        digest_store: DigestStore，提供时邮件同时累加到按天摘要（发送成功后写入）
+        commit_unsent: 没有发送总汇总时（未提供 sender / recipients）是否仍标记已读、
+            提交同步位置并写入摘要，默认不提交
+    """
+
+    def __init__(self, emails, config=None, sender=None, recipients=None, per_account=False, html_path=None,
+                 digest_store=None, commit_unsent=False):
+        config = config or script.get_config()
+        # 已读标记统一推迟到发送之后
+        self.config = dict(config, mark_read_after_save=True)
+        self.emails = list(emails)
+        self.sender = sender
+        self.recipients = recipients
+        self.per_account = per_account
+        self.html_path = html_path
+        self.digest_store = digest_store
+        self.commit_unsent = commit_unsent
+
+        size = self.config["pipeline_queue_size"]
+        self.workers = max(1, min(self.config["fetch_workers"], len(self.emails)))
+        self.accounts = queue.Queue(maxsize=self.workers)
+        self.fetched = queue.Queue(maxsize=size)
+        self.filtered = queue.Queue(maxsize=size)
+        self.outbox = queue.Queue()
+
+        self.stats = {
+            "token": StageStats("Token", "个账号"),
+            "fetch": StageStats("拉取", "封"),
+            "filter": StageStats("过滤", "封"),
+            "summarize": StageStats("汇总", "封"),
+            "deliver": StageStats("发送", "份汇总"),
+        }
+        self.tokens = {}
+        self.fetched_ids = {}     # account -> [{"id": uid}]，发送成功后标记已读
+        self.unsummarized = set()  # 汇总失败的账号，不提交同步位置，下次重新拉取
+        self.digest_records = {}   # account -> 摘要所需字段，标记已读成功后累加到 digest_store
+        self.summary = None
+        self.delivered = False      # 总汇总已发送（或没有需要发送的邮件）
+        self.delivery_failed = False
+        self._fetchers_left = self.workers
+        self._fetchers_lock = threading.Lock()
+        self._cancelled = threading.Event()  # 下游出错后不再获取 Token / 拉取新账号
+
+    # ---------------- 阶段 ----------------
+
+    def _token_stage(self):
+        try:
+            for batch in script.chunked(self.emails, self.config["token_batch_size"]):
+                if self._cancelled.is_set():
+                    break
+                start = time.perf_counter()
+                tokens = script.get_access_token(batch)
+                self.stats["token"].record(len(batch), time.perf_counter() - start)
+                self.tokens.update(tokens)
+                for email_addr in batch:
+                    self.accounts.put((email_addr, tokens.get(email_addr)))
+        except Exception as e:
+            print(f"[错误] 获取 Token 失败：{e}")
+        finally:
+            for _ in range(self.workers):
+                self.accounts.put(_DONE)
+
+    def _fetch_stage(self):
+        sink = _QueueSink(self.fetched)
+        try:
+            while True:
+                item = self.accounts.get()
+                if item is _DONE:
+                    return
+                email_addr, token = item
+                if not token:
+                    print(f"\n⏭️  跳过账号：{email_addr}（Token 获取失败）")
+                elif not self._cancelled.is_set():
+                    start = time.perf_counter()
+                    waited = sink.wait_seconds
+                    try:
+                        _, timing = script.fetch_account_mails(email_addr, token, self.config, sink=sink,
+                                                               apply_rules=False)
+                        count = timing["count"]
+                    except Exception as e:
+                        print(f"[错误] {email_addr} 拉取失败：{e}")
+                        count = 0
+                    elapsed = time.perf_counter() - start
+                    self.stats["fetch"].record(count, elapsed - (sink.wait_seconds - waited), started=start)
+                self.fetched.put((email_addr, _ACCOUNT_END))
+        finally:
+            with self._fetchers_lock:
+                self._fetchers_left -= 1
+                last = self._fetchers_left == 0
+            if last:
+                self.fetched.put(_DONE)
+
+    def _filter_stage(self):
+        try:
+            while True:
+                item = self.fetched.get()
+                if item is _DONE:
+                    return
+                if item[1] is _ACCOUNT_END:
+                    self.filtered.put(item)
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    keep = script.checkKeyValue(item[1])
+                except Exception as e:
+                    print(f"[错误] 过滤邮件失败：{e}")
+                    keep = False
+                self.stats["filter"].record(1, time.perf_counter() - start)
+                if keep:
+                    self.filtered.put(item)
+        finally:
+            self.filtered.put(_DONE)
+
+    def _summarize_stage(self):
+        pending = {}
+        account_summaries = []
+        upstream_done = False
+        try:
+            while True:
+                item = self.filtered.get()
+                if item is _DONE:
+                    upstream_done = True
+                    break
+                account, mail = item
+                if mail is not _ACCOUNT_END:
+                    pending.setdefault(account, []).append(mail)
+                    continue
+
+                # 账号结束：生成该账号的汇总
+                mails = pending.pop(account, [])
+                start = time.perf_counter()
+                try:
+                    summary = summarize_mails({account: mails})
+                    if self.digest_store is not None and mails:
+                        self.digest_records[account] = [{key: m.get(key) for key in _DIGEST_FIELDS} for m in mails]
+                except Exception as e:
+                    print(f"[错误] {account} 汇总失败：{e}")
+                    self.unsummarized.add(account)
+                    continue
+                finally:
+                    self.stats["summarize"].record(len(mails), time.perf_counter() - start)
+
+                account_summaries.append(summary)
+                self.fetched_ids[account] = [{"id": m["id"]} for m in mails]
+                if self.per_account and mails:
+                    self.outbox.put((account, summary))
+
+            start = time.perf_counter()
+            self.summary = merge_summaries(account_summaries)
+            self.stats["summarize"].record(0, time.perf_counter() - start)
+            self.outbox.put((None, self.summary))
+        except Exception as e:
+            print(f"[错误] 汇总阶段异常：{e}")
+            self.delivery_failed = True
+            self._cancelled.set()
+            # 继续取走上游数据直到结束，否则上游会阻塞在已满的队列上
+            while not upstream_done:
+                upstream_done = self.filtered.get() is _DONE
+        finally:
+            self.outbox.put(_DONE)
+
+    def _deliver_stage(self):
+        while True:
+            item = self.outbox.get()
+            if item is _DONE:
+                return
+            account, summary = item
+            start = time.perf_counter()
+            try:
+                self._deliver(account, summary)
+            except Exception as e:
+                print(f"❌ 发送汇总失败（{account or '总汇总'}）：{e}")
+                self.delivery_failed = True
+            self.stats["deliver"].record(1, time.perf_counter() - start)
+
+    def _deliver(self, account, summary):
+        if account is not None:
+            msg = build_account_summary_message(self.sender.from_email, self.recipients, account, summary)
+            self.sender.send(msg)
+            print(f"📧 已发送 {account} 的汇总（{summary['total_mails']} 封）")
+            return
+
+        if self.html_path:
+            with open(self.html_path, 'w', encoding='utf-8') as f:
+                write_mail_table_html(summary, f)
+            print(f"💾 邮件汇总已保存到: {self.html_path}")
+
+        if self.sender is None or not self.recipients:
+            return
+        if not summary["total_mails"]:
+            print("ℹ️  没有邮件需要发送汇总")
+            self.delivered = True
+            return
+        self.sender.send(build_summary_message(self.sender.from_email, self.recipients, summary))
+        self.delivered = True
+        print(f"📧 已发送总汇总到: {self.recipients}（{summary['total_mails']} 封）")
+
+    # ---------------- 运行 ----------------
+
+    def run(self):
+        """
+        运行流水线直到全部阶段结束。
+
+        返回：
+            dict: 总汇总（summarize_mails 的结构）
+        """
+        if self.per_account and self.sender is None:
+            raise ValueError("per_account 需要提供 sender")
+
+        origin = time.perf_counter()
+        threads = [threading.Thread(target=self._token_stage, name="pipeline-token")]
+        threads += [
+            threading.Thread(target=self._fetch_stage, name=f"pipeline-fetch-{i}")
+            for i in range(self.workers)
+        ]
+        threads += [
+            threading.Thread(target=self._filter_stage, name="pipeline-filter"),
+            threading.Thread(target=self._summarize_stage, name="pipeline-summarize"),
+            threading.Thread(target=self._deliver_stage, name="pipeline-deliver"),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 发送成功后再标记已读、提交同步位置、写入按天摘要（失败时下次重新拉取，避免摘要重复计数）
+        if self.delivery_failed:
+            print("⚠️ 汇总未能全部发送，邮件保持未读，下次运行重新拉取")
+            script.discard_sync_state()
+        elif not (self.delivered or self.commit_unsent):
+            print("ℹ️  未发送汇总，邮件保持未读，同步位置和按天摘要不提交")
+            script.discard_sync_state()
+        else:
+            marked = script.mark_saved_mails_as_read(self.fetched_ids, self.tokens, self.config)
+            for account in self.unsummarized | {account for account, ok in marked.items() if not ok}:
+                script.discard_sync_state(account)
+            script.commit_sync_state()
+            if self.digest_store is not None:
+                # 只累加已标记已读的账号：未标记的邮件下次会重新拉取，避免重复计数
+                records = {account: self.digest_records.get(account, []) for account, ok in marked.items() if ok}
+                self.digest_store.merge_partials(partials_by_day(records, **self.digest_store.digest_options))
+
+        print(f"\n⏱️  流水线总耗时 {time.perf_counter() - origin:.2f}s（拉取并发数 {self.workers}）")
+        for stats in self.stats.values():
+            print(stats.report(origin))
+        return self.summary
+
+
+def run_pipeline(emails, recipients=None, sender=None, config=None, per_account=False, html_path=None,
+                 digest_store=None, commit_unsent=False):
+    """运行一次 MailPipeline（参数见 MailPipeline），结束后关闭 IMAP 连接池，返回总汇总"""
+    try:
+        return MailPipeline(emails, config, sender, recipients, per_account, html_path, digest_store,
+                            commit_unsent).run()
+    finally:
+        script.close_imap_pool()
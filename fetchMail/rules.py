@@ -0,0 +1,218 @@
+"""
+邮件关键词规则引擎
+------------------------------------
+checkKeyValue 使用的过滤规则，规则文件为 JSON 列表，每条规则：
+
+    {
+        "name": "发票",                       # 规则名，用于命中计数
+        "fields": ["subject", "body"],       # 关键词 / 正则匹配的字段：subject、sender、body，默认主题和正文
+        "keywords": ["发票", "invoice"],      # 任一关键词出现即命中（不区分大小写）
+        "regex": ["订单号[:：]\\\\s*\\\\d+"],      # 任一正则命中即命中（不区分大小写）
+        "sender_domains": ["example.com"]    # 发件人域名（含子域名）限制
+    }
+
+keywords / regex 与 sender_domains 之间是“且”的关系；只配置 sender_domains 时按域名命中。
+
+所有规则的关键词按字段编入一个字面量索引（见 _FieldMatcher），正则以其开头的字面量
+作为触发条件挂在同一个索引上，只在字面量出现时才执行；匹配耗时与规则数量基本无关。
+每条规则的命中次数记录在 hits 中。
+"""
+
+import json
+import re
+import threading
+from collections import Counter
+
+FIELDS = ("subject", "sender", "body")
+DEFAULT_FIELDS = ("subject", "body")
+
+
+# 正则元字符：字面量前缀在遇到它们时结束
+_REGEX_META = set(".^$*+?{}[]|()\\")
+_QUANTIFIERS = set("*+?{")
+
+
+def _literal_prefix(pattern):
+    """
+    提取正则开头的字面量（已转小写），用于预过滤。
+
+    包含顶层“|”或开头就是元字符时返回空串，此时该正则对每封邮件都要执行。
+    """
+    if "|" in pattern:
+        return ""
+
+    chars = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                chars.append(pattern[i + 1])
+                i += 2
+                continue
+            break
+        if char in _REGEX_META:
+            break
+        chars.append(char)
+        i += 1
+
+    # 字面量后紧跟量词时，最后一个字符可能不出现
+    if chars and i < len(pattern) and pattern[i] in _QUANTIFIERS:
+        chars.pop()
+    return "".join(chars).lower()
+
+
+class _FieldMatcher:
+    """
+    单个字段上的多模式匹配。
+
+    关键词和正则的字面量前缀统一放进按长度分层的索引：
+      - 1 个字符：与文本的字符集合求交集
+      - 2 个字符：与文本的 2-gram 集合求交集
+      - 3 个字符及以上：按前 3 个字符分桶，文本的 3-gram 集合求交集后再做子串校验
+    集合运算都在 C 中完成，耗时取决于文本长度和实际命中数，与规则总数基本无关。
+    正则只在其字面量前缀出现时才执行。
+    """
+
+    def __init__(self, keyword_rules, regex_rules):
+        entries = {}  # 字面量 -> (规则编号集合, [(规则编号, 正则)])
+        for keyword, rule_ids in keyword_rules.items():
+            entries.setdefault(keyword, (set(), []))[0].update(rule_ids)
+
+        self._always = []
+        for rule_id, pattern in regex_rules:
+            compiled = re.compile(pattern, re.IGNORECASE)
+            literal = _literal_prefix(pattern)
+            if literal:
+                entries.setdefault(literal, (set(), []))[1].append((rule_id, compiled))
+            else:
+                self._always.append((rule_id, compiled))
+
+        self._singles = {}
+        self._pairs = {}
+        self._buckets = {}
+        for literal, (rule_ids, regexes) in entries.items():
+            entry = (frozenset(rule_ids), tuple(regexes))
+            if len(literal) == 1:
+                self._singles[literal] = entry
+            elif len(literal) == 2:
+                self._pairs[literal] = entry
+            else:
+                self._buckets.setdefault(literal[:3], []).append((literal, entry))
+
+        self._single_keys = frozenset(self._singles)
+        self._pair_keys = frozenset(self._pairs)
+        self._bucket_keys = frozenset(self._buckets)
+
+    def match(self, text, hits):
+        """将命中的规则编号加入 hits"""
+        if not text:
+            return
+
+        lowered = text.lower()
+        found = []
+
+        if self._single_keys:
+            found.extend(self._singles[c] for c in self._single_keys.intersection(lowered))
+        if self._pair_keys:
+            grams = {lowered[i:i + 2] for i in range(len(lowered) - 1)}
+            found.extend(self._pairs[g] for g in self._pair_keys & grams)
+        if self._bucket_keys:
+            grams = {lowered[i:i + 3] for i in range(len(lowered) - 2)}
+            for gram in self._bucket_keys & grams:
+                for literal, entry in self._buckets[gram]:
+                    if len(literal) == 3 or literal in lowered:
+                        found.append(entry)
+
+        for rule_ids, regexes in found:
+            hits |= rule_ids
+            for rule_id, regex in regexes:
+                if rule_id not in hits and regex.search(text):
+                    hits.add(rule_id)
+
+        for rule_id, regex in self._always:
+            if rule_id not in hits and regex.search(text):
+                hits.add(rule_id)
+
+
+class RuleEngine:
+    """编译后的规则集合（线程安全）"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.hits = Counter()
+        self._lock = threading.Lock()
+        self._text_rules = set()   # 配置了关键词或正则的规则
+        self._domain_rules = {}    # 域名 -> 规则编号集合
+        self._domain_limited = set()
+
+        keyword_rules = {field: {} for field in FIELDS}
+        regex_rules = {field: [] for field in FIELDS}
+
+        for rule_id, rule in enumerate(self.rules):
+            fields = rule.get("fields") or DEFAULT_FIELDS
+            unknown = set(fields) - set(FIELDS)
+            if unknown:
+                raise ValueError(f"规则 {rule.get('name', rule_id)} 的字段无效：{sorted(unknown)}")
+
+            keywords = [k.lower() for k in rule.get("keywords", []) if k]
+            patterns = list(rule.get("regex", []))
+
+            if keywords or patterns:
+                self._text_rules.add(rule_id)
+            for field in fields:
+                for keyword in keywords:
+                    keyword_rules[field].setdefault(keyword, set()).add(rule_id)
+                regex_rules[field].extend((rule_id, pattern) for pattern in patterns)
+
+            for domain in rule.get("sender_domains", []):
+                self._domain_rules.setdefault(domain.lower().lstrip("@"), set()).add(rule_id)
+                self._domain_limited.add(rule_id)
+
+        self._matchers = {
+            field: _FieldMatcher(keyword_rules[field], regex_rules[field])
+            for field in FIELDS
+            if keyword_rules[field] or regex_rules[field]
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _domain_hits(self, sender):
+        """发件人域名及其上级域名命中的规则"""
+        domain = sender.rpartition("@")[2].lower()
+        hits = set()
+        while domain:
+            hits |= self._domain_rules.get(domain, set())
+            domain = domain.partition(".")[2]
+        return hits
+
+    def match(self, mail):
+        """
+        返回命中的规则名列表（按规则定义顺序），并累加命中计数。
+        """
+        text_hits = set()
+        texts = {
+            "subject": mail.get("subject") or "",
+            "sender": mail.get("from") or "",
+            "body": mail.get("body_preview") or "",
+        }
+        for field, matcher in self._matchers.items():
+            matcher.match(texts[field], text_hits)
+
+        domain_hits = self._domain_hits(texts["sender"]) if self._domain_rules else set()
+
+        matched = []
+        for rule_id in sorted(text_hits | domain_hits):
+            if rule_id in self._text_rules and rule_id not in text_hits:
+                continue
+            if rule_id in self._domain_limited and rule_id not in domain_hits:
+                continue
+            matched.append(self.rules[rule_id].get("name", str(rule_id)))
+
+        if matched:
+            with self._lock:
+                self.hits.update(matched)
+        return matched
@@ -4,9 +4,14 @@ Outlook 邮件拉取脚本（IMAP 协议版本）
 功能：
   - 使用 IMAP 协议访问 Outlook 邮箱
   - 支持 OAuth2 认证（使用 Access Token）
-  - 拉取多个邮箱中的邮件
-  - 结构化解析邮件信息
-  - 支持标记邮件为已读
+  - 并发拉取多个邮箱中的邮件（限制单服务器连接数）
+  - 批量 FETCH；默认只下载邮件头和正文开头（轻量模式）
+  - 结构化解析邮件信息（只解析邮件头和第一个 text/plain 部分的开头），按 rules.json 中的关键词 / 正则 / 发件人域名规则过滤
+  - 支持批量标记邮件为已读（可推迟到结果保存之后）
+  - 可选逐封追加写入 NDJSON（.gz 压缩），内存占用与邮件总数无关
+  - 邮件写入本地 SQLite 邮件库（data/mails.db，FTS5 全文索引，可按关键词查询）
+  - 支持按 UID 增量同步（同步位置保存在 data/mail_sync.db）
+  - 按账号复用 IMAP 长连接；--watch 常驻推送模式（IMAP IDLE）
 
 依赖：
   pip install requests
@@ -14,13 +19,29 @@ Outlook 邮件拉取脚本（IMAP 协议版本）
 """
 
 import os
+import re
+import base64
+import codecs
+import quopri
 import time
 import json
 import imaplib
 import email
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.header import decode_header
+from email.parser import BytesHeaderParser
 from email.utils import parsedate_to_datetime
+from functools import lru_cache
 import requests
+from requests.adapters import HTTPAdapter
+
+from imap_pool import IMAPConnectionPool, idle_wait
+from mail_sink import NDJSONMailSink
+from mail_store import MailStore
+from rules import RuleEngine
+from sync_state import SyncStateStore
 
 
 # ==============================================================
@@ -36,11 +57,96 @@ def get_config():
         "max_mails": 200,      # 最大总邮件数
         "request_timeout": 30,  # 请求超时时间（秒）
         "save_path": "emails.json",
-        "token_api_url": "http://localhost:8000/api/batch-access-tokens/"  # Token API 地址
+        "stream_output": False,  # True 时逐封追加写入 NDJSON，不再在内存中累积后整体保存
+        "ndjson_path": "emails.ndjson",  # NDJSON 输出路径，以 .gz 结尾时 gzip 压缩
+        "token_api_url": "http://localhost:8000/api/batch-access-tokens/",  # Token API 地址
+        "http_pool_maxsize": 10,  # 单主机最大 HTTP 连接数
+        "fetch_workers": 8,  # 并发拉取的账号数
+        "max_connections_per_server": 8,  # 单个 IMAP 服务器的最大并发连接数
+        "fetch_batch_size": 50,  # 单条 FETCH 命令包含的邮件数
+        "full_download": False,  # True 时下载完整 RFC822 原文，否则只取邮件头和正文开头
+        "preview_bytes": 2048,  # 每封邮件正文下载 / 解码的字节数（轻量模式和快速解析共用）
+        "store_batch_size": 500,  # 单条 UID STORE 命令包含的邮件数
+        "mark_read_after_save": False,  # True 时等结果保存成功后再统一标记已读（同步位置同样推迟提交）
+        "sync_mode": "unseen",  # unseen: 搜索未读邮件；incremental: 按 UID 只拉取上次之后的新邮件
+        "sync_state_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                        "data", "mail_sync.db"),  # 增量同步状态库，与 outlook_token.db 放在一起
+        "rules_path": os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "rules.json"),  # 过滤规则文件（格式见 rules.example.json），不存在时不过滤
+        "store_mails": False,  # 是否把拉取到的邮件写入本地邮件库（按账号 + Message-ID/UIDVALIDITY + UID 去重）
+        "mail_store_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                        "data", "mails.db"),  # 本地邮件库（带 FTS5 全文索引）
+        "reuse_imap_connections": True,  # 按账号复用已认证的 IMAP 连接
+        "imap_pool_check_seconds": 60,  # 连接空闲超过该秒数后，复用前先 NOOP 检查
+        "idle_timeout_seconds": 25 * 60,  # 推送模式下单次 IDLE 的最长时间（服务器通常 30 分钟断开）
+        "watch_retry_seconds": 30,  # 推送模式下获取 Token / 连接失败后的重试间隔
+        "token_batch_size": 20,  # 流水线模式下每次批量获取 Token 的账号数
+        "pipeline_queue_size": 1000,  # 流水线各阶段之间队列的最大长度（反压）
+        "digest_path": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "data", "mail_digest.db"),  # 按天累积的邮件摘要库（见 digest.py）
+        "smtp_server": "smtp.office365.com",  # 发送汇总邮件的 SMTP 服务器
+        "smtp_port": 587,
     }
     return config
 
 
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    获取进程内共享的 HTTP Session。
+
+    所有 API 调用复用同一个连接池（keep-alive），避免每次请求重新握手。
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                config = get_config()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=config["http_pool_maxsize"],
+                    pool_block=True
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_session = session
+    return _http_session
+
+
+_sync_state = None
+_sync_state_lock = threading.Lock()
+
+
+_mail_store = None
+_mail_store_lock = threading.Lock()
+
+
+def get_mail_store():
+    """获取进程内共享的本地邮件库"""
+    global _mail_store
+    with _mail_store_lock:
+        if _mail_store is None:
+            path = get_config()["mail_store_path"]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _mail_store = MailStore(path)
+        return _mail_store
+
+
+def get_sync_state():
+    """获取进程内共享的增量同步状态存储"""
+    global _sync_state
+    with _sync_state_lock:
+        if _sync_state is None:
+            path = get_config()["sync_state_path"]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _sync_state = SyncStateStore(path)
+        return _sync_state
+
+
 # ==============================================================
 # 2️⃣ Token 管理函数
 # ==============================================================
@@ -60,11 +166,11 @@ def get_access_token(emails):
 
     try:
         # 调用批量获取 token 接口
-        response = requests.post(
+        response = get_http_session().post(
             api_url,
             json={"emails": emails},
             headers={"Content-Type": "application/json"},
-            timeout=30
+            timeout=config["request_timeout"]
         )
 
         if response.status_code == 200:
@@ -143,166 +249,825 @@ def disconnect_imap(mail):
     """安全关闭 IMAP 连接"""
     try:
         if mail:
-            mail.close()
+            if mail.state == 'SELECTED':
+                mail.close()
             mail.logout()
     except Exception as e:
         print(f"[警告] 关闭连接时出错：{e}")
 
 
+_imap_pool = None
+_imap_pool_lock = threading.Lock()
+
+
+def get_imap_pool():
+    """获取进程内共享的 IMAP 连接池"""
+    global _imap_pool
+    with _imap_pool_lock:
+        if _imap_pool is None:
+            _imap_pool = IMAPConnectionPool(
+                connect_imap,
+                disconnect_imap,
+                check_interval=get_config()["imap_pool_check_seconds"]
+            )
+        return _imap_pool
+
+
+def close_imap_pool():
+    """关闭连接池中的所有连接（程序退出前调用）"""
+    if _imap_pool is not None:
+        _imap_pool.close_all()
+
+
+def open_imap(email_addr, access_token, pool=None):
+    """从连接池取出连接，未使用连接池时新建连接"""
+    if pool is not None:
+        return pool.acquire(email_addr, access_token)
+    return connect_imap(email_addr, access_token)
+
+
+def close_imap(email_addr, mail, pool=None, broken=False):
+    """归还到连接池，未使用连接池时直接关闭"""
+    if pool is not None:
+        pool.release(email_addr, broken=broken)
+    else:
+        disconnect_imap(mail)
+
+
 # ==============================================================
 # 4️⃣ 邮件拉取函数
 # ==============================================================
 
-def fetch_mails(email_addr, access_token, folder="INBOX", limit=100):
+def build_message_set(ids):
+    """
+    将邮件编号压缩为 IMAP 序列集合。
+
+    示例：
+        [b'7', b'1', b'2', b'3'] -> "1:3,7"
+    """
+    numbers = sorted({int(i) for i in ids})
+    ranges = []
+
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+def chunked(items, size):
+    """按 size 切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# 匹配 FETCH 响应中字面量前的数据项名称，如 "RFC822 {1234}"、"BODY[1]<0> {200}"
+_FETCH_LITERAL_RE = re.compile(rb'((?:BODY|BINARY|RFC822)[A-Z0-9.]*(?:\[[^\]]*\])?(?:<\d+>)?) \{\d+\}$',
+                               re.IGNORECASE)
+# 数据项内部的字面量（如 BODYSTRUCTURE 中含非 ASCII 字符的文件名）
+_NESTED_LITERAL_RE = re.compile(rb'\{\d+\}$')
+_FETCH_START_RE = re.compile(rb'^(\d+) \(')
+_FETCH_UID_RE = re.compile(r'\bUID (\d+)', re.IGNORECASE)
+
+
+def parse_fetch_response(data, by_uid=False):
     """
-    拉取指定文件夹的未读邮件。
+    解析一条 FETCH 命令返回的多封邮件数据。
+
+    imaplib 对每封邮件返回若干 (前缀, 字面量) 元组以及结尾的 b')'，
+    前缀以 "<编号> (" 开头时表示新的一封邮件。
+
+    参数：
+        data: mail.fetch() / mail.uid('FETCH', ...) 返回的数据
+        by_uid: 为 True 时按响应中的 UID 而不是序号建立索引
+
+    返回：
+        {编号: {"items": {数据项名称: 字面量}, "meta": 非字面量部分的文本}}
+    """
+    messages = {}
+    current = None
+
+    for part in data:
+        if part is None:
+            continue
+
+        head = part[0] if isinstance(part, tuple) else part
+        match = _FETCH_START_RE.match(head)
+        if match:
+            current = messages.setdefault(int(match.group(1)), {"items": {}, "meta": b""})
+            head = head[match.end():]
+        if current is None:
+            continue
+
+        if isinstance(part, tuple):
+            literal = _FETCH_LITERAL_RE.search(head)
+            if literal:
+                name = literal.group(1).decode().upper()
+                current["items"][name] = part[1]
+                head = head[:literal.start()]
+            else:
+                # 结构内部的字面量改写为引号字符串放回 meta，保证 BODYSTRUCTURE 等结构完整
+                nested = _NESTED_LITERAL_RE.search(head)
+                if nested:
+                    quoted = part[1].replace(b"\\", b"\\\\").replace(b'"', b'\\"')
+                    head = head[:nested.start()] + b'"' + quoted + b'"'
+            current["meta"] += head + b" "
+        else:
+            current["meta"] += head + b" "
+
+    for message in messages.values():
+        message["meta"] = message["meta"].decode(errors="ignore")
+
+    if by_uid:
+        by_uid_messages = {}
+        for message in messages.values():
+            match = _FETCH_UID_RE.search(message["meta"])
+            if match:
+                by_uid_messages[int(match.group(1))] = message
+        return by_uid_messages
+
+    return messages
+
+
+# IMAP 列表中的词法单元：括号、带转义的引号字符串、字面量长度、原子
+_IMAP_TOKEN_RE = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}|[^\s()"]+')
+
+
+def parse_imap_list(text):
+    """
+    将 IMAP 括号列表（如 BODYSTRUCTURE）解析为嵌套的 Python 列表。
+
+    引号字符串去掉引号，NIL 转为 None，其余原子保持字符串。
+    """
+    stack = [[]]
+
+    for token in _IMAP_TOKEN_RE.findall(text):
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                break
+            item = stack.pop()
+            stack[-1].append(item)
+            if len(stack) == 1:
+                break
+        elif token.startswith('"'):
+            stack[-1].append(re.sub(r'\\(.)', r'\1', token[1:-1]))
+        elif token.upper() == "NIL":
+            stack[-1].append(None)
+        else:
+            stack[-1].append(token)
+
+    return stack[0][0] if stack[0] and isinstance(stack[0][0], list) else None
+
+
+def find_text_part(structure, prefix=""):
+    """
+    在 BODYSTRUCTURE 中查找第一个非附件的 text/plain 部分（单部分邮件接受任意 text/*）。
+
+    返回：
+        (部分编号, charset, 传输编码)，找不到时返回 None
+    """
+    if not structure:
+        return None
+
+    # 多部分：前面若干个元素都是子部分
+    if isinstance(structure[0], list):
+        for i, child in enumerate(structure, 1):
+            if not isinstance(child, list):
+                break
+            found = find_text_part(child, f"{prefix}{i}.")
+            if found:
+                return found
+        return None
+
+    if len(structure) < 7:
+        return None
+
+    maintype = (structure[0] or "").lower()
+    subtype = (structure[1] or "").lower()
+    # 单部分邮件与完整模式一致：任意 text/* 正文都可作为预览
+    if maintype != "text" or (prefix and subtype != "plain"):
+        return None
+
+    # text 类型的扩展字段中第 10 个为 Content-Disposition
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+        return None
+
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for key, value in zip(params[::2], params[1::2]):
+        if str(key).lower() == "charset":
+            charset = value
+
+    # 单部分邮件的正文编号为 1
+    part = prefix[:-1] if prefix else "1"
+    return part, charset, structure[5]
+
+
+def decode_partial_body(data, encoding, charset):
+    """解码截断的正文片段，末尾不完整的编码单元直接丢弃"""
+    encoding = (encoding or "7BIT").upper()
+
+    if encoding == "BASE64":
+        compact = b"".join(data.split())
+        body = base64.b64decode(compact[:len(compact) // 4 * 4])
+    elif encoding == "QUOTED-PRINTABLE":
+        cut = data.rfind(b"=", max(len(data) - 2, 0))
+        body = quopri.decodestring(data[:cut] if cut != -1 else data)
+    else:
+        body = data
+
+    return body.decode(lookup_codec(charset) or 'utf-8', errors='ignore')
+
+
+def _find_item(items, prefix):
+    """按名称前缀查找 FETCH 数据项（服务器回显的名称格式不完全一致）"""
+    for name, value in items.items():
+        if name.startswith(prefix):
+            return value
+    return None
+
+
+def fetch_batch_full(mail, batch):
+    """
+    下载一批邮件的完整原文并解析（BODY.PEEK[] 不会隐式设置 \\Seen）。
+
+    参数：
+        batch: 邮件 UID 列表
+
+    返回：
+        {uid: 解析结果}
+    """
+    status, msg_data = mail.uid('FETCH', build_message_set(batch), '(UID BODY.PEEK[])')
+    if status != 'OK':
+        print(f"[警告] 无法获取邮件 {build_message_set(batch)}")
+        return {}
+
+    responses = parse_fetch_response(msg_data, by_uid=True)
+    parsed = {}
+
+    for mail_id in batch:
+        response = responses.get(int(mail_id))
+        raw_email = response["items"].get("BODY[]") if response else None
+        if raw_email is None:
+            print(f"[警告] 无法获取邮件 {mail_id.decode()}")
+            continue
+        parsed[mail_id] = parse_mail(raw_email, mail_id.decode())
+
+    return parsed
+
+
+def fetch_batch_light(mail, batch, preview_bytes):
+    """
+    轻量模式：只下载邮件头、BODYSTRUCTURE 和第一个 text/plain 部分的前 preview_bytes 字节。
+
+    正文片段按部分编号分组，每组一条 FETCH 命令。
+
+    参数：
+        batch: 邮件 UID 列表
+
+    返回：
+        {uid: 解析结果}
+    """
+    message_set = build_message_set(batch)
+    status, msg_data = mail.uid('FETCH', message_set,
+                                '(UID BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO DATE MESSAGE-ID)] BODYSTRUCTURE)')
+    if status != 'OK':
+        print(f"[警告] 无法获取邮件 {message_set}")
+        return {}
+
+    responses = parse_fetch_response(msg_data, by_uid=True)
+    headers = {}
+    text_parts = {}
+    groups = {}
+
+    for mail_id in batch:
+        response = responses.get(int(mail_id))
+        header = _find_item(response["items"], "BODY[HEADER") if response else None
+        if header is None:
+            print(f"[警告] 无法获取邮件 {mail_id.decode()}")
+            continue
+        headers[mail_id] = header
+
+        meta = response["meta"]
+        index = meta.upper().find("BODYSTRUCTURE")
+        text_part = find_text_part(parse_imap_list(meta[index + len("BODYSTRUCTURE"):])) if index != -1 else None
+        if text_part:
+            text_parts[mail_id] = text_part
+            groups.setdefault(text_part[0], []).append(mail_id)
+
+    previews = {}
+    for part, ids in groups.items():
+        status, msg_data = mail.uid('FETCH', build_message_set(ids), f'(UID BODY.PEEK[{part}]<0.{preview_bytes}>)')
+        if status != 'OK':
+            continue
+        part_responses = parse_fetch_response(msg_data, by_uid=True)
+        for mail_id in ids:
+            response = part_responses.get(int(mail_id))
+            data = _find_item(response["items"], f"BODY[{part}]") if response else None
+            if data is not None:
+                _, charset, encoding = text_parts[mail_id]
+                previews[mail_id] = ' '.join(decode_partial_body(data, encoding, charset).split())
+
+    return {
+        mail_id: parse_mail(header, mail_id.decode(), body_preview=previews.get(mail_id, ""))
+        for mail_id, header in headers.items()
+    }
+
+
+def search_mail_ids(mail, email_addr, folder, limit, incremental):
+    """
+    在已选择的文件夹中搜索待拉取的邮件 UID。
+
+    unseen 模式：搜索未读邮件，取最新的 limit 封，倒序返回（最新的在前）。
+    incremental 模式：只搜索 UID 大于上次同步位置的邮件，按 UID 升序取最早的 limit 封，
+    剩余的新邮件留到下一次；首次同步或 UIDVALIDITY 变化时取文件夹中最新的 limit 封。
+
+    返回：
+        (mail_ids, uidvalidity)，服务器未返回 UIDVALIDITY 时 uidvalidity 为 0
+    """
+    _, data = mail.response('UIDVALIDITY')
+    uidvalidity = int(data[0]) if data and data[0] else 0
+
+    if not incremental:
+        status, message_ids = mail.uid('SEARCH', None, 'UNSEEN')
+        if status != 'OK':
+            raise imaplib.IMAP4.error("搜索邮件失败")
+        mail_ids = list(reversed(message_ids[0].split()))
+        return mail_ids[:limit], uidvalidity
+
+    state = get_sync_state().get(email_addr, folder)
+
+    if state and state[0] == uidvalidity:
+        last_uid = state[1]
+        status, message_ids = mail.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+        if status != 'OK':
+            raise imaplib.IMAP4.error("搜索邮件失败")
+        # "n:*" 在没有新邮件时仍会返回当前最大 UID，需要再过滤一次
+        mail_ids = [i for i in message_ids[0].split() if int(i) > last_uid]
+        return mail_ids[:limit], uidvalidity
+
+    if state:
+        print(f"[警告] {email_addr} 的 UIDVALIDITY 已变化，重新同步 {folder}")
+
+    status, message_ids = mail.uid('SEARCH', None, 'ALL')
+    if status != 'OK':
+        raise imaplib.IMAP4.error("搜索邮件失败")
+    mail_ids = message_ids[0].split()
+    return mail_ids[-limit:] if limit else [], uidvalidity
+
+
+def iter_mails(email_addr, access_token, folder="INBOX", limit=100, batch_size=None, full_download=None,
+               mark_read=True, sync_mode=None, pool=None, apply_rules=True):
+    """
+    逐封产出指定文件夹的未读邮件，或增量拉取上次同步之后的新邮件。
+
+    邮件解析完成后立即交给调用方，不在内存中累积；标记已读和记录同步位置
+    在全部邮件产出之后执行，调用方中途放弃迭代时不会标记。
 
     参数：
         email_addr: 邮箱地址
         access_token: Access Token
         folder: 邮件文件夹名称
         limit: 最大拉取数量
+        batch_size: 每条 FETCH 命令包含的邮件数，默认读取配置
+        full_download: 是否下载完整原文，默认读取配置（否则使用轻量模式）
+        mark_read: 是否在拉取结束时标记为已读；为 False 时由调用方在保存后调用 mark_saved_mails_as_read，
+                   增量同步位置也只暂存，由 commit_sync_state 提交
+        sync_mode: "unseen" 或 "incremental"，默认读取配置
+        pool: IMAPConnectionPool，为 None 时每次新建连接并在结束后关闭
+        apply_rules: 是否在产出前用 checkKeyValue 过滤；为 False 时产出全部邮件，由调用方过滤
+
+    返回的邮件 id 为 UID，在 UIDVALIDITY 不变时跨会话有效；邮件的 uidvalidity 字段记录文件夹当前的 UIDVALIDITY。
 
     返回：
-        解析后的邮件列表
+        生成器，产出解析后的邮件；unseen 模式最新的在前，incremental 模式按 UID 升序
     """
-    mail = connect_imap(email_addr, access_token)
+    config = get_config()
+    batch_size = batch_size or config["fetch_batch_size"]
+    full_download = config["full_download"] if full_download is None else full_download
+    incremental = (sync_mode or config["sync_mode"]) == "incremental"
+
+    mail = open_imap(email_addr, access_token, pool)
     if not mail:
-        return []
+        return
 
-    all_mails = []
+    total = 0
+    broken = False
 
     try:
         # 选择文件夹
         status, messages = mail.select(folder)
         if status != 'OK':
             print(f"[错误] 无法打开文件夹：{folder}")
-            return []
+            return
 
-        # 搜索未读邮件
-        status, message_ids = mail.search(None, 'UNSEEN')
-        if status != 'OK':
+        # 搜索待拉取的邮件
+        try:
+            mail_ids, uidvalidity = search_mail_ids(mail, email_addr, folder, limit, incremental)
+        except imaplib.IMAP4.error:
             print(f"[错误] 搜索邮件失败")
-            return []
-
-        # 获取邮件 ID 列表
-        mail_ids = message_ids[0].split()
+            return
 
         if not mail_ids:
-            print(f"📭 没有未读邮件")
-            return []
+            print(f"📭 没有{'新' if incremental else '未读'}邮件")
+            return
 
-        # 倒序处理（最新的在前）
-        mail_ids = list(reversed(mail_ids))
+        print(f"📥 开始拉取邮件（文件夹：{folder}，{'新' if incremental else '未读'}邮件：{len(mail_ids)} 封）...")
 
-        # 限制拉取数量
-        mail_ids = mail_ids[:limit]
+        # 按批获取邮件，每批一次往返
+        fetched = 0
+        matched_ids = []
+        synced_uid = None
+        for batch in chunked(mail_ids, batch_size):
+            try:
+                if full_download:
+                    parsed_mails = fetch_batch_full(mail, batch)
+                else:
+                    parsed_mails = fetch_batch_light(mail, batch, config["preview_bytes"])
+            except imaplib.IMAP4.abort:
+                raise
+            except Exception as e:
+                print(f"[错误] 批量获取邮件失败：{e}")
+                parsed_mails = {}
 
-        print(f"📥 开始拉取邮件（文件夹：{folder}，未读邮件：{len(mail_ids)} 封）...")
+            # 增量模式按 UID 升序推进同步位置，某一批失败时停止，下次从这里继续
+            if incremental and not parsed_mails:
+                break
 
-        # 逐个获取邮件
-        for i, mail_id in enumerate(mail_ids, 1):
-            try:
-                # 获取邮件内容
-                status, msg_data = mail.fetch(mail_id, '(RFC822)')
-                if status != 'OK':
-                    print(f"[警告] 无法获取邮件 {mail_id}")
-                    continue
+            for mail_id in batch:
+                try:
+                    parsed_mail = parsed_mails.get(mail_id)
 
-                # 解析邮件
-                raw_email = msg_data[0][1]
-                parsed_mail = parse_mail(raw_email, mail_id.decode())
+                    hasKeyValue = checkKeyValue(parsed_mail) if apply_rules else True
 
-                hasKeyValue = checkKeyValue(parsed_mail)
+                    if not (parsed_mail and hasKeyValue):
+                        continue
 
-                if parsed_mail and hasKeyValue:
-                    all_mails.append(parsed_mail)
+                except Exception as e:
+                    print(f"[错误] 处理邮件 {mail_id} 失败：{e}")
+                    continue
 
-                    # 标记为已读
-                    mark_mail_as_read(mail, mail_id)
+                matched_ids.append(mail_id)
+                total += 1
+                parsed_mail["uidvalidity"] = uidvalidity
+                yield parsed_mail
 
-                print(f"  已拉取 {i}/{len(mail_ids)} 封邮件...")
+            fetched += len(batch)
+            synced_uid = int(batch[-1])
+            print(f"  已拉取 {fetched}/{len(mail_ids)} 封邮件...")
 
-            except Exception as e:
-                print(f"[错误] 处理邮件 {mail_id} 失败：{e}")
-                print(f"[错误] 处理邮件 {mail_id} 失败：{e}")
-                continue
+        # 统一标记为已读
+        if mark_read and matched_ids:
+            mark_mails_as_read(mail, matched_ids, config["store_batch_size"])
 
-        print(f"✅ 拉取完成，共获取 {len(all_mails)} 封邮件\n")
+        # 记录同步位置
+        if incremental and synced_uid is not None:
+            if mark_read:
+                get_sync_state().set(email_addr, folder, uidvalidity, synced_uid)
+            else:
+                get_sync_state().stage(email_addr, folder, uidvalidity, synced_uid)
+
+        print(f"✅ 拉取完成，共获取 {total} 封邮件\n")
 
     except Exception as e:
         print(f"[错误] 拉取邮件异常：{e}")
+        broken = True
     finally:
-        disconnect_imap(mail)
+        close_imap(email_addr, mail, pool, broken=broken)
+
+
+
+def fetch_mails(email_addr, access_token, folder="INBOX", limit=100, batch_size=None, full_download=None,
+                mark_read=True, sync_mode=None, pool=None):
+    """
+    拉取指定文件夹的邮件并返回列表，参数同 iter_mails。
+
+    返回：
+        解析后的邮件列表（最新的在前）
+    """
+    mails = list(iter_mails(
+        email_addr, access_token, folder=folder, limit=limit, batch_size=batch_size,
+        full_download=full_download, mark_read=mark_read, sync_mode=sync_mode, pool=pool
+    ))
+    if (sync_mode or get_config()["sync_mode"]) == "incremental":
+        mails.reverse()
+    return mails
 
-    return all_mails
 
+_server_semaphores = {}
+_server_semaphores_lock = threading.Lock()
 
-def mark_mail_as_read(mail, mail_id):
+
+def get_server_semaphore(server, limit):
+    """获取指定 IMAP 服务器的连接数信号量（同一服务器共用一个）"""
+    with _server_semaphores_lock:
+        semaphore = _server_semaphores.get(server)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(limit)
+            _server_semaphores[server] = semaphore
+        return semaphore
+
+
+def fetch_account_mails(email_addr, access_token, config, sink=None, apply_rules=True):
     """
-    将指定邮件标记为已读。
+    拉取单个账号的邮件并计时，拉取期间占用一个服务器连接名额。
 
     参数：
-        mail: IMAP 连接对象
-        mail_id: 邮件 ID
+        sink: NDJSONMailSink（或任何提供 write(account, mail) / flush() 的对象），
+              提供时邮件逐封写入 sink，返回的邮件列表为空
+        apply_rules: 是否在拉取时按过滤规则过滤，见 iter_mails
+
+    开启 store_mails 时，每封邮件同时写入本地邮件库。
 
     返回：
-        是否成功
+        (mails, timing): 邮件列表和 {"seconds", "wait_seconds", "count", "status"} 计时信息，
+        wait_seconds 为等待连接名额的时间
     """
-    try:
-        mail.store(mail_id, '+FLAGS', '\\Seen')
-        return True
-    except Exception as e:
-        print(f"[警告] 标记邮件失败：{e}")
-        return False
+    semaphore = get_server_semaphore(config["imap_server"], config["max_connections_per_server"])
+    queued_at = time.perf_counter()
+    status = "ok"
+    mails = []
+    count = 0
+    options = dict(
+        folder=config["default_folder"],
+        limit=config["max_mails"],
+        batch_size=config["fetch_batch_size"],
+        full_download=config["full_download"],
+        mark_read=not config["mark_read_after_save"],
+        sync_mode=config["sync_mode"],
+        pool=get_imap_pool() if config["reuse_imap_connections"] else None,
+        apply_rules=apply_rules
+    )
+
+    store = get_mail_store() if config["store_mails"] else None
+
+    with semaphore:
+        start = time.perf_counter()
+        try:
+            for mail in iter_mails(email_addr, access_token, **options):
+                if store is not None:
+                    store.write(email_addr, mail, folder=config["default_folder"])
+                if sink is not None:
+                    sink.write(email_addr, mail)
+                else:
+                    mails.append(mail)
+                count += 1
+        except Exception as e:
+            print(f"[错误] {email_addr} 拉取失败：{e}")
+            status = "error"
+        finally:
+            if store is not None:
+                store.flush()
+            if sink is not None:
+                sink.flush()
+
+    # 与 fetch_mails 一致，返回最新的在前
+    if config["sync_mode"] == "incremental":
+        mails.reverse()
+
+    timing = {
+        "seconds": round(time.perf_counter() - start, 3),
+        "wait_seconds": round(start - queued_at, 3),
+        "count": count,
+        "status": status
+    }
+    return mails, timing
+
+
+def fetch_all_accounts(emails, tokens, config=None, sink=None):
+    """
+    使用线程池并发拉取多个账号的邮件。
+
+    参数：
+        emails: 邮箱地址列表
+        tokens: {email: access_token} 字典，token 为空的账号会被跳过
+        config: 全局配置，默认使用 get_config()
+        sink: NDJSONMailSink，提供时邮件逐封写入 sink，不在内存中累积
+
+    返回：
+        (mails_by_account, timings): 与 emails 顺序一致的 {email: [mails]}（使用 sink 时为空列表），
+        以及 {email: {"seconds", "wait_seconds", "count", "status"}} 的计时信息
+    """
+    config = config or get_config()
+    results = {}
+    timings = {}
+
+    with ThreadPoolExecutor(max_workers=config["fetch_workers"], thread_name_prefix="imap-fetch") as executor:
+        futures = {}
+        for email_addr in emails:
+            token = tokens.get(email_addr)
+            if not token:
+                print(f"\n⏭️  跳过账号：{email_addr}（Token 获取失败）")
+                results[email_addr] = []
+                timings[email_addr] = {"seconds": 0.0, "wait_seconds": 0.0, "count": 0, "status": "skipped"}
+                continue
+            futures[executor.submit(fetch_account_mails, email_addr, token, config, sink)] = email_addr
+
+        for future in as_completed(futures):
+            email_addr = futures[future]
+            results[email_addr], timings[email_addr] = future.result()
+            print(f"📮 {email_addr}：{timings[email_addr]['count']} 封，耗时 {timings[email_addr]['seconds']:.2f}s")
+
+    mails_by_account = {email_addr: results[email_addr] for email_addr in emails}
+    return mails_by_account, timings
+
+
+def mark_mails_as_read(mail, mail_ids, batch_size=500):
+    """
+    使用 UID STORE 批量将邮件标记为已读。
+
+    参数：
+        mail: 已选择文件夹的 IMAP 连接对象
+        mail_ids: 邮件 UID 列表
+        batch_size: 单条命令包含的邮件数
+
+    返回：
+        是否全部成功
+    """
+    success = True
+
+    for batch in chunked(list(mail_ids), batch_size):
+        try:
+            status, _ = mail.uid('STORE', build_message_set(batch), '+FLAGS.SILENT', '(\\Seen)')
+            if status != 'OK':
+                print(f"[警告] 标记邮件失败：{status}")
+                success = False
+        except Exception as e:
+            print(f"[警告] 标记邮件失败：{e}")
+            success = False
+
+    return success
+
+
+def commit_sync_state():
+    """提交暂存的增量同步位置（mark_read_after_save 模式下在保存成功后调用）"""
+    if _sync_state is not None:
+        count = _sync_state.commit()
+        if count:
+            print(f"📌 已提交 {count} 个文件夹的同步位置")
+
+
+def discard_sync_state(account=None):
+    """丢弃暂存的增量同步位置；指定 account 时只丢弃该账号的，该账号下次从原位置重新拉取"""
+    if _sync_state is not None:
+        _sync_state.discard(account)
+
+
+def mark_saved_mails_as_read(mails_by_account, tokens, config=None):
+    """
+    结果保存成功后再统一标记已读（mark_read_after_save 模式）。
+
+    中途崩溃时，未保存的邮件保持未读，下次运行会重新拉取。
+
+    返回：
+        dict: {email: 是否全部标记成功}，没有邮件的账号视为成功
+    """
+    config = config or get_config()
+    pool = get_imap_pool() if config["reuse_imap_connections"] else None
+    results = {}
+
+    for email_addr, mails in mails_by_account.items():
+        if not mails:
+            results[email_addr] = True
+            continue
+
+        results[email_addr] = False
+        token = tokens.get(email_addr)
+        if not token:
+            continue
+
+        mail = open_imap(email_addr, token, pool)
+        if not mail:
+            continue
+
+        broken = False
+        try:
+            status, _ = mail.select(config["default_folder"])
+            if status == 'OK':
+                mail_ids = [m["id"].encode() for m in mails]
+                if mark_mails_as_read(mail, mail_ids, config["store_batch_size"]):
+                    results[email_addr] = True
+                    print(f"✅ {email_addr}：已标记 {len(mail_ids)} 封邮件为已读")
+        except Exception as e:
+            print(f"[错误] {email_addr} 标记已读失败：{e}")
+            broken = True
+        finally:
+            close_imap(email_addr, mail, pool, broken=broken)
+
+    return results
 
 
 # ==============================================================
 # 5️⃣ 邮件解析函数
 # ==============================================================
 
-def decode_mime_header(header_value):
-    """解码 MIME 编码的邮件头"""
-    if not header_value:
-        return ""
+@lru_cache(maxsize=128)
+def lookup_codec(charset):
+    """
+    将邮件中的 charset 名称规范化为 Python 编码名，结果缓存。
 
-    decoded_parts = decode_header(header_value)
-    result = []
+    未知编码返回 None；gb2312 / gbk 按其超集 gb18030 解码。
+    """
+    if not charset:
+        return None
+    try:
+        name = codecs.lookup(charset.strip().strip('"')).name
+    except LookupError:
+        return None
+    return 'gb18030' if name in ('gb2312', 'gbk') else name
+
+
+def _decode_header_part(content, encoding):
+    codec = lookup_codec(encoding) if encoding else None
+    if codec:
+        try:
+            return content.decode(codec)
+        except (UnicodeDecodeError, LookupError):
+            pass
+    return content.decode('utf-8', errors='ignore')
 
-    for content, encoding in decoded_parts:
+
+@lru_cache(maxsize=4096)
+def _decode_mime_header_cached(header_value):
+    result = []
+    for content, encoding in decode_header(header_value):
         if isinstance(content, bytes):
-            try:
-                if encoding:
-                    result.append(content.decode(encoding))
-                else:
-                    result.append(content.decode('utf-8', errors='ignore'))
-            except:
-                result.append(content.decode('utf-8', errors='ignore'))
+            result.append(_decode_header_part(content, encoding))
         else:
             result.append(str(content))
-
     return ''.join(result)
 
 
+def decode_mime_header(header_value):
+    """解码 MIME 编码的邮件头（同一邮件头的解码结果会被缓存）"""
+    if not header_value:
+        return ""
+
+    if not isinstance(header_value, str):
+        return _decode_mime_header_cached.__wrapped__(header_value)
+
+    # 没有 encoded-word 时 decode_header 原样返回
+    if "=?" not in header_value:
+        return header_value
+
+    return _decode_mime_header_cached(header_value)
+
+
+_rule_engine = None
+_rule_engine_lock = threading.Lock()
+
+
+def get_rule_engine():
+    """加载并编译过滤规则，规则文件不存在时返回 None"""
+    global _rule_engine
+    with _rule_engine_lock:
+        if _rule_engine is None:
+            path = get_config()["rules_path"]
+            _rule_engine = RuleEngine.from_file(path) if os.path.exists(path) else False
+            if _rule_engine:
+                print(f"📐 已加载 {len(_rule_engine.rules)} 条过滤规则：{path}")
+        return _rule_engine or None
+
+
 def checkKeyValue(mail):
-    # todo Implement this function to check if the email has the keywords
-    return True
+    """
+    按过滤规则检查邮件是否需要保留。
 
+    没有规则文件时全部保留；命中的规则名写入 mail["matched_rules"]。
+    """
+    if not mail:
+        return False
+
+    engine = get_rule_engine()
+    if engine is None:
+        return True
 
-def parse_mail(raw_email, mail_id):
+    matched = engine.match(mail)
+    mail["matched_rules"] = matched
+    return bool(matched)
+
+
+def parse_mail(raw_email, mail_id, body_preview=None):
     """
     解析单封邮件的主要字段。
 
     参数：
-        raw_email: 原始邮件字节流
+        raw_email: 原始邮件字节流（轻量模式下只有邮件头）
         mail_id: 邮件 ID
+        body_preview: 已提取的正文预览，为 None 时从 raw_email 中提取
 
     返回：
         标准化字典
     """
     try:
-        # 解析邮件
-        msg = email.message_from_bytes(raw_email)
+        # 只解析邮件头，正文按需截取
+        body_start = find_body_start(raw_email, 0, len(raw_email))
+        msg = _header_parser.parsebytes(raw_email[:body_start])
 
         # 提取主题
         subject = decode_mime_header(msg.get('Subject', '(无主题)'))
@@ -328,10 +1093,15 @@ def parse_mail(raw_email, mail_id):
                 received_time = date_header
 
         # 提取邮件正文预览
-        body_preview = extract_body_preview(msg)
+        if body_preview is None:
+            try:
+                body_preview = fast_body_preview(raw_email, msg, body_start)
+            except Exception:
+                body_preview = extract_body_preview(email.message_from_bytes(raw_email))
 
         mail_info = {
             "id": mail_id,
+            "message_id": msg.get('Message-ID', '').strip() or None,
             "subject": subject,
             "from": from_addr,
             "to": to_addrs,
@@ -347,8 +1117,101 @@ def parse_mail(raw_email, mail_id):
         return None
 
 
+_header_parser = BytesHeaderParser()
+
+
+def find_body_start(data, start, end):
+    """返回 data[start:end] 中邮件头之后正文的起始位置（没有正文时为 end）"""
+    if data.startswith(b"\r\n", start):
+        return start + 2
+    if data.startswith(b"\n", start):
+        return start + 1
+
+    # 逐行查找第一个空行（兼容 LF / CRLF），只扫描邮件头部分
+    pos = start
+    while True:
+        line_end = data.find(b"\n", pos, end)
+        if line_end == -1:
+            return end
+        if data.startswith(b"\n", line_end + 1):
+            return line_end + 2
+        if data.startswith(b"\r\n", line_end + 1):
+            return line_end + 3
+        pos = line_end + 1
+
+
+def _part_text(data, headers, start, end, limit):
+    """解码单个部分正文的前 limit 字节；为了凑够 200 个可见字符，按需扩大读取范围"""
+    encoding = headers.get('Content-Transfer-Encoding')
+    charset = headers.get_content_charset()
+
+    while True:
+        stop = min(end, start + limit)
+        text = ' '.join(decode_partial_body(data[start:stop], encoding, charset).split())
+        if len(text) >= 200 or stop >= end:
+            return text
+        limit *= 4
+
+
+def _find_preview(data, headers, start, end, limit, top_level):
+    """
+    在 data[start:end] 内查找第一个 text/plain 部分并解码预览，不复制、不解码其他部分。
+
+    单部分邮件与 extract_body_preview 一致：无论类型都取其正文。
+    """
+    if headers.get_content_maintype() == 'multipart':
+        boundary = headers.get_boundary()
+        if not boundary:
+            raise ValueError("multipart 缺少 boundary")
+        delimiter = b"--" + boundary.encode()
+
+        pos = data.find(delimiter, start, end)
+        while pos != -1:
+            after = pos + len(delimiter)
+            if data.startswith(b"--", after):
+                break
+            line_end = data.find(b"\n", after, end)
+            if line_end == -1:
+                break
+            next_pos = data.find(b"\n" + delimiter, line_end, end)
+            part_end = next_pos if next_pos != -1 else end
+            if part_end > line_end + 1 and data[part_end - 1:part_end] == b"\r":
+                part_end -= 1
+
+            part_start = line_end + 1
+            body_start = find_body_start(data, part_start, part_end)
+            part_headers = _header_parser.parsebytes(data[part_start:body_start])
+
+            preview = _find_preview(data, part_headers, body_start, part_end, limit, False)
+            if preview:
+                return preview
+
+            pos = next_pos + 1 if next_pos != -1 else -1
+        return ""
+
+    if top_level or headers.get_content_type() == 'text/plain':
+        return _part_text(data, headers, start, end, limit)
+    return ""
+
+
+def fast_body_preview(raw_email, headers, body_start, limit=None):
+    """
+    快速提取正文预览：按 boundary 定位第一个 text/plain 部分，只解码其开头 limit 字节。
+
+    附件等其他部分既不解析也不解码，耗时与邮件大小基本无关（只需 bytes.find 定位边界）。
+
+    参数：
+        raw_email: 原始邮件字节流
+        headers: 已解析的顶层邮件头
+        body_start: 正文起始位置
+        limit: 解码的字节数，默认读取配置 preview_bytes
+    """
+    limit = limit or get_config()["preview_bytes"]
+    return _find_preview(raw_email, headers, body_start, len(raw_email), limit, True)
+
+
 def extract_body_preview(msg):
-    """提取邮件正文预览"""
+    """提取邮件正文预览（完整解析路径，快速路径失败时使用）"""
     body = ""
 
     try:
@@ -388,6 +1251,9 @@ def save_mails(mails_by_account, path="emails.json"):
     参数：
         mails_by_account: {email: [mails]} 的字典
         path: 保存路径
+
+    返回：
+        是否保存成功
     """
     try:
         # 统计信息
@@ -412,16 +1278,119 @@ def save_mails(mails_by_account, path="emails.json"):
         for email_addr, mails in mails_by_account.items():
             print(f"  - {email_addr}: {len(mails)} 封")
 
+        return True
+
     except Exception as e:
         print(f"[错误] 保存失败：{e}")
+        return False
+
+
+# ==============================================================
+# 7️⃣ 推送（IDLE）模式
+# ==============================================================
+
+def print_new_mails(email_addr, mails):
+    """推送模式下默认的新邮件处理：打印摘要"""
+    print(f"📨 {email_addr} 收到 {len(mails)} 封新邮件")
+    for mail in mails[:10]:
+        print(f"  - {mail['received_time']} {mail['from']}：{mail['subject']}")
+
+
+def watch_account(email_addr, on_new_mail, config, stop_event):
+    """
+    单个账号的推送循环：增量拉取新邮件 -> IDLE 等待 -> 收到推送或超时后再次拉取。
+
+    拉取与 IDLE 复用连接池中的同一个连接，每轮重新获取 Token，Token 轮换后连接池会重新认证。
+    """
+    pool = get_imap_pool()
+    folder = config["default_folder"]
+
+    while not stop_event.is_set():
+        token = get_access_token([email_addr]).get(email_addr)
+        if not token:
+            stop_event.wait(config["watch_retry_seconds"])
+            continue
+
+        mails = fetch_mails(
+            email_addr,
+            token,
+            folder=folder,
+            limit=config["max_mails"],
+            batch_size=config["fetch_batch_size"],
+            full_download=config["full_download"],
+            sync_mode="incremental",
+            pool=pool
+        )
+        if mails:
+            try:
+                on_new_mail(email_addr, mails)
+            except Exception as e:
+                print(f"[错误] {email_addr} 新邮件处理失败：{e}")
+
+        mail = pool.acquire(email_addr, token)
+        if not mail:
+            stop_event.wait(config["watch_retry_seconds"])
+            continue
+
+        broken = False
+        try:
+            if mail.state != 'SELECTED':
+                mail.select(folder)
+            idle_wait(mail, config["idle_timeout_seconds"], should_stop=stop_event.is_set)
+        except Exception as e:
+            print(f"[警告] {email_addr} IDLE 中断：{e}")
+            broken = True
+        finally:
+            pool.release(email_addr, broken=broken)
+
+        if broken:
+            stop_event.wait(config["watch_retry_seconds"])
+
+
+def watch_mailboxes(emails, on_new_mail=print_new_mails, config=None, stop_event=None):
+    """
+    常驻推送模式：每个账号一个线程保持 IDLE，新邮件到达后几秒内增量拉取并回调 on_new_mail。
+
+    参数：
+        emails: 邮箱地址列表
+        on_new_mail: 回调 on_new_mail(email_addr, mails)
+        config: 全局配置，默认使用 get_config()
+        stop_event: threading.Event，设置后所有线程在一个轮询周期内退出
+    """
+    config = config or get_config()
+    stop_event = stop_event or threading.Event()
+
+    threads = [
+        threading.Thread(
+            target=watch_account,
+            args=(email_addr, on_new_mail, config, stop_event),
+            name=f"imap-idle-{email_addr}",
+            daemon=True
+        )
+        for email_addr in emails
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        print("\n🛑 正在停止推送模式...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        close_imap_pool()
 
 
 # ==============================================================
-# 7️⃣ 主函数
+# 8️⃣ 主函数
 # ==============================================================
 
-def main():
-    """主程序入口"""
+def main(watch=False):
+    """主程序入口；watch 为 True 时进入常驻推送模式"""
     config = get_config()
 
     # 定义要拉取的邮箱列表
@@ -436,6 +1405,11 @@ def main():
     print(f"📁 目标文件夹：{config['default_folder']}")
     print(f"📊 每账号最多拉取：{config['max_mails']} 封\n")
 
+    if watch:
+        print("👀 推送模式：等待新邮件（Ctrl+C 退出）")
+        watch_mailboxes(emails, config=config)
+        return
+
     # 1. 批量获取所有邮箱的 access token
     print("🔑 步骤 1/3：获取 Access Token")
     print("-" * 60)
@@ -444,28 +1418,48 @@ def main():
     # 2. 拉取每个邮箱的邮件
     print("\n📬 步骤 2/3：拉取邮件内容")
     print("-" * 60)
-    mails_by_account = {}
-
-    for email_addr in emails:
-        token = tokens.get(email_addr)
-
-        if token:
-            print(f"\n📮 正在处理账号：{email_addr}")
-            mails = fetch_mails(
-                email_addr,
-                token,
-                folder=config["default_folder"],
-                limit=config["max_mails"]
-            )
-            mails_by_account[email_addr] = mails
-        else:
-            print(f"\n⏭️  跳过账号：{email_addr}（Token 获取失败）")
-            mails_by_account[email_addr] = []
+    start = time.perf_counter()
+    sink = NDJSONMailSink(config["ndjson_path"]) if config["stream_output"] else None
+    try:
+        mails_by_account, timings = fetch_all_accounts(emails, tokens, config, sink=sink)
+    finally:
+        if sink is not None:
+            sink.close()
+    elapsed = time.perf_counter() - start
+
+    # 每个账号的耗时统计（由慢到快）
+    print(f"\n⏱️  拉取总耗时 {elapsed:.2f}s（并发数 {config['fetch_workers']}）")
+    for email_addr, timing in sorted(timings.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        print(f"  - {email_addr}: {timing['seconds']:.2f}s（排队 {timing['wait_seconds']:.2f}s），"
+              f"{timing['count']} 封（{timing['status']}）")
+
+    # 过滤规则命中统计
+    engine = get_rule_engine()
+    if engine is not None and engine.hits:
+        print("\n📐 规则命中次数：")
+        for name, hits in engine.hits.most_common(20):
+            print(f"  - {name}: {hits}")
 
     # 3. 保存结果
     print("\n💾 步骤 3/3：保存结果")
     print("-" * 60)
-    save_mails(mails_by_account, config["save_path"])
+    if sink is not None:
+        # 邮件已在拉取过程中逐封写入
+        saved = True
+        mails_by_account = {
+            email_addr: [{"id": mail_id} for mail_id in sink.written.get(email_addr, [])]
+            for email_addr in emails
+        }
+        print(f"💾 邮件数据已追加到：{config['ndjson_path']}（本次 {sink.total} 封）")
+    else:
+        saved = save_mails(mails_by_account, config["save_path"])
+
+    # 保存成功后再标记已读、提交同步位置，保存失败时邮件保持未读，下次重新拉取
+    if config["mark_read_after_save"] and saved:
+        mark_saved_mails_as_read(mails_by_account, tokens, config)
+        commit_sync_state()
+
+    close_imap_pool()
 
     print("\n" + "=" * 60)
     print("✅ 所有任务完成！")
@@ -477,4 +1471,8 @@ def main():
 # ==============================================================
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Outlook 邮件拉取（IMAP）")
+    parser.add_argument("--watch", action="store_true", help="常驻推送模式（IMAP IDLE）")
+    args = parser.parse_args()
+
+    main(watch=args.watch)
\ No newline at end of file
@@ -8,346 +8,361 @@
   - 通过 SMTP 发送汇总邮件
 """
 
-import smtplib
+import heapq
+import html
+import os
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from email.utils import mktime_tz, parsedate_tz
 from datetime import datetime
 from collections import Counter
+from functools import lru_cache
+
+from digest_sender import DigestSender
 
 
 # ==============================================================
 # 1️⃣ 邮件列表统计函数
 # ==============================================================
 
+def parse_received_time(value):
+    """
+    接收时间转为 epoch 秒（int）。
+
+    支持 parse_mail 输出的 ISO 时间（不带时区时按本地时间处理，与 mail_store 一致）
+    以及解析失败时保留的原始 Date 头；都无法解析时返回 None。
+    """
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    try:
+        parsed = parsedate_tz(value)
+        return mktime_tz(parsed) if parsed else None
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _format_minute(minute, fmt):
+    """按分钟缓存的本地时间格式化（报告中的时间格式都精确到分钟）"""
+    return time.strftime(fmt, time.localtime(minute * 60))
+
+
+class MailRecord:
+    """汇总用的邮件记录：只保留报告需要的字段，接收时间在构建时解析一次"""
+
+    __slots__ = ("account", "subject", "sender", "received_time", "received_ts", "is_read", "body_preview")
+
+    def __init__(self, account, mail):
+        self.account = account
+        self.subject = mail.get("subject") or ""
+        self.sender = mail.get("from") or ""
+        self.received_time = mail.get("received_time") or ""
+        self.received_ts = parse_received_time(self.received_time)
+        self.is_read = mail.get("is_read", True)
+        self.body_preview = mail.get("body_preview") or ""
+
+    def format_time(self, fmt, fallback_len):
+        """按本地时间格式化接收时间（fmt 精确到分钟），无法解析时截取原始字符串"""
+        if self.received_ts is not None:
+            return _format_minute(self.received_ts // 60, fmt)
+        return self.received_time[:fallback_len] or "未知"
+
+    def sort_key(self):
+        """最新的在前，无法解析时间的排在最后（用于 reverse=True 排序）"""
+        ts = self.received_ts
+        return (ts is not None, ts or 0)
+
+
 def summarize_mails(mails_by_account):
     """
-    统计邮件信息并生成汇总数据。
+    统计邮件信息并生成汇总数据（单次遍历）。
 
     参数：
-        mails_by_account: {email: [mails]} 的字典
+        mails_by_account: {email: [mails]} 的字典，
+            或逐条产出 (email, mail) 的可迭代对象（如 mail_sink.iter_ndjson_mails(path)）
 
     返回：
-        dict: 包含邮件列表和统计信息的字典
+        dict: 包含邮件列表和统计信息的字典，mail_list 为按接收时间倒序的 MailRecord 列表
     """
-    summary = {
-        "total_mails": 0,
-        "total_accounts": len(mails_by_account),
-        "mail_list": [],  # 所有邮件的扁平列表
-        "by_account": {},  # 按账号分组的邮件
+    mail_list = []
+    by_sender = Counter()
+    by_account = {}
+    total_unread = 0
+
+    if isinstance(mails_by_account, dict):
+        # 没有邮件的账号也要出现在统计中
+        by_account = dict.fromkeys(mails_by_account, 0)
+        records = (
+            (account, mail)
+            for account, mails in mails_by_account.items()
+            for mail in mails
+        )
+    else:
+        records = mails_by_account
+
+    for account, mail in records:
+        record = MailRecord(account, mail)
+        mail_list.append(record)
+        by_account[account] = by_account.get(account, 0) + 1
+        by_sender[record.sender or "未知"] += 1
+        if not record.is_read:
+            total_unread += 1
+
+    # 按接收时间排序（最新的在前）
+    mail_list.sort(key=MailRecord.sort_key, reverse=True)
+
+    return {
+        "total_mails": len(mail_list),
+        "total_accounts": len(by_account),
+        "mail_list": mail_list,
         "stats": {
-            "by_sender": Counter(),
-            "by_account": {},
-            "total_unread": 0
+            "by_sender": by_sender,
+            "by_account": by_account,
+            "total_unread": total_unread
         }
     }
 
-    # 遍历所有账号
-    for account, mails in mails_by_account.items():
-        account_info = {
-            "count": len(mails),
-            "mails": mails
-        }
-        summary["by_account"][account] = account_info
-        summary["stats"]["by_account"][account] = len(mails)
-
-        # 添加到总列表
-        for mail in mails:
-            # 添加账号信息到每封邮件
-            mail_with_account = mail.copy()
-            mail_with_account["account"] = account
-            summary["mail_list"].append(mail_with_account)
-
-            # 统计发件人
-            sender = mail.get("from", "未知")
-            summary["stats"]["by_sender"][sender] += 1
-
-            # 统计未读
-            if not mail.get("is_read", True):
-                summary["stats"]["total_unread"] += 1
-
-    summary["total_mails"] = len(summary["mail_list"])
-
-    # 按时间排序（最新的在前）
-    summary["mail_list"].sort(
-        key=lambda x: x.get("received_time", ""),
-        reverse=True
-    )
 
-    return summary
+def merge_summaries(summaries):
+    """
+    合并多个 summarize_mails 的结果（如按账号分别汇总后得到总汇总）。
+
+    各自的 mail_list 已按时间排好序，这里只做归并，不重新解析邮件。
+    """
+    summaries = list(summaries)
+    by_sender = Counter()
+    by_account = {}
+    total_unread = 0
+    for summary in summaries:
+        stats = summary["stats"]
+        by_sender.update(stats["by_sender"])
+        for account, count in stats["by_account"].items():
+            by_account[account] = by_account.get(account, 0) + count
+        total_unread += stats["total_unread"]
+
+    mail_list = list(heapq.merge(
+        *(summary["mail_list"] for summary in summaries), key=MailRecord.sort_key, reverse=True
+    ))
+
+    return {
+        "total_mails": len(mail_list),
+        "total_accounts": len(by_account),
+        "mail_list": mail_list,
+        "stats": {
+            "by_sender": by_sender,
+            "by_account": by_account,
+            "total_unread": total_unread
+        }
+    }
 
 
 # ==============================================================
 # 2️⃣ 生成 HTML 邮件列表表格
 # ==============================================================
 
-def generate_mail_table_html(summary, title="邮件汇总列表"):
+# 样式只随报告头部输出一次（压缩为紧凑写法，减少每份报告的体积）
+_CSS = (
+    "body{font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,'Helvetica Neue',Arial,sans-serif;"
+    "line-height:1.6;color:#333;max-width:1400px;margin:0 auto;padding:20px;background-color:#f8f9fa}"
+    ".header{background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:white;padding:30px;"
+    "border-radius:10px;margin-bottom:25px;box-shadow:0 4px 6px rgba(0,0,0,0.1)}"
+    ".header h1{margin:0 0 10px 0;font-size:28px}"
+    ".header .meta{opacity:0.9;font-size:14px}"
+    ".stats-bar{background:white;padding:20px;border-radius:8px;margin-bottom:20px;display:grid;"
+    "grid-template-columns:repeat(auto-fit,minmax(200px,1fr));gap:15px;box-shadow:0 2px 4px rgba(0,0,0,0.05)}"
+    ".stat-item{text-align:center;padding:15px;border-radius:6px;"
+    "background:linear-gradient(135deg,#f5f7fa 0%,#c3cfe2 100%)}"
+    ".stat-label{font-size:12px;color:#666;text-transform:uppercase;margin-bottom:5px}"
+    ".stat-value{font-size:24px;font-weight:bold;color:#667eea}"
+    ".table-container{background:white;border-radius:8px;padding:20px;"
+    "box-shadow:0 2px 4px rgba(0,0,0,0.05);overflow-x:auto}"
+    "table{width:100%;border-collapse:collapse;font-size:14px}"
+    "thead{background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:white}"
+    "th{padding:12px 10px;text-align:left;font-weight:600;white-space:nowrap}"
+    "td{padding:12px 10px;border-bottom:1px solid #e9ecef;vertical-align:top}"
+    "tbody tr:hover{background-color:#f8f9fa}"
+    "tbody tr:last-child td{border-bottom:none}"
+    ".account-badge{display:inline-block;padding:4px 10px;border-radius:12px;background-color:#e3f2fd;"
+    "color:#1976d2;font-size:11px;font-weight:500}"
+    ".subject-cell{max-width:300px;font-weight:500;color:#2c3e50}"
+    ".sender-cell{color:#555;font-size:13px}"
+    ".time-cell{color:#999;font-size:12px;white-space:nowrap}"
+    ".preview-cell{max-width:350px;color:#777;font-size:13px;line-height:1.4;overflow:hidden;"
+    "text-overflow:ellipsis;display:-webkit-box;-webkit-line-clamp:2;-webkit-box-orient:vertical}"
+    ".index-cell{color:#999;font-weight:500;text-align:center}"
+    ".footer{text-align:center;margin-top:30px;padding:20px;color:#999;font-size:12px}"
+    "@media (max-width:768px){.stats-bar{grid-template-columns:1fr 1fr}table{font-size:12px}"
+    "th,td{padding:8px 5px}.subject-cell{max-width:200px}.preview-cell{max-width:250px}}"
+)
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title}</title>
+<style>{css}</style>
+</head>
+<body>
+<div class="header">
+<h1>📬 {title}</h1>
+<div class="meta">生成时间: {generated_at}</div>
+</div>
+<div class="stats-bar">
+<div class="stat-item"><div class="stat-label">📧 总邮件数</div><div class="stat-value">{total_mails}</div></div>
+<div class="stat-item"><div class="stat-label">👥 邮箱账号</div><div class="stat-value">{total_accounts}</div></div>
+<div class="stat-item"><div class="stat-label">📮 独立发件人</div><div class="stat-value">{total_senders}</div></div>
+<div class="stat-item"><div class="stat-label">🔔 未读邮件</div><div class="stat-value">{total_unread}</div></div>
+</div>
+<div class="table-container">
+<table>
+<thead>
+<tr>
+<th style="width: 40px;">#</th>
+<th style="width: 150px;">账号</th>
+<th style="width: 250px;">主题</th>
+<th style="width: 200px;">发件人</th>
+<th style="width: 140px;">接收时间</th>
+<th>正文预览</th>
+</tr>
+</thead>
+<tbody>
+"""
+
+_HTML_ROW = (
+    '<tr><td class="index-cell">{}</td>'
+    '<td><span class="account-badge">{}</span></td>'
+    '<td class="subject-cell" title="{}">{}</td>'
+    '<td class="sender-cell" title="{}">{}</td>'
+    '<td class="time-cell">{}</td>'
+    '<td class="preview-cell">{}</td></tr>\n'
+).format
+
+_HTML_TAIL = """</tbody>
+</table>
+</div>
+<div class="footer">
+<p>📊 本汇总由邮件拉取系统自动生成</p>
+</div>
+</body>
+</html>
+"""
+
+
+# 一行中需要转义的字段数（账号、主题、主题截断、发件人、发件人截断、时间、预览）
+_ROW_FIELDS = 7
+
+
+def _escape_fields(fields):
     """
-    生成包含邮件列表表格的 HTML。
+    批量 HTML 转义：用 \\0 连接后整体转义一次再拆分，避免逐字段调用 html.escape。
+    字段本身含 \\0 时拆分结果对不上，退回逐字段转义。
+    """
+    escaped = html.escape("\0".join(fields)).split("\0")
+    if len(escaped) != len(fields):
+        escaped = [html.escape(field) for field in fields]
+    return escaped
+
+
+def _render_rows(first_idx, fields):
+    """将 _ROW_FIELDS 个一组的原始字段渲染为表格行"""
+    escaped = iter(_escape_fields(fields))
+    return "".join([
+        _HTML_ROW(idx, *row)
+        for idx, row in enumerate(zip(*[escaped] * _ROW_FIELDS), first_idx)
+    ])
+
+
+def iter_mail_table_html(summary, title="邮件汇总列表", chunk_rows=1000):
+    """
+    逐块生成邮件列表 HTML。
+
+    每块最多包含 chunk_rows 行，块内字段批量转义后用 join 拼接；
+    总耗时与邮件数成线性关系，内存占用只与单块大小有关。
 
     参数：
         summary: 邮件汇总数据
         title: 报告标题
+        chunk_rows: 每块的行数
 
     返回：
-        str: HTML 内容
+        生成器，产出 HTML 字符串片段
     """
-    mail_list = summary.get("mail_list", [])
     stats = summary.get("stats", {})
 
-    html = f"""
-    <!DOCTYPE html>
-    <html lang="zh-CN">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>{title}</title>
-        <style>
-            body {{
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 1400px;
-                margin: 0 auto;
-                padding: 20px;
-                background-color: #f8f9fa;
-            }}
-            .header {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 30px;
-                border-radius: 10px;
-                margin-bottom: 25px;
-                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-            }}
-            .header h1 {{
-                margin: 0 0 10px 0;
-                font-size: 28px;
-            }}
-            .header .meta {{
-                opacity: 0.9;
-                font-size: 14px;
-            }}
-            .stats-bar {{
-                background: white;
-                padding: 20px;
-                border-radius: 8px;
-                margin-bottom: 20px;
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                gap: 15px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-            }}
-            .stat-item {{
-                text-align: center;
-                padding: 15px;
-                border-radius: 6px;
-                background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-            }}
-            .stat-label {{
-                font-size: 12px;
-                color: #666;
-                text-transform: uppercase;
-                margin-bottom: 5px;
-            }}
-            .stat-value {{
-                font-size: 24px;
-                font-weight: bold;
-                color: #667eea;
-            }}
-            .table-container {{
-                background: white;
-                border-radius: 8px;
-                padding: 20px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-                overflow-x: auto;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                font-size: 14px;
-            }}
-            thead {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-            }}
-            th {{
-                padding: 12px 10px;
-                text-align: left;
-                font-weight: 600;
-                white-space: nowrap;
-            }}
-            td {{
-                padding: 12px 10px;
-                border-bottom: 1px solid #e9ecef;
-                vertical-align: top;
-            }}
-            tbody tr:hover {{
-                background-color: #f8f9fa;
-            }}
-            tbody tr:last-child td {{
-                border-bottom: none;
-            }}
-            .account-badge {{
-                display: inline-block;
-                padding: 4px 10px;
-                border-radius: 12px;
-                background-color: #e3f2fd;
-                color: #1976d2;
-                font-size: 11px;
-                font-weight: 500;
-            }}
-            .subject-cell {{
-                max-width: 300px;
-                font-weight: 500;
-                color: #2c3e50;
-            }}
-            .sender-cell {{
-                color: #555;
-                font-size: 13px;
-            }}
-            .time-cell {{
-                color: #999;
-                font-size: 12px;
-                white-space: nowrap;
-            }}
-            .preview-cell {{
-                max-width: 350px;
-                color: #777;
-                font-size: 13px;
-                line-height: 1.4;
-                overflow: hidden;
-                text-overflow: ellipsis;
-                display: -webkit-box;
-                -webkit-line-clamp: 2;
-                -webkit-box-orient: vertical;
-            }}
-            .index-cell {{
-                color: #999;
-                font-weight: 500;
-                text-align: center;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 30px;
-                padding: 20px;
-                color: #999;
-                font-size: 12px;
-            }}
-            @media (max-width: 768px) {{
-                .stats-bar {{
-                    grid-template-columns: 1fr 1fr;
-                }}
-                table {{
-                    font-size: 12px;
-                }}
-                th, td {{
-                    padding: 8px 5px;
-                }}
-                .subject-cell {{
-                    max-width: 200px;
-                }}
-                .preview-cell {{
-                    max-width: 250px;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>📬 {title}</h1>
-            <div class="meta">生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
-        </div>
-
-        <div class="stats-bar">
-            <div class="stat-item">
-                <div class="stat-label">📧 总邮件数</div>
-                <div class="stat-value">{summary.get('total_mails', 0)}</div>
-            </div>
-            <div class="stat-item">
-                <div class="stat-label">👥 邮箱账号</div>
-                <div class="stat-value">{summary.get('total_accounts', 0)}</div>
-            </div>
-            <div class="stat-item">
-                <div class="stat-label">📮 独立发件人</div>
-                <div class="stat-value">{len(stats.get('by_sender', {}))}</div>
-            </div>
-            <div class="stat-item">
-                <div class="stat-label">🔔 未读邮件</div>
-                <div class="stat-value">{stats.get('total_unread', 0)}</div>
-            </div>
-        </div>
-
-        <div class="table-container">
-            <table>
-                <thead>
-                    <tr>
-                        <th style="width: 40px;">#</th>
-                        <th style="width: 150px;">账号</th>
-                        <th style="width: 250px;">主题</th>
-                        <th style="width: 200px;">发件人</th>
-                        <th style="width: 140px;">接收时间</th>
-                        <th>正文预览</th>
-                    </tr>
-                </thead>
-                <tbody>
+    yield _HTML_HEAD.format(
+        title=html.escape(title),
+        css=_CSS,
+        generated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        total_mails=summary.get('total_mails', 0),
+        total_accounts=summary.get('total_accounts', 0),
+        total_senders=len(stats.get('by_sender', {})),
+        total_unread=stats.get('total_unread', 0),
+    )
+
+    fields = []
+    first_idx = 1
+    for idx, mail in enumerate(summary.get("mail_list", []), 1):
+        subject = mail.subject or "(无主题)"
+        sender = mail.sender or "未知"
+        preview = mail.body_preview
+
+        fields += (
+            (mail.account or "未知").partition('@')[0],
+            subject,
+            subject[:50] + "..." if len(subject) > 50 else subject,
+            sender,
+            sender[:35] + "..." if len(sender) > 35 else sender,
+            mail.format_time('%m-%d %H:%M', 16),
+            preview[:100] + "..." if len(preview) > 100 else preview,
+        )
+        if len(fields) >= chunk_rows * _ROW_FIELDS:
+            yield _render_rows(first_idx, fields)
+            fields = []
+            first_idx = idx + 1
+
+    if fields:
+        yield _render_rows(first_idx, fields)
+    yield _HTML_TAIL
+
+
+def write_mail_table_html(summary, out, title="邮件汇总列表", chunk_rows=1000):
     """
+    将邮件列表 HTML 逐块写入 out。
 
-    # 生成邮件列表行
-    for idx, mail in enumerate(mail_list, 1):
-        # 处理时间显示
-        received_time = mail.get("received_time", "")
-        try:
-            if received_time:
-                dt = datetime.fromisoformat(received_time.replace('Z', '+00:00'))
-                time_display = dt.strftime('%m-%d %H:%M')
-            else:
-                time_display = "未知"
-        except:
-            time_display = received_time[:16] if received_time else "未知"
-
-        # 处理主题
-        subject = mail.get("subject", "(无主题)")
-        if len(subject) > 50:
-            subject = subject[:50] + "..."
-
-        # 处理发件人
-        sender = mail.get("from", "未知")
-        if len(sender) > 35:
-            sender = sender[:35] + "..."
-
-        # 处理正文预览
-        body_preview = mail.get("body_preview", "")
-        if len(body_preview) > 100:
-            body_preview = body_preview[:100] + "..."
-
-        # 账号显示
-        account = mail.get("account", "未知")
-        account_display = account.split('@')[0] if '@' in account else account
-
-        html += f"""
-                    <tr>
-                        <td class="index-cell">{idx}</td>
-                        <td><span class="account-badge">{account_display}</span></td>
-                        <td class="subject-cell" title="{mail.get('subject', '(无主题)')}">{subject}</td>
-                        <td class="sender-cell" title="{mail.get('from', '未知')}">{sender}</td>
-                        <td class="time-cell">{time_display}</td>
-                        <td class="preview-cell">{body_preview}</td>
-                    </tr>
-        """
-
-    html += """
-                </tbody>
-            </table>
-        </div>
-
-        <div class="footer">
-            <p>📊 本汇总由邮件拉取系统自动生成</p>
-        </div>
-    </body>
-    </html>
+    参数：
+        summary: 邮件汇总数据
+        out: 文本文件对象（如 open(path, "w")、socket.makefile("w")、io.StringIO）
+        title: 报告标题
+        chunk_rows: 每块的行数
+
+    返回：
+        int: 写入的字符数
+    """
+    written = 0
+    for chunk in iter_mail_table_html(summary, title, chunk_rows):
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def generate_mail_table_html(summary, title="邮件汇总列表"):
     """
+    生成包含邮件列表表格的 HTML。
+
+    参数：
+        summary: 邮件汇总数据
+        title: 报告标题
 
-    return html
+    返回：
+        str: HTML 内容（大报告请使用 write_mail_table_html 直接写文件）
+    """
+    return "".join(iter_mail_table_html(summary, title))
 
 
 # ==============================================================
@@ -381,108 +396,96 @@ def generate_mail_table_text(summary):
 【各账号统计】
 """
 
+    lines = [text]
     for account, count in stats.get('by_account', {}).items():
-        text += f"  {account}: {count} 封\n"
+        lines.append(f"  {account}: {count} 封\n")
 
-    text += f"\n{'=' * 80}\n【邮件列表】\n{'=' * 80}\n\n"
+    lines.append(f"\n{'=' * 80}\n【邮件列表】\n{'=' * 80}\n\n")
 
     # 生成邮件列表
     for idx, mail in enumerate(mail_list, 1):
-        # 处理时间
-        received_time = mail.get("received_time", "")
-        try:
-            if received_time:
-                dt = datetime.fromisoformat(received_time.replace('Z', '+00:00'))
-                time_display = dt.strftime('%Y-%m-%d %H:%M')
-            else:
-                time_display = "未知"
-        except:
-            time_display = received_time[:19] if received_time else "未知"
-
-        text += f"""[{idx}] {mail.get('subject', '(无主题)')}
-    账号: {mail.get('account', '未知')}
-    发件人: {mail.get('from', '未知')}
-    时间: {time_display}
-    预览: {mail.get('body_preview', '')[:100]}{'...' if len(mail.get('body_preview', '')) > 100 else ''}
+        preview = mail.body_preview
+        lines.append(f"""[{idx}] {mail.subject or '(无主题)'}
+    账号: {mail.account or '未知'}
+    发件人: {mail.sender or '未知'}
+    时间: {mail.format_time('%Y-%m-%d %H:%M', 19)}
+    预览: {preview[:100]}{'...' if len(preview) > 100 else ''}
 
-"""
+""")
 
-    text += f"{'=' * 80}\n共 {len(mail_list)} 封邮件\n"
+    lines.append(f"{'=' * 80}\n共 {len(mail_list)} 封邮件\n")
 
-    return text
+    return "".join(lines)
 
 
 # ==============================================================
 # 4️⃣ 发送邮件汇总
 # ==============================================================
 
-def send_mail_summary(from_email, to_email, password, mails_by_account, subject=None):
+def build_summary_message(from_email, to_email, summary, subject=None):
     """
-    发送邮件汇总列表。
+    生成汇总邮件（纯文本 + HTML 两个版本）。
 
     参数：
         from_email: 发件人邮箱
         to_email: 收件人邮箱（字符串或列表）
-        access_token: OAuth2 Access Token
-        mails_by_account: {email: [mails]} 的字典
+        summary: summarize_mails 的结果
         subject: 邮件主题（可选）
 
     返回：
-        bool: 是否发送成功
+        MIMEMultipart: 邮件对象
     """
-    smtp_server = "smtp.office365.com"
-    smtp_port = 587
+    msg = MIMEMultipart('alternative')
+    msg['From'] = from_email
+    msg['To'] = ', '.join(to_email) if isinstance(to_email, list) else to_email
 
-    try:
-        # 统计汇总
-        print("📊 正在生成邮件汇总...")
-        summary = summarize_mails(mails_by_account)
-
-        # 创建邮件对象
-        msg = MIMEMultipart('alternative')
-        msg['From'] = from_email
+    if subject is None:
+        today = datetime.now().strftime('%Y-%m-%d')
+        subject = f"📬 邮件汇总列表 - {today} ({summary['total_mails']}封)"
+    msg['Subject'] = subject
 
-        # 处理收件人
-        if isinstance(to_email, list):
-            msg['To'] = ', '.join(to_email)
-            recipients = to_email
-        else:
-            msg['To'] = to_email
-            recipients = [to_email]
+    msg.attach(MIMEText(generate_mail_table_text(summary), 'plain', 'utf-8'))
+    msg.attach(MIMEText(generate_mail_table_html(summary), 'html', 'utf-8'))
+    return msg
 
-        # 设置主题
-        if subject is None:
-            today = datetime.now().strftime('%Y-%m-%d')
-            subject = f"📬 邮件汇总列表 - {today} ({summary['total_mails']}封)"
-        msg['Subject'] = subject
 
-        # 生成纯文本版本
-        text_content = generate_mail_table_text(summary)
-        part1 = MIMEText(text_content, 'plain', 'utf-8')
+def build_account_summary_message(from_email, to_email, account, summary):
+    """生成单个账号的汇总邮件（主题中带账号名）"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    subject = f"📬 {account} 邮件汇总 - {today} ({summary['total_mails']}封)"
+    return build_summary_message(from_email, to_email, summary, subject)
 
-        # 生成 HTML 版本
-        html_content = generate_mail_table_html(summary)
-        part2 = MIMEText(html_content, 'html', 'utf-8')
 
-        # 添加邮件内容
-        msg.attach(part1)
-        msg.attach(part2)
-
-        # 连接 SMTP 服务器
-        print(f"📤 正在连接 SMTP 服务器...")
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()
-        server.starttls()
-        server.ehlo()
+def send_mail_summary(from_email, to_email, password, mails_by_account, subject=None, sender=None):
+    """
+    发送邮件汇总列表。
 
-        #  认证
-        server.login(from_email, password)
+    参数：
+        from_email: 发件人邮箱
+        to_email: 收件人邮箱（字符串或列表）
+        password: 登录密码（传入 sender 时不使用）
+        mails_by_account: {email: [mails]} 的字典
+        subject: 邮件主题（可选）
+        sender: 可选，复用的 DigestSender；不传时临时建立会话，发送后关闭
 
+    返回：
+        bool: 是否发送成功
+    """
+    try:
+        # 统计汇总
+        print("📊 正在生成邮件汇总...")
+        summary = summarize_mails(mails_by_account)
+        msg = build_summary_message(from_email, to_email, summary, subject)
 
-        # 发送邮件
-        print(f"📧 正在发送邮件汇总到: {msg['To']}")
-        server.send_message(msg)
-        server.quit()
+        own_sender = sender is None
+        if own_sender:
+            sender = DigestSender(from_email, password=password)
+        try:
+            print(f"📧 正在发送邮件汇总到: {msg['To']}")
+            sender.send(msg)
+        finally:
+            if own_sender:
+                sender.close()
 
         print(f"✅ 邮件汇总发送成功！")
         print(f"   总计: {summary['total_mails']} 封邮件")
@@ -493,6 +496,29 @@ def send_mail_summary(from_email, to_email, password, mails_by_account, subject=
         return False
 
 
+def send_account_summaries(sender, mails_by_account, to_email):
+    """
+    每个账号单独发送一封汇总邮件，全部复用 sender 的同一个 SMTP 会话。
+
+    参数：
+        sender: DigestSender
+        mails_by_account: {email: [mails]} 的字典，没有邮件的账号跳过
+        to_email: 收件人邮箱（字符串或列表）
+
+    返回：
+        int: 发送成功的封数
+    """
+    messages = (
+        build_account_summary_message(sender.from_email, to_email, account, summarize_mails({account: mails}))
+        for account, mails in mails_by_account.items()
+        if mails
+    )
+    results = sender.send_many(messages)
+    sent = sum(1 for result in results if not isinstance(result, Exception))
+    print(f"✅ 账号汇总发送完成：成功 {sent} 封，失败 {len(results) - sent} 封（SMTP 会话 {sender.stats['connects']} 个）")
+    return sent
+
+
 # ==============================================================
 # 5️⃣ 保存 HTML 汇总到本地
 # ==============================================================
@@ -512,17 +538,14 @@ def save_mail_summary_html(mails_by_account, output_path=None):
         # 生成汇总
         summary = summarize_mails(mails_by_account)
 
-        # 生成 HTML
-        html_content = generate_mail_table_html(summary)
-
         # 确定保存路径
         if output_path is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_path = f"mail_summary_{timestamp}.html"
 
-        # 保存文件
+        # 逐块写入文件
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+            write_mail_table_html(summary, f)
 
         print(f"💾 邮件汇总已保存到: {output_path}")
         return output_path
@@ -536,50 +559,62 @@ def save_mail_summary_html(mails_by_account, output_path=None):
 # 6️⃣ 完整流程：拉取、汇总、发送
 # ==============================================================
 
-def main_with_summary():
+def main_with_summary(per_account=False):
     """
-    主程序：拉取邮件 -> 生成汇总 -> 发送汇总邮件
+    主程序：获取 Token -> 拉取邮件 -> 过滤 -> 生成汇总 -> 发送汇总邮件
+
+    各步骤作为流水线的阶段同时运行（见 pipeline.py），per_account 为 True 时
+    每个账号拉取完成后立即发送该账号的汇总。
     """
+    # pipeline / digest 依赖本模块，在函数内导入避免循环导入
+    import script
+    from digest import DigestStore
+    from pipeline import run_pipeline
+
+    config = script.get_config()
 
     # 配置
     emails = ["MichelleChen8421@outlook.com"]
     summary_recipients = ["admin@example.com"]  # 汇总接收人
 
-
-    tokens = ""
-
-
-    mails_by_account = {}
-
-    # 保存 HTML 汇总
-    html_path = save_mail_summary_html(mails_by_account)
-
-    # 步骤4: 发送邮件汇总
-    print("\n📧 步骤 4/4：发送邮件汇总")
-    print("-" * 60)
-
-    # 使用第一个有效账号发送
-
+    # 发件账号：不填密码时通过 Token API 获取 access token，使用 XOAUTH2 认证
     sender_email = ""
     sender_pwd = ""
 
-    if not sender_pwd or not sender_email :
-        print("please enter the sender email address and passward")
-
+    sender = None
+    if sender_email:
+        sender = DigestSender(
+            sender_email,
+            host=config["smtp_server"],
+            port=config["smtp_port"],
+            password=sender_pwd or None,
+            token_provider=None if sender_pwd else lambda addr: script.get_access_token([addr]).get(addr)
+        )
+    else:
+        print("ℹ️  未配置发件邮箱（sender_email），只保存 HTML 汇总，不发送邮件")
+
+    os.makedirs(os.path.dirname(config["digest_path"]), exist_ok=True)
+    digest_store = DigestStore(config["digest_path"])
+    html_path = f"mail_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
 
-    if sender_email and sender_pwd:
-        # 检查是否有邮件需要发送
-        total_mails = sum(len(mails) for mails in mails_by_account.values())
-        if total_mails > 0:
-            send_mail_summary(
-                sender_email,
-                summary_recipients,
-                sender_pwd,
-                mails_by_account
-            )
-        else:
-            print("ℹ️  没有邮件需要发送汇总")
+    print("=" * 60)
+    print(f"🚀 邮件汇总流水线：{len(emails)} 个账号")
+    print("=" * 60)
 
+    try:
+        run_pipeline(
+            emails,
+            recipients=summary_recipients,
+            sender=sender,
+            config=config,
+            per_account=per_account and sender is not None,
+            html_path=html_path,
+            digest_store=digest_store
+        )
+    finally:
+        if sender is not None:
+            sender.close()
+        digest_store.close()
 
     print("\n" + "=" * 60)
     print("✅ 所有任务完成！")
@@ -621,13 +656,10 @@ def example_usage():
     # 方式1: 生成并保存 HTML 文件
     save_mail_summary_html(mails_by_account, "my_summary.html")
 
-    # 方式2: 发送汇总邮件（需要 token）
-    # send_mail_summary(
-    #     "test@outlook.com",
-    #     "admin@example.com",
-    #     access_token,
-    #     mails_by_account
-    # )
+    # 方式2: 发送汇总邮件（需要 token），多封汇总复用同一个 SMTP 会话
+    # with DigestSender("test@outlook.com", access_token=access_token) as sender:
+    #     send_mail_summary("test@outlook.com", "admin@example.com", None, mails_by_account, sender=sender)
+    #     send_account_summaries(sender, mails_by_account, "admin@example.com")
 
     # 方式3: 只生成汇总数据
     summary = summarize_mails(mails_by_account)
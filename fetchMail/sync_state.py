@@ -0,0 +1,94 @@
+"""
+IMAP 增量同步状态
+------------------------------------
+按 (账号, 文件夹) 记录 UIDVALIDITY 和已处理的最大 UID，保存在 SQLite 中。
+
+增量模式下每次只拉取 UID last_uid+1:*，耗时只与新邮件数量相关。
+UIDVALIDITY 变化说明服务器重建了 UID，此时需要重新做一次初始同步。
+
+写入分两种：
+  - set(): 立即写入
+  - stage() + commit(): 先暂存，结果保存成功后再统一提交
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class SyncStateStore:
+    """账号/文件夹的同步位置存储（线程安全）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sync_state ('
+            ' account TEXT NOT NULL,'
+            ' folder TEXT NOT NULL,'
+            ' uidvalidity INTEGER NOT NULL,'
+            ' last_uid INTEGER NOT NULL,'
+            ' updated_at TEXT NOT NULL,'
+            ' PRIMARY KEY (account, folder))'
+        )
+        self._conn.commit()
+
+    def get(self, account, folder):
+        """
+        读取同步位置。
+
+        返回：
+            (uidvalidity, last_uid)，没有记录时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT uidvalidity, last_uid FROM sync_state WHERE account = ? AND folder = ?',
+                (account, folder)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, account, folder, uidvalidity, last_uid):
+        """立即写入同步位置"""
+        with self._lock:
+            self._write([(account, folder, uidvalidity, last_uid)])
+
+    def stage(self, account, folder, uidvalidity, last_uid):
+        """暂存同步位置，调用 commit() 后才写入"""
+        with self._lock:
+            self._pending[(account, folder)] = (account, folder, uidvalidity, last_uid)
+
+    def commit(self):
+        """写入所有暂存的同步位置，返回写入条数"""
+        with self._lock:
+            rows = list(self._pending.values())
+            self._write(rows)
+            self._pending = {}
+        return len(rows)
+
+    def discard(self, account=None):
+        """丢弃暂存的同步位置；指定 account 时只丢弃该账号的"""
+        with self._lock:
+            if account is None:
+                self._pending = {}
+            else:
+                self._pending = {key: row for key, row in self._pending.items() if key[0] != account}
+
+    def _write(self, rows):
+        if not rows:
+            return
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO sync_state (account, folder, uidvalidity, last_uid, updated_at) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (account, folder) DO UPDATE SET '
+                ' uidvalidity = excluded.uidvalidity, last_uid = excluded.last_uid, updated_at = excluded.updated_at',
+                [row + (now,) for row in rows]
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,182 @@
+"""
+DigestSender 测试
+------------------------------------
+使用 aiosmtpd 在本地启动 SMTP 服务（未安装 aiosmtpd 时跳过），覆盖：
+
+  - XOAUTH2 token 过期后重新获取
+  - 服务器返回 421 后重连并重发
+  - 多封汇总复用同一个会话、按 max_messages_per_session 轮换会话
+  - token 无效且无法刷新时报错
+  - starttls=True 而服务器不支持 STARTTLS 时拒绝以明文发送
+
+运行：
+  cd fetchMail && python -m unittest test_digest_sender
+"""
+
+import base64
+import email
+import smtplib
+import socket
+import unittest
+from email import policy
+
+from digest_sender import DigestSender
+from summarize import build_account_summary_message, build_summary_message, send_account_summaries, summarize_mails
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    Controller = None
+
+
+class _Handler:
+    """只接受 token 为 good 的 XOAUTH2 认证；fail_at 中的第 n 封邮件返回 421"""
+
+    def __init__(self):
+        self.messages = []
+        self.tokens = []
+        self.sessions = set()
+        self.fail_at = set()
+        self._attempts = 0
+
+    async def auth_XOAUTH2(self, server, args):
+        raw = base64.b64decode(args[1]).decode()
+        token = raw.split("auth=Bearer ")[1].split("\x01")[0]
+        self.tokens.append(token)
+        return AuthResult(success=token == "good", handled=False)
+
+    async def handle_DATA(self, server, session, envelope):
+        self._attempts += 1
+        if self._attempts in self.fail_at:
+            return "421 try again later"
+        self.messages.append(envelope)
+        self.sessions.add(session.peer)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _mails(accounts, per_account=3):
+    return {
+        f"u{i}@outlook.com": [
+            {"subject": f"S{i}-{j}", "from": "a@b.com", "received_time": "2025-10-20T10:00:00", "is_read": False}
+            for j in range(per_account)
+        ]
+        for i in range(accounts)
+    }
+
+
+@unittest.skipIf(Controller is None, "需要安装 aiosmtpd")
+class DigestSenderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = _Handler()
+        self.port = _free_port()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.port,
+                                     auth_require_tls=False, auth_required=True)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def _sender(self, **kwargs):
+        kwargs.setdefault("access_token", None if "token_provider" in kwargs else "good")
+        sender = DigestSender("me@outlook.com", host="127.0.0.1", port=self.port, starttls=False, **kwargs)
+        self.addCleanup(sender.close)
+        return sender
+
+    def _message(self, subject="digest"):
+        return build_summary_message("me@outlook.com", "boss@x.com", summarize_mails({subject: []}))
+
+    def test_expired_token_is_refreshed(self):
+        tokens = iter(["expired", "good"])
+        calls = []
+
+        def provider(address):
+            calls.append(address)
+            return next(tokens)
+
+        sender = self._sender(token_provider=provider)
+        sender.send(self._message())
+
+        self.assertEqual(calls, ["me@outlook.com", "me@outlook.com"])
+        self.assertEqual(self.handler.tokens, ["expired", "good"])
+        self.assertEqual(len(self.handler.messages), 1)
+        self.assertEqual(sender.stats["connects"], 1)
+
+    def test_bad_token_without_provider_raises(self):
+        sender = self._sender(access_token="bad")
+
+        with self.assertRaises(smtplib.SMTPAuthenticationError):
+            sender.send(self._message())
+        self.assertEqual(self.handler.messages, [])
+
+    def test_421_reconnects_and_resends(self):
+        self.handler.fail_at = {2}
+        sender = self._sender()
+
+        for i in range(3):
+            sender.send(self._message(f"m{i}"))
+
+        self.assertEqual(len(self.handler.messages), 3)
+        self.assertEqual(sender.stats, {"connects": 2, "sent": 3, "failed": 0, "retries": 1})
+
+    def test_421_gives_up_after_max_retries(self):
+        self.handler.fail_at = {1, 2}
+        sender = self._sender(max_retries=1)
+
+        with self.assertRaises(smtplib.SMTPResponseException) as ctx:
+            sender.send(self._message())
+        self.assertEqual(ctx.exception.smtp_code, 421)
+        self.assertEqual(sender.stats["failed"], 1)
+
+    def test_summaries_share_sessions(self):
+        # 20 个账号的汇总 + 1 份总汇总，第 7 封返回 421：共 21 封，2 个会话
+        self.handler.fail_at = {7}
+        mails = _mails(20)
+        sender = self._sender(max_messages_per_session=50)
+
+        sent = send_account_summaries(sender, mails, ["boss@x.com"])
+        sender.send(build_summary_message("me@outlook.com", "boss@x.com", summarize_mails(mails)))
+
+        self.assertEqual(sent, 20)
+        self.assertEqual(len(self.handler.messages), 21)
+        self.assertEqual(len(self.handler.sessions), 2)
+        self.assertEqual(sender.stats["connects"], 2)
+        self.assertEqual(sender.stats["retries"], 1)
+        self.assertEqual(self.handler.messages[0].rcpt_tos, ["boss@x.com"])
+
+    def test_session_rotation(self):
+        sender = self._sender(max_messages_per_session=4)
+
+        results = sender.send_many(self._message(f"m{i}") for i in range(10))
+
+        self.assertEqual(results, [{}] * 10)
+        self.assertEqual(sender.stats["connects"], 3)
+        self.assertEqual(len(self.handler.sessions), 3)
+
+    def test_account_summary_message(self):
+        mails = _mails(1)
+        account = next(iter(mails))
+        msg = build_account_summary_message("me@outlook.com", ["boss@x.com"], account, summarize_mails(mails))
+
+        self._sender().send(msg)
+
+        received = email.message_from_bytes(self.handler.messages[0].content, policy=policy.default)
+        self.assertIn(account, received["Subject"])
+
+    def test_starttls_is_required_when_enabled(self):
+        sender = DigestSender("me@outlook.com", host="127.0.0.1", port=self.port, access_token="good")
+        self.addCleanup(sender.close)
+
+        with self.assertRaises(smtplib.SMTPNotSupportedError):
+            sender.send(self._message())
+        self.assertEqual(self.handler.tokens, [])
+        self.assertEqual(self.handler.messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+MailPipeline 测试
+------------------------------------
+替换 script 中的 Token 获取、拉取、过滤和标记已读 / 同步位置提交函数，不连接 IMAP / SMTP，覆盖：
+
+  - 正常完成：发送总汇总后标记已读、提交同步位置、写入按天摘要
+  - 单个账号汇总失败：只丢弃该账号的同步位置
+  - 汇总阶段异常：取走上游数据直到结束（不阻塞），不提交
+  - 发送失败 / 未发送汇总：不标记已读、不提交
+  - 标记已读失败的账号不写入按天摘要
+
+运行：
+  cd fetchMail && python -m unittest test_pipeline
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pipeline
+import script
+from digest import DigestStore
+
+ACCOUNTS = ["a@outlook.com", "b@outlook.com", "c@outlook.com"]
+
+
+def _mails(account, count):
+    return [
+        {"id": str(uid), "subject": f"{account}-{uid}", "from": "x@y.com",
+         "received_time": "2025-10-20T10:00:00", "is_read": False}
+        for uid in range(1, count + 1)
+    ]
+
+
+def _fetch_account_mails(email_addr, access_token, config, sink=None, apply_rules=True):
+    mails = _mails(email_addr, 20)
+    for mail in mails:
+        sink.write(email_addr, mail)
+    return None, {"count": len(mails)}
+
+
+class _Sender:
+    from_email = "me@outlook.com"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    def send(self, msg):
+        if self.fail:
+            raise OSError("connection refused")
+        self.sent.append(msg)
+
+
+class _FailingDict(dict):
+    """汇总阶段记录 fetched_ids 时抛出异常，模拟汇总阶段在账号之间出错"""
+
+    def __setitem__(self, key, value):
+        raise RuntimeError("boom")
+
+
+class MailPipelineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.config = dict(script.get_config(), fetch_workers=2, pipeline_queue_size=2, token_batch_size=2)
+        self.mark = mock.Mock(side_effect=lambda mails_by_account, tokens, config: dict.fromkeys(mails_by_account, True))
+        self.commit = mock.Mock()
+        self.discard = mock.Mock()
+        for name, value in {
+            "get_access_token": lambda batch: {email_addr: "token" for email_addr in batch},
+            "fetch_account_mails": _fetch_account_mails,
+            "checkKeyValue": lambda mail: True,
+            "mark_saved_mails_as_read": self.mark,
+            "commit_sync_state": self.commit,
+            "discard_sync_state": self.discard,
+        }.items():
+            patcher = mock.patch.object(script, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.digest_store = DigestStore(os.path.join(tmp.name, "digest.db"))
+        self.addCleanup(self.digest_store.close)
+
+    def _run(self, pipe):
+        """在线程中运行，超时视为阻塞"""
+        result = {}
+
+        def target():
+            with contextlib.redirect_stdout(io.StringIO()):
+                result["summary"] = pipe.run()
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "流水线没有结束")
+        return result.get("summary")
+
+    def _pipeline(self, sender=None, **kwargs):
+        kwargs.setdefault("digest_store", self.digest_store)
+        return pipeline.MailPipeline(ACCOUNTS, self.config, sender=sender,
+                                     recipients=None if sender is None else ["boss@x.com"], **kwargs)
+
+    def _digest_total(self):
+        return self.digest_store.window("2025-01-01", "2025-12-31").total
+
+    def test_normal_completion(self):
+        sender = _Sender()
+        summary = self._run(self._pipeline(sender))
+
+        self.assertEqual(summary["total_mails"], 60)
+        self.assertEqual(len(sender.sent), 1)
+        fetched_ids = self.mark.call_args.args[0]
+        self.assertEqual(sorted(fetched_ids), ACCOUNTS)
+        self.assertEqual([m["id"] for m in fetched_ids["a@outlook.com"]], [str(uid) for uid in range(1, 21)])
+        self.commit.assert_called_once_with()
+        self.discard.assert_not_called()
+        self.assertEqual(self._digest_total(), 60)
+
+    def test_account_summarize_failure_keeps_its_sync_position(self):
+        summarize = pipeline.summarize_mails
+
+        def failing(mails_by_account):
+            if "b@outlook.com" in mails_by_account:
+                raise ValueError("bad mail")
+            return summarize(mails_by_account)
+
+        sender = _Sender()
+        with mock.patch.object(pipeline, "summarize_mails", failing):
+            summary = self._run(self._pipeline(sender))
+
+        self.assertEqual(summary["total_mails"], 40)
+        self.assertEqual(sorted(self.mark.call_args.args[0]), ["a@outlook.com", "c@outlook.com"])
+        self.discard.assert_called_once_with("b@outlook.com")
+        self.commit.assert_called_once_with()
+        self.assertEqual(self._digest_total(), 40)
+
+    def test_summarize_stage_failure_drains_queues(self):
+        sender = _Sender()
+        pipe = self._pipeline(sender)
+        pipe.fetched_ids = _FailingDict()
+
+        self._run(pipe)
+
+        self.assertTrue(pipe.delivery_failed)
+        self.assertEqual(sender.sent, [])
+        self.assertTrue(pipe.fetched.empty())
+        self.assertTrue(pipe.filtered.empty())
+        self.mark.assert_not_called()
+        self.commit.assert_not_called()
+        self.discard.assert_called_once_with()
+        self.assertEqual(self._digest_total(), 0)
+
+    def test_delivery_failure_commits_nothing(self):
+        pipe = self._pipeline(_Sender(fail=True))
+
+        self._run(pipe)
+
+        self.assertTrue(pipe.delivery_failed)
+        self.mark.assert_not_called()
+        self.commit.assert_not_called()
+        self.discard.assert_called_once_with()
+        self.assertEqual(self._digest_total(), 0)
+
+    def test_no_sender_commits_nothing_by_default(self):
+        summary = self._run(self._pipeline())
+
+        self.assertEqual(summary["total_mails"], 60)
+        self.mark.assert_not_called()
+        self.commit.assert_not_called()
+        self.assertEqual(self._digest_total(), 0)
+
+        self._run(self._pipeline(commit_unsent=True))
+
+        self.mark.assert_called_once()
+        self.commit.assert_called_once_with()
+        self.assertEqual(self._digest_total(), 60)
+
+    def test_unmarked_account_is_not_added_to_digest(self):
+        self.mark.side_effect = lambda mails_by_account, tokens, config: {
+            account: account != "c@outlook.com" for account in mails_by_account
+        }
+
+        self._run(self._pipeline(_Sender()))
+
+        self.discard.assert_called_once_with("c@outlook.com")
+        self.commit.assert_called_once_with()
+        self.assertEqual(self._digest_total(), 40)
+
+
+if __name__ == "__main__":
+    unittest.main()